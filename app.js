@@ -212,9 +212,23 @@
       
       const data = await response.json();
       
+      // Ratings are exported as integers scaled by metrics.scale; turn them back into percentages
+      const ratingScale = Number(data.metrics && data.metrics.scale) || 1;
+      const unscale = (v) => (typeof v === 'number' ? v / ratingScale : v);
+      
       // Load courses into Map
       courseIdToCourse = new Map();
+      const departments = Array.isArray(data.departments) ? data.departments : null;
       for (const [courseId, courseData] of Object.entries(data.courses)) {
+        // Departments are exported once in data.departments; courses reference them by index
+        if (departments && typeof courseData.department_id === 'number') {
+          courseData.department = departments[courseData.department_id];
+        }
+        if (ratingScale !== 1) {
+          courseData.liked = unscale(courseData.liked);
+          courseData.easy = unscale(courseData.easy);
+          courseData.useful = unscale(courseData.useful);
+        }
         courseIdToCourse.set(courseId, courseData);
       }
       
@@ -235,8 +249,9 @@
       
       // Load global metrics for weighting
       if (data.metrics) {
-        metricsMedian = data.metrics.median || metricsMedian;
-        metricsMin = data.metrics.min || metricsMin;
+        const unscaleAll = (m) => ({ liked: unscale(m.liked), easy: unscale(m.easy), useful: unscale(m.useful) });
+        metricsMedian = data.metrics.median ? unscaleAll(data.metrics.median) : metricsMedian;
+        metricsMin = data.metrics.min ? unscaleAll(data.metrics.min) : metricsMin;
       }
       
       updateAllCourseCodesCache();
@@ -307,13 +322,13 @@
           if(!window.__NODE_UID__) window.__NODE_UID__ = 1;
           return window.__NODE_UID__++;
         })();
-        const andNode = { id: `and-${id}`, uid: andUid, children:[] };
+        const andNode = { id: `and-${id}`, uid: andUid, children:[], junction: 'and' };
       for(const g of groups){
           const orUid = (function(){
             if(!window.__NODE_UID__) window.__NODE_UID__ = 1;
             return window.__NODE_UID__++;
           })();
-          const orNode = { id: `or-group-${g.group}`, uid: orUid, children: g.courses.map(c => dfs(c, depth+1)), isGroup: true };
+          const orNode = { id: `or-group-${g.group}`, uid: orUid, children: g.courses.map(c => dfs(c, depth+1)), isGroup: true, junction: 'or' };
           andNode.children.push(orNode);
         }
         children.push(andNode);
@@ -325,7 +340,7 @@
             if(!window.__NODE_UID__) window.__NODE_UID__ = 1;
             return window.__NODE_UID__++;
           })();
-          const orNode = { id: `or-group-${g.group}`, uid: orUid, children: g.courses.map(c => dfs(c, depth+1)), isGroup: true };
+          const orNode = { id: `or-group-${g.group}`, uid: orUid, children: g.courses.map(c => dfs(c, depth+1)), isGroup: true, junction: 'or' };
           children.push(orNode);
         } else {
           // Single course, no group node needed, just the course itself
@@ -407,13 +422,13 @@
 
     const newChildren = [];
     if (groups && groups.length > 1) { // AND logic
-      const andNode = { id: `and-${id}`, children: [] };
+      const andNode = { id: `and-${id}`, children: [], junction: 'and' };
       for (const g of groups) {
         const groupChildren = g.courses.map(course => {
           const childNode = childrenById.get(course.course_id);
           return transformApiTreeToRenderableTree(childNode);
         }).filter(Boolean);
-        const orNode = { id: `or-group-${g.group}-${id}`, children: groupChildren, isGroup: true };
+        const orNode = { id: `or-group-${g.group}-${id}`, children: groupChildren, isGroup: true, junction: 'or' };
         andNode.children.push(orNode);
       }
       newChildren.push(andNode);
@@ -425,7 +440,7 @@
       }).filter(Boolean);
 
       if (g.courses.length > 1) {
-          const orNode = { id: `or-group-${g.group}-${id}`, children: groupChildren, isGroup: true };
+          const orNode = { id: `or-group-${g.group}-${id}`, children: groupChildren, isGroup: true, junction: 'or' };
           newChildren.push(orNode);
       } else {
           newChildren.push(...groupChildren);
@@ -725,7 +740,7 @@
     let maxNodeWidth = 0;
     (function collect(n){
       const isRoot = (n === root);
-      const isJunction = (n.id || "").startsWith("and-") || (n.id || "").startsWith("or-");
+      const isJunction = !!n.junction;
       const label = isJunction ? "" : (courseIdToCourse.get(n.id)?.course_id || n.id);
       const gradeSpace = isRoot ? 0 : 26; // compacted from 30
       const weightSpace = isRoot ? 0 : 22; // tighter to match right-side spacing
@@ -921,7 +936,7 @@
 
     const andNodes = [];
     (function collectAnds(n) {
-      if ((n.id || "").startsWith("and-")) andNodes.push(n);
+      if (n.junction === 'and') andNodes.push(n);
       for (const c of (n.children || [])) collectAnds(c);
     })(root);
 
@@ -966,8 +981,8 @@
           drawnEdges.add(edgeKey);
           const path = document.createElementNS("http://www.w3.org/2000/svg", "path");
 
-          const parentIsJunction = (node.id || "").startsWith("and-") || (node.id || "").startsWith("or-") || node.isGroup;
-          const childIsJunction = (child.id || "").startsWith("and-") || (child.id || "").startsWith("or-") || child.isGroup;
+          const parentIsJunction = !!node.junction || node.isGroup;
+          const childIsJunction = !!child.junction || child.isGroup;
 
           const startX = parentIsJunction ? p.x : (p.x + 6);
           const startY = p.y + NODE_HEIGHT/2;
@@ -1008,7 +1023,7 @@
           const parent = parentMap.get(node);
           if(parent){
             const parentPos = nodePos(parent);
-            const parentIsJunction = (parent.id || "").startsWith("and-") || (parent.id || "").startsWith("or-") || parent.isGroup;
+            const parentIsJunction = !!parent.junction || parent.isGroup;
             const parentStartX = parentIsJunction ? parentPos.x : (parentPos.x + 6);
             
             // Convergence X is halfway between OR group right edge and parent left edge
@@ -1019,7 +1034,7 @@
             // Draw edges from each child to convergence point
             for(const grandchild of node.children){
               const gc = nodePos(grandchild);
-              const grandchildIsJunction = (grandchild.id || "").startsWith("and-") || (grandchild.id || "").startsWith("or-") || grandchild.isGroup;
+              const grandchildIsJunction = !!grandchild.junction || grandchild.isGroup;
               const grandchildEndX = grandchildIsJunction ? gc.x : (gc.x + getWidth(grandchild) - 6);
               const grandchildEndY = gc.y + NODE_HEIGHT/2;
               
@@ -1055,12 +1070,12 @@
           const parent = parentMap.get(node);
           if(parent){
             const parentPos = nodePos(parent);
-            const parentIsJunction = (parent.id || "").startsWith("and-") || (parent.id || "").startsWith("or-") || parent.isGroup;
+            const parentIsJunction = !!parent.junction || parent.isGroup;
             const parentStartX = parentIsJunction ? parentPos.x : (parentPos.x + 6);
             const parentStartY = parentPos.y + NODE_HEIGHT/2;
             
             // Check if parent is AND node with multiple OR group children
-            const isAndNode = (parent.id || "").startsWith("and-");
+            const isAndNode = parent.junction === 'and';
             const orGroupSiblings = (parent.children || []).filter(c => c.isGroup && c.children && c.children.length > 0);
             
             if(isAndNode && orGroupSiblings.length > 1){
@@ -1140,7 +1155,7 @@
     // Note: drawEdges skips OR groups since they're handled above
     drawEdges(root);
     function drawNode(node){
-      const isJunction = (node.id || "").startsWith("and-") || (node.id || "").startsWith("or-");
+      const isJunction = !!node.junction;
       const pos = nodePos(node);
       if(isJunction){
         // Do not render junction nodes, they are for layout only
@@ -1,16 +1,17 @@
 import os
-from typing import Dict, List, Tuple, Set
-from statistics import median
+from typing import AsyncIterator, Dict, List, Tuple, Set
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import logging
+import time
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.background import BackgroundTask
 import asyncio
+import threading
 import psycopg
-from psycopg_pool import ConnectionPool
+from psycopg_pool import AsyncConnectionPool
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 
@@ -37,25 +38,35 @@ def _get_dsn() -> str:
 
 
 # Global connection pool to avoid TLS/connect latency per request
-POOL: ConnectionPool | None = None
+POOL: AsyncConnectionPool | None = None
 _KEEPALIVE_TASK: asyncio.Task | None = None
+_GRAPH_TASK: asyncio.Task | None = None
 
 
 def init_pool_if_needed():
     global POOL
     if POOL is None:
-        # Enable TCP keepalives so idle connections stay warm across NATs/proxies
-        POOL = ConnectionPool(
+        # Opened explicitly (await POOL.open()) on startup, inside the event loop.
+        # Keep several connections warm: a cold Neon TLS handshake is ~100 ms.
+        POOL = AsyncConnectionPool(
             conninfo=_get_dsn(),
-            min_size=1,
-            max_size=10,
+            min_size=5,
+            max_size=25,
+            max_idle=300,
+            timeout=10,
+            num_workers=3,
+            open=False,
             kwargs={
+                # Enable TCP keepalives so idle connections stay warm across NATs/proxies
                 "keepalives": 1,
                 "keepalives_idle": 30,
                 "keepalives_interval": 10,
                 "keepalives_count": 3,
                 "sslmode": "require",
                 "application_name": "uw_app_backend",
+                # Session settings ride along in the startup packet (no extra round-trip):
+                # JIT warm-up only hurts these tiny queries, and cap runaway statements.
+                "options": "-c jit=off -c statement_timeout=5000",
             },
         )
 
@@ -63,7 +74,14 @@ def init_pool_if_needed():
 def get_db_connection():
     init_pool_if_needed()
     assert POOL is not None
-    return POOL.connection()  # context manager
+    return POOL.connection()  # async context manager
+
+
+async def get_cursor() -> AsyncIterator[psycopg.AsyncCursor]:
+    """FastAPI dependency: one pooled connection + cursor for the lifetime of a request."""
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            yield cur
 
 
 load_dotenv()  # Load .env if present
@@ -71,35 +89,60 @@ load_dotenv()  # Load .env if present
 app = FastAPI(title="UW Course API", version="0.1.0")
 
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    # Let the request proceed immediately
-    response = await call_next(request)
+# Health probes aren't visits; don't spend a visitor_log row on them
+_UNLOGGED_PATHS = frozenset({"/api/health", "/api/live"})
+_VISIT_INSERT_SQL = "INSERT INTO visitor_log (ip_address, path, user_agent, visited_at) VALUES (%s, %s, %s, %s)"
+# Visits are queued and written by a single background consumer so the insert
+# never sits on the request path; the queue is bounded so a DB outage can't grow it forever.
+_VISIT_QUEUE: asyncio.Queue | None = None
+_VISIT_TASK: asyncio.Task | None = None
+
+
+_VISIT_BATCH_MAX = 500
+_VISIT_FLUSH_SECONDS = 0.25
+
 
-    # Log in the background after the response is sent so first-hit latency
-    # (e.g. when the DB pool is warming) doesn't block the user.
-    def _write_log():
+async def _drain_visit_log():
+    assert _VISIT_QUEUE is not None
+    loop = asyncio.get_running_loop()
+    while True:
+        # Block for the first visit, then keep collecting until the batch is
+        # full or the flush window closes
+        batch = [await _VISIT_QUEUE.get()]
+        deadline = loop.time() + _VISIT_FLUSH_SECONDS
+        while len(batch) < _VISIT_BATCH_MAX:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_VISIT_QUEUE.get(), remaining))
+            except asyncio.TimeoutError:
+                break
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "INSERT INTO visitor_log (ip_address, path, user_agent, visited_at) VALUES (%s, %s, %s, %s)",
-                        (
-                            request.client.host,
-                            request.url.path,
-                            request.headers.get("user-agent"),
-                            datetime.now(ZoneInfo("America/Toronto")).replace(tzinfo=None),
-                        ),
-                    )
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    # psycopg pipelines executemany, so the batch costs one round-trip
+                    await cur.executemany(_VISIT_INSERT_SQL, batch)
         except Exception:
-            # Best-effort only; ignore failures
+            # Best-effort only; drop the batch on failure
             pass
 
-    try:
-        response.background = BackgroundTask(_write_log)
-    except Exception:
-        pass
-    return response
+
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    if _VISIT_QUEUE is not None and request.url.path not in _UNLOGGED_PATHS:
+        try:
+            _VISIT_QUEUE.put_nowait(
+                (
+                    request.client.host if request.client else None,
+                    request.url.path,
+                    request.headers.get("user-agent"),
+                    datetime.now(ZoneInfo("America/Toronto")).replace(tzinfo=None),
+                )
+            )
+        except asyncio.QueueFull:
+            pass
+    return await call_next(request)
 
 
 app.add_middleware(
@@ -111,24 +154,49 @@ app.add_middleware(
 )
 
 
+# Probes fire every few seconds; test the DB at most once per TTL and reuse the verdict
+_HEALTH_TTL = 10.0
+_HEALTH_CACHE: Dict[str, float | bool] = {"ok": False, "ts": float("-inf")}
+
+
+@app.get("/api/live")
+async def live():
+    """Liveness probe: the process is up. Never touches the database."""
+    return {"status": "ok"}
+
+
 @app.get("/api/health")
-def health():
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as _cur:
-                _cur.execute("SELECT 1")
-        return {"status": "ok"}
-    except Exception:
+async def health():
+    """Readiness probe: the database is reachable (cached for a few seconds)."""
+    now = time.monotonic()
+    if now - _HEALTH_CACHE["ts"] >= _HEALTH_TTL:
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as _cur:
+                    await _cur.execute("SELECT 1")
+            _HEALTH_CACHE["ok"] = True
+        except Exception:
+            _HEALTH_CACHE["ok"] = False
+        _HEALTH_CACHE["ts"] = now
+    if not _HEALTH_CACHE["ok"]:
         raise HTTPException(status_code=503, detail="Database connection is not available")
+    return {
+        "status": "ok",
+        # Which in-memory prereq graph is being served (version 0: not loaded, SQL fallback)
+        "prereq_graph": {
+            "version": PREREQ_GRAPH_VERSION,
+            "loaded_at": PREREQ_GRAPH_LOADED_AT.isoformat() if PREREQ_GRAPH_LOADED_AT else None,
+        },
+    }
 
 
 async def _keep_pool_warm():
     """Periodically ping the DB so TLS/session stays hot across idle periods."""
     while True:
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT 1")
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT 1")
         except Exception:
             # Ignore transient errors; next tick will retry
             pass
@@ -137,39 +205,69 @@ async def _keep_pool_warm():
 
 @app.on_event("startup")
 async def _on_startup():
-    global _KEEPALIVE_TASK
+    global _KEEPALIVE_TASK, _GRAPH_TASK, _VISIT_QUEUE, _VISIT_TASK
     init_pool_if_needed()
-    # Warm one connection immediately
+    assert POOL is not None
+    await POOL.open()
+    # Fill the pool up to min_size before serving so the first requests don't pay the connect cost
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
+        await POOL.wait(timeout=30)
     except Exception:
         pass
     _KEEPALIVE_TASK = asyncio.create_task(_keep_pool_warm())
+    _GRAPH_TASK = asyncio.create_task(_reload_prereq_graph_periodically())
+    _VISIT_QUEUE = asyncio.Queue(maxsize=10000)
+    _VISIT_TASK = asyncio.create_task(_drain_visit_log())
 
 
 @app.on_event("shutdown")
 async def _on_shutdown():
-    global _KEEPALIVE_TASK, POOL
+    global _KEEPALIVE_TASK, _GRAPH_TASK, _VISIT_TASK, POOL
     if _KEEPALIVE_TASK is not None:
         _KEEPALIVE_TASK.cancel()
         _KEEPALIVE_TASK = None
+    if _GRAPH_TASK is not None:
+        _GRAPH_TASK.cancel()
+        _GRAPH_TASK = None
+    if _VISIT_TASK is not None:
+        _VISIT_TASK.cancel()
+        _VISIT_TASK = None
     if POOL is not None:
         try:
-            POOL.close()
+            await POOL.close()
         except Exception:
             pass
 
 
-def fetch_course(cursor, course_id: str) -> Dict:
-    cursor.execute(
-        "SELECT course_id, COALESCE(course_name, '') AS course_name, COALESCE(department, ''), course_level, "
-        "COALESCE(description, ''), liked, easy, useful, rating_num "
-        "FROM course WHERE course_id = %s",
-        (course_id,),
-    )
-    row = cursor.fetchone()
+# Per-course lookups repeat across tree branches and requests; keep a bounded
+# TTL cache in front of them. Cached values are shared, so treat them as read-only.
+COURSE_CACHE_TTL = float(os.getenv("COURSE_CACHE_TTL", "600"))
+COURSE_CACHE: TTLCache = TTLCache(maxsize=20000, ttl=COURSE_CACHE_TTL)
+PREREQ_CACHE: TTLCache = TTLCache(maxsize=20000, ttl=COURSE_CACHE_TTL)
+PREREQ_SOURCE_CACHE: TTLCache = TTLCache(maxsize=5000, ttl=COURSE_CACHE_TTL)
+# Autocomplete traffic is highly repetitive; a short TTL keeps results fresh enough
+SUGGEST_CACHE: TTLCache = TTLCache(maxsize=5000, ttl=60)
+_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_course_caches() -> None:
+    """Drop cached course rows, prereq groups and metrics (call after a data reload)."""
+    with _CACHE_LOCK:
+        COURSE_CACHE.clear()
+        PREREQ_CACHE.clear()
+        PREREQ_SOURCE_CACHE.clear()
+        SUGGEST_CACHE.clear()
+    invalidate_metrics_cache()
+
+
+# Read by position; no aliases, since the list is also spliced into json_build_array(...)
+_COURSE_COLUMNS = (
+    "course_id, COALESCE(course_name, ''), COALESCE(department, ''), course_level, "
+    "COALESCE(description, ''), liked, easy, useful, rating_num"
+)
+
+
+def _course_from_row(course_id: str, row) -> Dict:
     if not row:
         # Course might not be in `course` table; still respond minimally
         return {"course_id": course_id, "course_name": "", "department": "", "course_level": None, "description": ""}
@@ -186,18 +284,22 @@ def fetch_course(cursor, course_id: str) -> Dict:
     }
 
 
-def fetch_prereq_groups(cursor, course_id: str) -> List[Dict]:
-    cursor.execute(
-        """
-        SELECT prerequisite_group, prereq_course_id, min_grade
-        FROM course_prereq
-        WHERE course_id = %s
-        ORDER BY prerequisite_group, prereq_course_id
-        """,
-        (course_id,),
-    )
+async def fetch_course(cursor, course_id: str) -> Dict:
+    with _CACHE_LOCK:
+        cached = COURSE_CACHE.get(course_id)
+    if cached is None:
+        await cursor.execute(f"SELECT {_COURSE_COLUMNS} FROM course WHERE course_id = %s", (course_id,), prepare=True)
+        cached = _course_from_row(course_id, await cursor.fetchone())
+        with _CACHE_LOCK:
+            COURSE_CACHE[course_id] = cached
+    # Handlers add keys (e.g. offerings) to the result, so return a copy
+    return dict(cached)
+
+
+def _group_prereq_rows(rows) -> List[Dict]:
+    """Bucket (prerequisite_group, prereq_course_id, min_grade) rows into group dicts."""
     groups: Dict[int, Dict] = {}
-    for grp, prereq, min_grade in cursor.fetchall():
+    for grp, prereq, min_grade in rows:
         if grp not in groups:
             groups[grp] = {"group": int(grp), "courses": []}
         groups[grp]["courses"].append({"course_id": prereq, "min_grade": None if min_grade is None else int(min_grade)})
@@ -207,60 +309,181 @@ def fetch_prereq_groups(cursor, course_id: str) -> List[Dict]:
     return [groups[k] for k in sorted(groups.keys())]
 
 
-def build_prereq_tree(cursor, root_id: str, *, max_depth: int = 99) -> Dict:
-    visited: Set[str] = set()
+# The whole course_prereq table is small, so keep it in memory as a forward
+# (course -> grouped prereqs) and reverse (prereq -> dependent courses) graph.
+# Both stay None until the first load succeeds; callers then fall back to SQL.
+PREREQ_GRAPH_RELOAD_SECONDS = float(os.getenv("PREREQ_GRAPH_RELOAD_SECONDS", "600"))
+FORWARD: Dict[str, List[Dict]] | None = None
+REVERSE: Dict[str, List[str]] | None = None
+PREREQ_GRAPH_VERSION = 0
+PREREQ_GRAPH_LOADED_AT: datetime | None = None
 
-    def expand(course_id: str, depth: int, min_grade: int | None = None) -> Dict:
-        if depth >= max_depth or course_id in visited:
-            return {"id": course_id, "groups": [], "min_grade": min_grade}
-        visited.add(course_id)
-        groups = fetch_prereq_groups(cursor, course_id)
-        children = []
-        for g in groups:
-            for item in g["courses"]:
-                children.append(expand(item["course_id"], depth + 1, item["min_grade"]))
-        return {"id": course_id, "groups": groups, "children": children, "min_grade": min_grade}
 
-    return expand(root_id, 0)
+async def load_prereq_graph(cursor) -> None:
+    global FORWARD, REVERSE, PREREQ_GRAPH_VERSION, PREREQ_GRAPH_LOADED_AT
+    await cursor.execute(
+        "SELECT course_id, prerequisite_group, prereq_course_id, min_grade FROM course_prereq "
+        "ORDER BY course_id, prerequisite_group, prereq_course_id"
+    )
+    rows_by_course: Dict[str, List[Tuple]] = {}
+    dependents: Dict[str, Set[str]] = {}
+    async for cid, grp, prereq, min_grade in cursor:
+        rows_by_course.setdefault(cid, []).append((grp, prereq, min_grade))
+        dependents.setdefault(prereq, set()).add(cid)
+    # Build fully, then swap, so readers never see a half-loaded graph
+    FORWARD = {cid: _group_prereq_rows(rows) for cid, rows in rows_by_course.items()}
+    REVERSE = {prereq: sorted(cids) for prereq, cids in dependents.items()}
+    PREREQ_GRAPH_VERSION += 1
+    PREREQ_GRAPH_LOADED_AT = datetime.now(ZoneInfo("America/Toronto"))
+
+
+async def _reload_prereq_graph_periodically():
+    while True:
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await load_prereq_graph(cur)
+            # The reload picks up new data; drop cached rows that may predate it
+            invalidate_course_caches()
+        except Exception:
+            # Keep serving the previous graph (or SQL fallback); next tick will retry
+            pass
+        await asyncio.sleep(PREREQ_GRAPH_RELOAD_SECONDS)
 
 
-def fetch_course_metrics_map(cursor, ids: Set[str]) -> Dict[str, Dict]:
-    if not ids:
-        return {}
-    # SQL requires placeholders list of the right length
-    placeholders = ",".join(["%s"] * len(ids))
-    cursor.execute(
-        f"SELECT course_id, liked, easy, useful, rating_num FROM course WHERE course_id IN ({placeholders})",
-        tuple(ids),
+async def fetch_prereq_groups(cursor, course_id: str) -> List[Dict]:
+    if FORWARD is not None:
+        return FORWARD.get(course_id, [])
+    with _CACHE_LOCK:
+        cached = PREREQ_CACHE.get(course_id)
+    if cached is not None:
+        return cached
+    await cursor.execute(
+        """
+        SELECT prerequisite_group, prereq_course_id, min_grade
+        FROM course_prereq
+        WHERE course_id = %s
+        ORDER BY prerequisite_group, prereq_course_id
+        """,
+        (course_id,),
+        prepare=True,
     )
-    out: Dict[str, Dict] = {}
-    for row in cursor.fetchall():
-        out[row[0]] = {
-            "liked": None if row[1] is None else float(row[1]),
-            "easy": None if row[2] is None else float(row[2]),
-            "useful": None if row[3] is None else float(row[3]),
-            "rating_num": None if row[4] is None else int(row[4]),
-        }
-    return out
+    groups = _group_prereq_rows(await cursor.fetchall())
+    with _CACHE_LOCK:
+        PREREQ_CACHE[course_id] = groups
+    return groups
+
+
+# Every prereq row reachable from the seed ids within %s levels, in one round-trip.
+# Seeds with no prereqs still come back (as a single all-NULL row) so they can be cached.
+_PREREQ_CLOSURE_SQL = """
+WITH RECURSIVE reach(course_id, depth) AS (
+    SELECT seed, 0 FROM unnest(%s::text[]) AS seed
+    UNION
+    SELECT cp.prereq_course_id::text, r.depth + 1
+    FROM course_prereq cp JOIN reach r ON cp.course_id = r.course_id
+    WHERE r.depth + 1 < %s
+)
+SELECT r.course_id, cp.prerequisite_group, cp.prereq_course_id, cp.min_grade
+FROM (SELECT DISTINCT course_id FROM reach) r
+LEFT JOIN course_prereq cp ON cp.course_id = r.course_id
+ORDER BY r.course_id, cp.prerequisite_group, cp.prereq_course_id
+"""
+
+
+async def build_prereq_tree(cursor, root_id: str, *, max_depth: int = 99) -> Tuple[Dict, Set[str]]:
+    # Breadth-first over an in-memory map. Without the preloaded graph, uncached
+    # subtrees are pulled with a single recursive CTE, so a cold tree costs one
+    # query regardless of depth. Also returns every course id placed in the tree.
+    root: Dict = {"id": root_id, "groups": [], "min_grade": None}
+    if max_depth <= 0:
+        return root, {root_id}
+    visited: Set[str] = {root_id}
+    tree_ids: Set[str] = {root_id}
+    frontier: List[Dict] = [root]
+    depth = 0
+    graph = FORWARD
+    groups_by_course: Dict[str, List[Dict]] = graph if graph is not None else {}
+    while frontier:
+        if graph is None:
+            with _CACHE_LOCK:
+                for node in frontier:
+                    if node["id"] not in groups_by_course:
+                        cached = PREREQ_CACHE.get(node["id"])
+                        if cached is not None:
+                            groups_by_course[node["id"]] = cached
+            missing = [node["id"] for node in frontier if node["id"] not in groups_by_course]
+            if missing:
+                await cursor.execute(_PREREQ_CLOSURE_SQL, (missing, max_depth - depth), prepare=True)
+                rows_by_course: Dict[str, List[Tuple]] = {}
+                # Iterate the cursor instead of materialising a fetchall() list
+                async for cid, grp, prereq, min_grade in cursor:
+                    rows = rows_by_course.setdefault(cid, [])
+                    if prereq is not None:
+                        rows.append((grp, prereq, min_grade))
+                fetched = {cid: _group_prereq_rows(rows) for cid, rows in rows_by_course.items()}
+                groups_by_course.update(fetched)
+                with _CACHE_LOCK:
+                    PREREQ_CACHE.update(fetched)
+
+        next_frontier: List[Dict] = []
+        for node in frontier:
+            groups = groups_by_course.get(node["id"], [])
+            children = []
+            for g in groups:
+                for item in g["courses"]:
+                    child = {"id": item["course_id"], "groups": [], "min_grade": item["min_grade"]}
+                    children.append(child)
+                    tree_ids.add(item["course_id"])
+                    # Courses already expanded elsewhere (or past max depth) stay leaves
+                    if depth + 1 < max_depth and item["course_id"] not in visited:
+                        visited.add(item["course_id"])
+                        next_frontier.append(child)
+            node["groups"] = groups
+            node["children"] = children
+        frontier = next_frontier
+        depth += 1
+    return root, tree_ids
+
+
+def _metrics_from_row(row) -> Dict:
+    # row = (liked, easy, useful, rating_num)
+    return {
+        "liked": None if row[0] is None else float(row[0]),
+        "easy": None if row[1] is None else float(row[1]),
+        "useful": None if row[2] is None else float(row[2]),
+        "rating_num": None if row[3] is None else int(row[3]),
+    }
 
 
-def fetch_metrics_medians(cursor) -> Dict[str, float]:
-    # Compute medians in-database to avoid transferring entire table
-    cursor.execute(
-        (
-            "SELECT "
-            "  COALESCE((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY liked) FROM course WHERE liked IS NOT NULL), 0.0) AS liked_med, "
-            "  COALESCE((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY easy) FROM course WHERE easy IS NOT NULL), 0.0) AS easy_med, "
-            "  COALESCE((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY useful) FROM course WHERE useful IS NOT NULL), 0.0) AS useful_med "
-        )
-    )
-    row = cursor.fetchone() or (0.0, 0.0, 0.0)
+# Medians/minimums only change when data is reloaded, so keep them in-process
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "300"))
+_METRICS_CACHE: Dict[str, Tuple[float, Dict[str, float]]] = {}
+
+
+def _metrics_cache_get(key: str) -> Dict[str, float] | None:
+    hit = _METRICS_CACHE.get(key)
+    if hit is None or time.monotonic() - hit[0] >= METRICS_CACHE_TTL:
+        return None
+    # Hand out a copy so callers can't mutate the cached value
+    return dict(hit[1])
+
+
+def _metrics_cache_put(key: str, value: Dict[str, float]) -> None:
+    _METRICS_CACHE[key] = (time.monotonic(), dict(value))
+
+
+def invalidate_metrics_cache() -> None:
+    _METRICS_CACHE.clear()
+
+
+def _medians_from_row(row) -> Dict[str, float]:
+    row = row or (0.0, 0.0, 0.0)
     return {"liked": float(row[0] or 0.0), "easy": float(row[1] or 0.0), "useful": float(row[2] or 0.0)}
 
 
-def fetch_metrics_min(cursor) -> Dict[str, float]:
-    cursor.execute("SELECT MIN(liked), MIN(easy), MIN(useful) FROM course")
-    row = cursor.fetchone() or (None, None, None)
+def _mins_from_row(row) -> Dict[str, float]:
+    row = row or (None, None, None)
     return {
         "liked": 0.0 if row[0] is None else float(row[0]),
         "easy": 0.0 if row[1] is None else float(row[1]),
@@ -268,137 +491,220 @@ def fetch_metrics_min(cursor) -> Dict[str, float]:
     }
 
 
-def build_future_tree(cursor, root_id: str, *, max_depth: int = 2) -> Dict:
-    visited: Set[str] = set([root_id])
-
-    def forward(course_id: str, depth: int) -> Dict:
-        if depth > max_depth:
-            return {"id": course_id}
-        cursor.execute(
-            "SELECT DISTINCT course_id FROM course_prereq WHERE prereq_course_id = %s",
-            (course_id,),
+# Every (prereq, dependent) edge whose prereq is within %s levels of the root, in one round-trip.
+_FUTURE_CLOSURE_SQL = """
+WITH RECURSIVE reach(course_id, depth) AS (
+    SELECT %s::text, 1
+    UNION
+    SELECT cp.course_id::text, r.depth + 1
+    FROM course_prereq cp JOIN reach r ON cp.prereq_course_id = r.course_id
+    WHERE r.depth + 1 <= %s
+)
+SELECT DISTINCT prereq_course_id, course_id
+FROM course_prereq
+WHERE prereq_course_id IN (SELECT course_id FROM reach)
+ORDER BY prereq_course_id, course_id
+"""
+
+
+async def build_future_tree(cursor, root_id: str, *, max_depth: int = 2) -> Tuple[Dict, Set[str]]:
+    # Walk the in-memory reverse graph, or fetch the reachable edges with one
+    # recursive CTE when it isn't loaded; the tree is then built breadth-first.
+    # Also returns every course id placed in the tree (each appears once).
+    root: Dict = {"id": root_id}
+    if max_depth < 1:
+        return root, {root_id}
+    next_by_parent = REVERSE
+    if next_by_parent is None:
+        await cursor.execute(_FUTURE_CLOSURE_SQL, (root_id, max_depth), prepare=True)
+        next_by_parent = {}
+        async for parent, nxt in cursor:
+            next_by_parent.setdefault(parent, []).append(nxt)
+
+    visited: Set[str] = {root_id}
+    frontier: List[Dict] = [root]
+    depth = 1
+    while frontier:
+        next_frontier: List[Dict] = []
+        for node in frontier:
+            children = []
+            for nxt in next_by_parent.get(node["id"], []):
+                if nxt in visited:
+                    continue
+                visited.add(nxt)
+                child = {"id": nxt}
+                children.append(child)
+                if depth + 1 <= max_depth:
+                    next_frontier.append(child)
+            node["children"] = children
+        frontier = next_frontier
+        depth += 1
+    return root, visited
+
+
+async def fetch_tree_payload(cursor, course_id: str, ids: Set[str]) -> Tuple[Dict, Dict[str, Dict], Dict[str, float], Dict[str, float]]:
+    """Fetch the course row, per-course metrics, medians and minimums in one round-trip.
+
+    Medians and minimums come from the in-process cache when fresh, in which case
+    the table-wide aggregates are left out of the query.
+
+    Returns (course, metrics_map, metrics_median, metrics_min).
+    """
+    metrics_median = _metrics_cache_get("median")
+    metrics_min = _metrics_cache_get("min")
+    need_aggregates = metrics_median is None or metrics_min is None
+    aggregates = (
+        "'median', (SELECT json_build_array(liked, easy, useful) FROM med), "
+        "'min', (SELECT json_build_array(liked, easy, useful) FROM mn)"
+        if need_aggregates
+        else "'median', NULL, 'min', NULL"
+    )
+    await cursor.execute(
+        f"""
+        WITH c AS (
+            SELECT course_id, liked, easy, useful, rating_num FROM course WHERE course_id = ANY(%s)
+        ),
+        med AS (
+            SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY liked) AS liked,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY easy) AS easy,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY useful) AS useful
+            FROM course
+        ),
+        mn AS (
+            SELECT MIN(liked) AS liked, MIN(easy) AS easy, MIN(useful) AS useful FROM course
         )
-        next_courses = [r[0] for r in cursor.fetchall()]
-        children = []
-        for nxt in next_courses:
-            if nxt in visited:
-                continue
-            visited.add(nxt)
-            children.append(forward(nxt, depth + 1))
-        return {"id": course_id, "children": children}
-
-    return forward(root_id, 1)
-
-
-def check_course_exists(cursor, course_id: str) -> bool:
-    """Check if a course ID is present in `course` or `course_prereq` tables."""
-    cursor.execute("SELECT 1 FROM course WHERE TRIM(course_id) = %s LIMIT 1", (course_id,))
-    if cursor.fetchone():
-        return True
-    cursor.execute(
-        "SELECT 1 FROM course_prereq WHERE TRIM(course_id) = %s OR TRIM(prereq_course_id) = %s LIMIT 1",
-        (course_id, course_id),
+        SELECT json_build_object(
+            'course', (SELECT json_build_array({_COURSE_COLUMNS}) FROM course WHERE course_id = %s),
+            'metrics', (SELECT json_agg(json_build_array(course_id, liked, easy, useful, rating_num)) FROM c),
+            {aggregates}
+        )
+        """,
+        (list(ids), course_id),
+        prepare=True,
     )
-    if cursor.fetchone():
+    row = await cursor.fetchone()
+    payload = (row[0] if row else None) or {}
+    course = _course_from_row(course_id, payload.get("course"))
+    metrics_map = {r[0]: _metrics_from_row(r[1:]) for r in payload.get("metrics") or []}
+    if need_aggregates:
+        metrics_median = _medians_from_row(payload.get("median"))
+        metrics_min = _mins_from_row(payload.get("min"))
+        _metrics_cache_put("median", metrics_median)
+        _metrics_cache_put("min", metrics_min)
+    return course, metrics_map, metrics_median, metrics_min
+
+
+_COURSE_EXISTS_SQL = (
+    "SELECT EXISTS (SELECT 1 FROM course WHERE TRIM(course_id) = %s) "
+    "OR EXISTS (SELECT 1 FROM course_prereq WHERE TRIM(course_id) = %s OR TRIM(prereq_course_id) = %s)"
+)
+
+
+async def check_course_exists(cursor, course_id: str) -> bool:
+    """Check if a course ID is present in `course` or `course_prereq` tables.
+
+    A course in the in-memory prereq graph is known to be in `course_prereq`, so only
+    courses outside it cost a query.
+    """
+    graph, reverse = FORWARD, REVERSE
+    if graph is not None and reverse is not None and (course_id in graph or course_id in reverse):
         return True
-    return False
+    await cursor.execute(_COURSE_EXISTS_SQL, (course_id, course_id, course_id), prepare=True)
+    row = await cursor.fetchone()
+    return bool(row and row[0])
 
 
 @app.get("/api/course/{course_id}")
-def get_course(course_id: str):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            course = fetch_course(cur, course_id)
-            cur.execute(
-                "SELECT term FROM offering WHERE course_id = %s ORDER BY term DESC LIMIT 100",
-                (course_id,),
-            )
-            offerings = [{"term": r[0]} for r in cur.fetchall()]
-            course["offerings"] = offerings
-            return course
+async def get_course(course_id: str, cur: psycopg.AsyncCursor = Depends(get_cursor)):
+    conn = cur.connection
+    # Pipeline the offerings and course lookups so both share one round-trip
+    async with conn.pipeline(), conn.cursor() as off_cur:
+        await off_cur.execute(
+            "SELECT term FROM offering WHERE course_id = %s ORDER BY term DESC LIMIT 100",
+            (course_id,),
+        )
+        course = await fetch_course(cur, course_id)
+        offerings = [{"term": r[0]} for r in await off_cur.fetchall()]
+    course["offerings"] = offerings
+    return course
 
 
 @app.get("/api/course/{course_id}/prereqs")
-def get_prereqs(course_id: str):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            groups = fetch_prereq_groups(cur, course_id)
-            return {"course_id": course_id, "groups": groups}
+async def get_prereqs(course_id: str, cur: psycopg.AsyncCursor = Depends(get_cursor)):
+    groups = await fetch_prereq_groups(cur, course_id)
+    return {"course_id": course_id, "groups": groups}
 
 
 @app.get("/api/course/{course_id}/future")
-def get_future(course_id: str, depth: int = 2):
+async def get_future(course_id: str, depth: int = 2, cur: psycopg.AsyncCursor = Depends(get_cursor)):
     if depth < 0 or depth > 6:
         raise HTTPException(400, detail="depth must be between 0 and 6")
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            tree = build_future_tree(cur, course_id, max_depth=depth)
-            return {"course_id": course_id, "tree": tree}
+    tree, _ = await build_future_tree(cur, course_id, max_depth=depth)
+    return {"course_id": course_id, "tree": tree}
 
 
 @app.get("/api/course/{course_id}/tree")
-def get_course_tree(course_id: str, prereq_depth: int = 99, future_depth: int = 2):
+async def get_course_tree(
+    course_id: str, prereq_depth: int = 99, future_depth: int = 2, cur: psycopg.AsyncCursor = Depends(get_cursor)
+):
     if future_depth < 0 or future_depth > 6:
         raise HTTPException(400, detail="future_depth must be between 0 and 6")
     if prereq_depth < 1 or prereq_depth > 100:
         raise HTTPException(400, detail="prereq_depth must be between 1 and 100")
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            if not check_course_exists(cur, course_id):
-                raise HTTPException(status_code=404, detail=f"Course '{course_id}' not found")
-            course = fetch_course(cur, course_id)
-            prereq_tree = build_prereq_tree(cur, course_id, max_depth=prereq_depth)
-            future_tree = build_future_tree(cur, course_id, max_depth=future_depth)
-            # Collect course ids appearing in either tree
-            def collect_ids(node, acc: Set[str]):
-                if not node:
-                    return
-                nid = str(node.get("id") or "")
-                if nid and not (nid.startswith("and-") or nid.startswith("or-")):
-                    acc.add(nid)
-                for ch in node.get("children", []) or []:
-                    collect_ids(ch, acc)
-
-            all_ids: Set[str] = set()
-            collect_ids(prereq_tree, all_ids)
-            collect_ids(future_tree, all_ids)
-            metrics_map = fetch_course_metrics_map(cur, all_ids)
-            metrics_median = fetch_metrics_medians(cur)
-            metrics_min = fetch_metrics_min(cur)
-            return {
-                "course": course,
-                "prereq_tree": prereq_tree,
-                "future_tree": future_tree,
-                "course_metrics": metrics_map,
-                "metrics_median": metrics_median,
-                "metrics_min": metrics_min,
-            }
+    # Unknown courses get their 404 before paying for either traversal
+    if not await check_course_exists(cur, course_id):
+        raise HTTPException(status_code=404, detail=f"Course '{course_id}' not found")
+    prereq_tree, prereq_ids = await build_prereq_tree(cur, course_id, max_depth=prereq_depth)
+    future_tree, future_ids = await build_future_tree(cur, course_id, max_depth=future_depth)
+    # The builders report the course ids they placed, so no second walk over the trees
+    course, metrics_map, metrics_median, metrics_min = await fetch_tree_payload(
+        cur, course_id, prereq_ids | future_ids
+    )
+    return {
+        "course": course,
+        "prereq_tree": prereq_tree,
+        "future_tree": future_tree,
+        "course_metrics": metrics_map,
+        "metrics_median": metrics_median,
+        "metrics_min": metrics_min,
+    }
 
 
 @app.get("/api/course/{course_id}/prereq_source")
-def get_prereq_source(course_id: str):
+async def get_prereq_source(course_id: str, cur: psycopg.AsyncCursor = Depends(get_cursor)):
     """Return the stored raw prerequisite text and parsed JSON for debugging."""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT COALESCE(raw_text, ''), COALESCE(logic_json, '{}') FROM course_prereq_text WHERE course_id = %s",
-                (course_id,)
-            )
-            row = cur.fetchone()
-            if not row:
-                return {"course_id": course_id, "raw_text": "", "logic_json": {}}
-            raw_text = row[0] or ""
-            logic_json = row[1] or "{}"
-            try:
-                import json as _json
-                parsed = _json.loads(logic_json)
-            except Exception:
-                parsed = {}
-            return {"course_id": course_id, "raw_text": raw_text, "logic_json": parsed}
+    with _CACHE_LOCK:
+        cached = PREREQ_SOURCE_CACHE.get(course_id)
+    if cached is not None:
+        return cached
+    # Cast to jsonb so psycopg hands back the parsed value; no json.loads round-trip
+    try:
+        await cur.execute(
+            "SELECT COALESCE(raw_text, ''), COALESCE(logic_json::jsonb, '{}'::jsonb) "
+            "FROM course_prereq_text WHERE course_id = %s",
+            (course_id,),
+            prepare=True,
+        )
+        row = await cur.fetchone()
+    except psycopg.DataError:
+        # Stored text isn't valid JSON, so the cast failed: answer {} as for any unparsable value
+        await cur.connection.rollback()
+        await cur.execute(
+            "SELECT COALESCE(raw_text, ''), '{}'::jsonb FROM course_prereq_text WHERE course_id = %s",
+            (course_id,),
+        )
+        row = await cur.fetchone()
+    if not row:
+        out = {"course_id": course_id, "raw_text": "", "logic_json": {}}
+    else:
+        out = {"course_id": course_id, "raw_text": row[0] or "", "logic_json": row[1]}
+    with _CACHE_LOCK:
+        PREREQ_SOURCE_CACHE[course_id] = out
+    return out
 
 
 @app.get("/api/courses/suggest")
-def suggest_courses(q: str = "", limit: int = 20):
+async def suggest_courses(q: str = "", limit: int = 20, cur: psycopg.AsyncCursor = Depends(get_cursor)):
     """Suggest course codes and names (prefix + contains on code/name).
 
     Returns: { items: [{ course_id, course_name }] }
@@ -407,28 +713,33 @@ def suggest_courses(q: str = "", limit: int = 20):
     lim = max(1, min(int(limit or 20), 100))
     if len(query) < 2 and not any(ch.isdigit() for ch in query):
         return {"items": []}
-
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            pfx = f"{query}%"
-            anylike = f"%{query}%"
-            # Rank: prefix match on code > contains in code > contains in name
-            cur.execute(
-                (
-                    "SELECT course_id, COALESCE(course_name, ''), "
-                    "CASE WHEN UPPER(course_id) LIKE %s THEN 3 "
-                    "     WHEN UPPER(course_id) LIKE %s THEN 2 "
-                    "     WHEN UPPER(course_name) LIKE %s THEN 1 "
-                    "     ELSE 0 END AS rank1, "
-                    "POSITION(%s IN UPPER(course_id)) AS pos "
-                    "FROM course "
-                    "WHERE UPPER(course_id) LIKE %s OR UPPER(course_name) LIKE %s "
-                    "ORDER BY rank1 DESC, pos, course_id "
-                    "LIMIT %s"
-                ),
-                (pfx, anylike, anylike, query, anylike, anylike, lim),
-            )
-            items = [{"course_id": r[0], "course_name": r[1]} for r in cur.fetchall()]
-            return {"items": items}
+    with _CACHE_LOCK:
+        cached = SUGGEST_CACHE.get((query, lim))
+    if cached is not None:
+        return {"items": cached}
+
+    pfx = f"{query}%"
+    anylike = f"%{query}%"
+    # Rank: prefix match on code > contains in code > contains in name
+    await cur.execute(
+        (
+            "SELECT course_id, COALESCE(course_name, ''), "
+            "CASE WHEN UPPER(course_id) LIKE %s THEN 3 "
+            "     WHEN UPPER(course_id) LIKE %s THEN 2 "
+            "     WHEN UPPER(course_name) LIKE %s THEN 1 "
+            "     ELSE 0 END AS rank1, "
+            "POSITION(%s IN UPPER(course_id)) AS pos "
+            "FROM course "
+            "WHERE UPPER(course_id) LIKE %s OR UPPER(course_name) LIKE %s "
+            "ORDER BY rank1 DESC, pos, course_id "
+            "LIMIT %s"
+        ),
+        (pfx, anylike, anylike, query, anylike, anylike, lim),
+        prepare=True,
+    )
+    items = [{"course_id": r[0], "course_name": r[1]} for r in await cur.fetchall()]
+    with _CACHE_LOCK:
+        SUGGEST_CACHE[(query, lim)] = items
+    return {"items": items}
 
 
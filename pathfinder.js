@@ -41,8 +41,8 @@
     return 0.9;
   }
 
-  function isAndNode(node){ return (node?.id || '').startsWith('and-'); }
-  function isOrNode(node){ return !!node?.isGroup || (node?.id || '').startsWith('or-'); }
+  function isAndNode(node){ return node?.junction === 'and'; }
+  function isOrNode(node){ return !!node?.isGroup || node?.junction === 'or'; }
   function isCourseNode(node){ return node && !isAndNode(node) && !isOrNode(node); }
   const keyOf = (n) => (n && (n.uid || n.id));
 
@@ -3,49 +3,112 @@ import os
 import json
 import argparse
 import time
-from typing import Dict, List, Tuple, Optional, Any
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import IO, Callable, Dict, List, Tuple, Optional, Any, Sequence
 
 import requests
-from bs4 import BeautifulSoup
-from requests.exceptions import HTTPError
+from selectolax.parser import HTMLParser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import mysql.connector
 from dotenv import load_dotenv
 
 try:
-    from .llm_parser import parse_prereq_with_llm  # type: ignore
+    import orjson  # type: ignore
+except Exception:  # optional speedup; stdlib json is the fallback
+    orjson = None  # type: ignore
+
+try:
+    from .llm_parser import api_key_count, parse_prereqs_with_llm_batch, set_rate_share  # type: ignore
 except Exception:
-    from llm_parser import parse_prereq_with_llm  # type: ignore
+    from llm_parser import api_key_count, parse_prereqs_with_llm_batch, set_rate_share  # type: ignore
 
 
 CAL_BASE = "https://ucalendar.uwaterloo.ca"
 
 
+def _dumps(obj: Any) -> str:
+    """Compact UTF-8 JSON (non-ASCII kept as-is), via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Patterns used on every course/clause; compiled once at import
+_WS_RE = re.compile(r"\s+")
+_CODE_TOKEN_RE = re.compile(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b")
+_LABEL_RE = re.compile(r"^(Prereq(?:uisite(?:\(s\))?s?)?)\s*:\s*", re.IGNORECASE)
+_STOP_RE = re.compile(r"\b(coreq|co-?requisite|antireq|anti-?requisite|notes?)\b", re.IGNORECASE)
+_PREREQ_PROBE_RE = re.compile(r"\bprereq", re.IGNORECASE)
+_PAREN_RE = re.compile(r"[()]")
+# Code token plus the following 90 chars captured in a lookahead (not consumed, so adjacent codes still match)
+_CODE_CTX_RE = re.compile(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b(?=(?P<ctx>.{0,90}))", re.DOTALL)
+_GRADE_NEARBY_RE = re.compile(r"with (?:a )?grade of at least\s*(\d{1,3})\s*%|with at least\s*(\d{1,3})\s*%", re.IGNORECASE)
+
+
+# Deletes every character \s matches (all str.isspace() code points, the highest being U+3000) plus '-'
+_STRIP_TABLE = str.maketrans("", "", "".join(c for c in map(chr, range(0x3001)) if c.isspace()) + "-")
+
+
+@functools.lru_cache(maxsize=8192)
+def _canonical_code_str(text: str) -> str:
+    return text.upper().translate(_STRIP_TABLE)
+
+
 def canonical_code(text: str) -> str:
     if not text:
         return ""
-    t = re.sub(r"\s+", "", str(text).upper())
-    t = t.replace("-", "")
-    return t
+    # The same few thousand codes recur across DB rows and parsed prereqs
+    return _canonical_code_str(str(text))
 
 
 def normalize_code_from_text(text: str) -> str:
     if not text:
         return ""
-    m = re.search(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b", text)
+    m = _CODE_TOKEN_RE.search(text)
     return (m.group(1) + m.group(2)).upper() if m else ""
 
 
+# One keep-alive session for the whole run so departments reuse the TLS connection
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+})
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])),
+)
+
+
 def fetch_calendar_html(year: str, dept: str) -> str:
     url = f"{CAL_BASE}/{year}/COURSE/course-{dept.upper()}.html"
-    headers = {
-        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
-        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    }
-    resp = requests.get(url, headers=headers, timeout=45)
+    resp = _SESSION.get(url, timeout=45)
     resp.raise_for_status()
     return resp.text
 
 
+def _probe_calendar(year: str, dept: str) -> Optional[int]:
+    """HEAD the department page; returns the status code, or None if the probe itself failed."""
+    url = f"{CAL_BASE}/{year}/COURSE/course-{dept.upper()}.html"
+    try:
+        return _SESSION.head(url, timeout=10, allow_redirects=True).status_code
+    except Exception:
+        return None
+
+
+# Any div whose class list has a token starting with "divTableCell"
+_CELL_SELECTOR = 'div[class^="divTableCell"], div[class*=" divTableCell"]'
+
+
 def extract_course_blocks(html: str) -> List[Tuple[str, List[str]]]:
     """Return a list of (course_code, cell_texts[]) in appearance order.
 
@@ -54,21 +117,21 @@ def extract_course_blocks(html: str) -> List[Tuple[str, List[str]]]:
     The first cell (often with <strong>) contains the header with code like "CS 136 ... 0.50".
     Later cells with <em> may include lines starting with "Prereq:".
     """
-    soup = BeautifulSoup(html, "html.parser")
+    tree = HTMLParser(html)
     blocks: List[Tuple[str, List[str]]] = []
-    for block in soup.find_all("div", class_="divTable"):
+    for block in tree.css("div.divTable"):
         # header cell
-        header_cell = block.find("div", class_="divTableCell")
+        header_cell = block.css_first("div.divTableCell")
         if not header_cell:
             continue
-        header_text = header_cell.get_text(" ", strip=True)
+        header_text = header_cell.text(separator=" ", strip=True)
         code = normalize_code_from_text(header_text)
         if not code:
             continue
-        # collect all cell texts for this course block
+        # collect all cell texts for this course block (divTableCell, divTableCell colspan-2, ...)
         cell_texts: List[str] = []
-        for cell in block.find_all("div", class_=re.compile(r"^divTableCell")):
-            t = cell.get_text(" ", strip=True)
+        for cell in block.css(_CELL_SELECTOR):
+            t = cell.text(separator=" ", strip=True)
             if t:
                 cell_texts.append(t)
         blocks.append((code, cell_texts))
@@ -81,19 +144,53 @@ def extract_prereq_text_from_paragraphs(paragraphs: List[str]) -> str:
     Handles variants like "Prereq:", "Prerequisite(s):", "Prerequisites:", case-insensitive.
     Stops before other headings like Coreq/Antireq/Notes if they appear in the same paragraph.
     """
-    label_re = re.compile(r"^(Prereq(?:uisite(?:\(s\))?s?)?)\s*:\s*", re.IGNORECASE)
-    stop_re = re.compile(r"\b(coreq|co-?requisite|antireq|anti-?requisite|notes?)\b", re.IGNORECASE)
     for para in paragraphs:
-        if re.search(r"\bprereq", para, re.IGNORECASE):
+        if _PREREQ_PROBE_RE.search(para):
             # Many cells prefix with "Prereq:" and sometimes include Coreq/Antireq after.
-            txt = label_re.sub("", para)
-            m = stop_re.search(txt)
+            txt = _LABEL_RE.sub("", para)
+            m = _STOP_RE.search(txt)
             if m:
                 txt = txt[: m.start()].strip()
             return txt.strip()
     return ""
 
 
+def _disk_cache(namespace: str) -> Callable:
+    """Cache a (year, dept) -> JSON-serializable result under ~/.cache/uw_calendar.
+
+    Entries live at <CAL_CACHE_DIR>/<namespace>/<year>/<DEPT>.json and are reused
+    while younger than CAL_CACHE_TTL seconds (default 24h; 0 disables the cache).
+    Cache I/O failures fall through to calling the function.
+    """
+    def deco(fn: Callable[[str, str], Any]) -> Callable[[str, str], Any]:
+        @functools.wraps(fn)
+        def wrapper(year: str, dept: str) -> Any:
+            root = os.path.expanduser(os.getenv("CAL_CACHE_DIR", "~/.cache/uw_calendar"))
+            ttl = float(os.getenv("CAL_CACHE_TTL", "86400"))
+            path = os.path.join(root, namespace, year, f"{dept.upper()}.json")
+            if ttl > 0:
+                try:
+                    if time.time() - os.path.getmtime(path) < ttl:
+                        with open(path, "rb") as f:
+                            return _loads(f.read())
+                except Exception:
+                    pass
+            out = fn(year, dept)
+            if ttl > 0:
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        f.write(_dumps(out))
+                    os.replace(tmp, path)
+                except Exception:
+                    pass
+            return out
+        return wrapper
+    return deco
+
+
+@_disk_cache(namespace="cal")
 def parse_calendar_for_dept(year: str, dept: str) -> Dict[str, str]:
     """Return mapping course_code -> raw prereq text (may be empty if none)."""
     html = fetch_calendar_html(year, dept)
@@ -104,59 +201,35 @@ def parse_calendar_for_dept(year: str, dept: str) -> Dict[str, str]:
     return out
 
 
-def _split_outside_parens(s: str, sep: str) -> List[str]:
-    parts: List[str] = []
-    buf: List[str] = []
-    depth = 0
-    for ch in s:
-        if ch == '(':
-            depth += 1
-        elif ch == ')':
-            depth = max(0, depth - 1)
-        if ch == sep and depth == 0:
-            part = ''.join(buf).strip()
-            if part:
-                parts.append(part)
-            buf = []
-        else:
-            buf.append(ch)
-    tail = ''.join(buf).strip()
-    if tail:
-        parts.append(tail)
-    return parts
-
+def _split_outside_parens(s: str, sep: str, *, ignore_case: bool = False) -> List[str]:
+    """Split `s` on `sep` (a character or a word like ' and ') outside parentheses.
 
-def _split_outside_parens_word(s: str, word: str) -> List[str]:
-    s_lower = s.lower()
-    word_lower = word.lower()
+    Jumps between separator hits with str.find and only walks the parenthesis
+    positions to know the depth at each hit, then slices `s` directly; no
+    per-character loop or buffer joins. Empty parts are dropped.
+    """
+    hay = s.lower() if ignore_case else s
+    needle = sep.lower() if ignore_case else sep
+    parens = [(m.start(), m.group()) for m in _PAREN_RE.finditer(s)]
+    n_parens = len(parens)
     parts: List[str] = []
-    buf: List[str] = []
+    start = 0
     depth = 0
-    i = 0
-    n = len(s)
-    wlen = len(word_lower)
-    while i < n:
-        ch = s[i]
-        if ch == '(':
-            depth += 1
-            buf.append(ch)
-            i += 1
-            continue
-        if ch == ')':
-            depth = max(0, depth - 1)
-            buf.append(ch)
-            i += 1
-            continue
-        if depth == 0 and s_lower.startswith(word_lower, i):
-            part = ''.join(buf).strip()
+    p = 0
+    i = hay.find(needle)
+    while i != -1:
+        while p < n_parens and parens[p][0] < i:
+            depth = depth + 1 if parens[p][1] == '(' else max(0, depth - 1)
+            p += 1
+        if depth == 0:
+            part = s[start:i].strip()
             if part:
                 parts.append(part)
-            buf = []
-            i += wlen
-            continue
-        buf.append(ch)
-        i += 1
-    tail = ''.join(buf).strip()
+            start = i + len(needle)
+            i = hay.find(needle, start)
+        else:
+            i = hay.find(needle, i + 1)
+    tail = s[start:].strip()
     if tail:
         parts.append(tail)
     return parts
@@ -164,27 +237,33 @@ def _split_outside_parens_word(s: str, word: str) -> List[str]:
 
 def heuristic_parse_groups(raw_text: str) -> List[List[Dict[str, Optional[int]]]]:
     # Normalize whitespace and trim terminal punctuation
-    text = re.sub(r"\s+", " ", (raw_text or "")).strip().rstrip('.')
+    text = _WS_RE.sub(" ", (raw_text or "")).strip().rstrip('.')
     if not text:
         return []
+    # Nothing to extract (e.g. "Level at least 2A"): skip the splitting passes
+    if not _CODE_TOKEN_RE.search(text):
+        return []
     # Split into AND-clauses using semicolons outside parentheses; fallback to commas; then ' and '
-    groups_text = _split_outside_parens(text, ';')
-    if len(groups_text) <= 1:
-        groups_text = _split_outside_parens(text, ',')
+    if '(' not in text:
+        # No nesting, so a plain str.split gives the same clauses
+        groups_text = [p for p in (x.strip() for x in text.split(';')) if p]
+        if len(groups_text) <= 1:
+            groups_text = [p for p in (x.strip() for x in text.split(',')) if p]
+    else:
+        groups_text = _split_outside_parens(text, ';')
+        if len(groups_text) <= 1:
+            groups_text = _split_outside_parens(text, ',')
     if len(groups_text) <= 1:
-        groups_text = _split_outside_parens_word(text, ' and ')
-    code_iter_re = re.compile(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b")
-    grade_nearby_re = re.compile(r"with (?:a )?grade of at least\s*(\d{1,3})\s*%|with at least\s*(\d{1,3})\s*%", re.IGNORECASE)
+        groups_text = _split_outside_parens(text, ' and ', ignore_case=True)
     groups: List[List[Dict[str, Optional[int]]]] = []
     for clause in groups_text:
         seen_codes: set[str] = set()
         items: List[Dict[str, Optional[int]]] = []
-        for m in code_iter_re.finditer(clause):
+        for m in _CODE_CTX_RE.finditer(clause):
             code = (m.group(1) + m.group(2)).upper()
             if code in seen_codes:
                 continue
-            lookahead = clause[m.end(): m.end() + 90]
-            g = grade_nearby_re.search(lookahead)
+            g = _GRADE_NEARBY_RE.search(m.group("ctx"))
             mg: Optional[int] = None
             if g:
                 for gi in (1, 2):
@@ -201,6 +280,30 @@ def heuristic_parse_groups(raw_text: str) -> List[List[Dict[str, Optional[int]]]
     return groups
 
 
+def parse_prereqs_batch(raws: List[Tuple[str, str]], known_codes: Sequence[str], *, model: str = "sonar-pro", max_workers: Optional[int] = None, batch_size: int = 8) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Run the LLM parser over many (course_code, raw_text) pairs concurrently.
+
+    Texts are sent batch_size per request, and a small thread pool overlaps the
+    requests; max_workers (default 8 per configured API key) also caps in-flight
+    requests to stay under the provider's rate limit. Returns course_code ->
+    parsed dict, or None where the call failed.
+    """
+    if max_workers is None:
+        max_workers = 8 * api_key_count()
+    def _chunk(chunk: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        try:
+            return parse_prereqs_with_llm_batch([(raw, known_codes) for _code, raw in chunk], model=model)
+        except Exception:
+            return [None] * len(chunk)
+
+    if not raws:
+        return {}
+    chunks = [raws[i:i + batch_size] for i in range(0, len(raws), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as ex:
+        results = [res for part in ex.map(_chunk, chunks) for res in part]
+    return {code: res for (code, _raw), res in zip(raws, results)}
+
+
 def get_db_connection():
     load_dotenv()
     host = os.getenv("DB_HOST")
@@ -208,12 +311,14 @@ def get_db_connection():
     user = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD")
     database = os.getenv("DB_NAME")
-    return mysql.connector.connect(host=host, port=port, user=user, password=password, database=database, autocommit=True)
+    return mysql.connector.connect(host=host, port=port, user=user, password=password, database=database, autocommit=False)
 
 
-def fetch_known_codes_from_db(cur) -> List[str]:
-    cur.execute("SELECT course_id FROM course")
-    return [canonical_code(r[0]) for r in cur.fetchall() if r and r[0]]
+def fetch_known_codes_from_db(conn) -> frozenset:
+    # Unbuffered cursor: rows stream straight into the set instead of a fetchall() list first
+    with conn.cursor(buffered=False) as cur:
+        cur.execute("SELECT course_id FROM course")
+        return frozenset(canonical_code(r[0]) for r in cur if r and r[0])
 
 
 def fetch_db_groups(cur, course_id: str) -> List[List[Dict[str, Optional[int]]]]:
@@ -226,21 +331,43 @@ def fetch_db_groups(cur, course_id: str) -> List[List[Dict[str, Optional[int]]]]
         """,
         (course_id,),
     )
+    return _groups_from_rows(cur.fetchall())
+
+
+def fetch_db_rows_bulk(cur, course_ids: List[str]) -> Dict[str, List[Tuple[int, str, Optional[int]]]]:
+    """Fetch current course_prereq rows for many courses in one query.
+
+    Returns course_id -> [(prerequisite_group, prereq_course_id, min_grade)] ordered like fetch_db_groups.
+    """
+    out: Dict[str, List[Tuple[int, str, Optional[int]]]] = {}
+    if not course_ids:
+        return out
+    fmt = ",".join(["%s"] * len(course_ids))
+    cur.execute(
+        f"SELECT course_id, prerequisite_group, prereq_course_id, min_grade FROM course_prereq "
+        f"WHERE course_id IN ({fmt}) ORDER BY course_id, prerequisite_group, prereq_course_id",
+        tuple(course_ids),
+    )
+    for cid, grp, pid, mg in cur.fetchall():
+        out.setdefault(canonical_code(cid), []).append((grp, pid, mg))
+    return out
+
+
+def _groups_from_rows(rows) -> List[List[Dict[str, Optional[int]]]]:
     groups: Dict[int, List[Dict[str, Optional[int]]]] = {}
-    for grp, pid, mg in cur.fetchall():
+    for grp, pid, mg in rows:
         groups.setdefault(int(grp), []).append({"code": canonical_code(pid), "min_grade": (int(mg) if mg is not None else None)})
     return [groups[k] for k in sorted(groups.keys())]
 
 
 def groups_equal(a: List[List[Dict[str, Optional[int]]]], b: List[List[Dict[str, Optional[int]]]]) -> bool:
+    # Order-insensitive at both levels; repeated clauses/items are logically redundant in CNF
     def norm(g: List[List[Dict[str, Optional[int]]]]):
-        return [sorted([(x["code"], x.get("min_grade")) for x in clause]) for clause in g]
-    na = sorted(norm(a))
-    nb = sorted(norm(b))
-    return na == nb
+        return frozenset(frozenset((x["code"], x.get("min_grade")) for x in clause) for clause in g)
+    return norm(a) == norm(b)
 
 
-def replace_db_groups(cur, course_id: str, groups: List[List[Dict[str, Optional[int]]]]):
+def replace_db_groups(cur, course_id: str, groups: List[List[Dict[str, Optional[int]]]], current_rows: Optional[List[Tuple[int, str, Optional[int]]]] = None):
     # Build desired set with stricter min_grade kept per (course_id, prereq, group)
     desired: Dict[Tuple[str, str, int], Optional[int]] = {}
     for gidx, clause in enumerate(groups, start=1):
@@ -257,13 +384,15 @@ def replace_db_groups(cur, course_id: str, groups: List[List[Dict[str, Optional[
             if key not in desired or (mgv is not None and (desired[key] is None or mgv > desired[key])):
                 desired[key] = mgv
 
-    # Fetch current rows for this course
-    cur.execute(
-        "SELECT prereq_course_id, prerequisite_group, min_grade FROM course_prereq WHERE course_id = %s",
-        (course_id,),
-    )
+    # Current rows for this course: prefetched by the caller, or read now
+    if current_rows is None:
+        cur.execute(
+            "SELECT prerequisite_group, prereq_course_id, min_grade FROM course_prereq WHERE course_id = %s",
+            (course_id,),
+        )
+        current_rows = cur.fetchall()
     current: Dict[Tuple[str, int], Optional[int]] = {}
-    for pid, grp, mg in cur.fetchall():
+    for grp, pid, mg in current_rows:
         current[(canonical_code(pid), int(grp))] = int(mg) if mg is not None else None
 
     # Compute deletes (present in current but not in desired) and upserts
@@ -275,34 +404,37 @@ def replace_db_groups(cur, course_id: str, groups: List[List[Dict[str, Optional[
     # Ensure prereq courses exist
     _ensure_courses_exist(cur, [pid for (pid, _grp, _mg) in to_upsert])
 
-    # Delete only necessary rows (one-by-one with retries)
-    for pid, grp in to_delete:
-        for attempt in range(5):
-            try:
-                cur.execute(
-                    "DELETE FROM course_prereq WHERE course_id=%s AND prereq_course_id=%s AND prerequisite_group=%s",
-                    (course_id, pid, grp),
-                )
-                break
-            except Exception as e:
-                if attempt == 4 or not any(code in str(e) for code in ["1213", "1205"]):
-                    raise
-                time.sleep(0.25 * (attempt + 1))
-
-    # Upsert desired rows
-    for pid, grp, mg in to_upsert:
-        for attempt in range(5):
-            try:
-                cur.execute(
-                    "INSERT INTO course_prereq (course_id, prereq_course_id, prerequisite_group, min_grade) VALUES (%s,%s,%s,%s) "
-                    "ON DUPLICATE KEY UPDATE min_grade=VALUES(min_grade)",
-                    (course_id, pid, grp, mg),
-                )
-                break
-            except Exception as e:
-                if attempt == 4 or not any(code in str(e) for code in ["1213", "1205"]):
-                    raise
-                time.sleep(0.25 * (attempt + 1))
+    # Delete only necessary rows, then upsert desired rows (one batch each)
+    _executemany_with_retry(
+        cur,
+        "DELETE FROM course_prereq WHERE course_id=%s AND prereq_course_id=%s AND prerequisite_group=%s",
+        [(course_id, pid, grp) for pid, grp in to_delete],
+    )
+    _executemany_with_retry(
+        cur,
+        "INSERT INTO course_prereq (course_id, prereq_course_id, prerequisite_group, min_grade) VALUES (%s,%s,%s,%s) "
+        "ON DUPLICATE KEY UPDATE min_grade=VALUES(min_grade)",
+        [(course_id, pid, grp, mg) for pid, grp, mg in to_upsert],
+    )
+
+
+def _executemany_with_retry(cur, sql: str, rows: List[Tuple]) -> None:
+    """executemany with a short backoff on lock wait timeout (1205).
+
+    Only the timed-out statement is rolled back on 1205, so retrying it is safe
+    mid-transaction. A deadlock (1213) rolls back the whole transaction and is
+    raised for the caller to roll back the course.
+    """
+    if not rows:
+        return
+    for attempt in range(5):
+        try:
+            cur.executemany(sql, rows)
+            return
+        except Exception as e:
+            if attempt == 4 or "1205" not in str(e):
+                raise
+            time.sleep(0.25 * (attempt + 1))
 
 
 def upsert_prereq_text(cur, course_id: str, raw_text: str, logic: Dict[str, Any]):
@@ -313,11 +445,13 @@ def upsert_prereq_text(cur, course_id: str, raw_text: str, logic: Dict[str, Any]
             VALUES (%s, 'uw_calendar', %s, %s)
             ON DUPLICATE KEY UPDATE source=VALUES(source), raw_text=VALUES(raw_text), logic_json=VALUES(logic_json), parsed_at=CURRENT_TIMESTAMP
             """,
-            (course_id, raw_text, json.dumps(logic, ensure_ascii=False)),
+            (course_id, raw_text, _dumps(logic)),
         )
-    except Exception:
-        # Table may not exist in some schemas; ignore
-        pass
+    except Exception as e:
+        # Table may not exist in some schemas (1146); ignore only that. Anything else, a
+        # lock wait or deadlock in particular, must reach the caller so it rolls back the course.
+        if "1146" not in str(e):
+            raise
 
 
 def _ensure_courses_exist(cur, codes: List[str]) -> None:
@@ -336,26 +470,43 @@ def _ensure_courses_exist(cur, codes: List[str]) -> None:
 
 def verify_department(dept: str, *, year: str = "2324", apply: bool = False, model: str = "sonar-pro", confidence_threshold: float = 0.75, only_course: Optional[str] = None, log_path: str = "calendar_verify.ndjson") -> Dict[str, int]:
     stats = {"checked": 0, "updated": 0, "skipped_low_conf": 0, "no_change": 0, "missing_prereq_text": 0, "skipped_locked": 0}
+    dept_upper = dept.upper()
     cal_map = parse_calendar_for_dept(year, dept)
     conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
+        # One buffered handle for the whole department instead of open/close per record
+        with conn.cursor() as cur, open(log_path, "a", encoding="utf-8", buffering=1 << 16) as logf:
             # Reduce lock waits to fail fast and retry
             try:
                 cur.execute("SET SESSION innodb_lock_wait_timeout = 3")
             except Exception:
                 pass
-            known_codes = set(fetch_known_codes_from_db(cur))
+            # Writes are committed once per course; READ COMMITTED keeps the prefetch
+            # SELECTs from holding a snapshot across the whole department
+            try:
+                cur.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            except Exception:
+                pass
+            known_codes = fetch_known_codes_from_db(conn)
+            # Sorted once per department; a tuple so the parser can't mutate the shared copy
+            sorted_known = tuple(sorted(known_codes))
+            if only_course:
+                cal_map = {c: r for c, r in cal_map.items() if c == canonical_code(only_course)}
+            # Parse every course's text up front, concurrently, instead of one blocking call per loop iteration
+            llm_results = parse_prereqs_batch(
+                [(c, r) for c, r in cal_map.items() if r], sorted_known, model=model
+            )
+            # Current prereq rows for the whole department in one round-trip; courses
+            # without prereq text are skipped before they'd need them
+            db_rows = fetch_db_rows_bulk(cur, [c for c, r in cal_map.items() if r])
             for code, raw in cal_map.items():
-                if only_course and canonical_code(only_course) != code:
-                    continue
                 stats["checked"] += 1
                 # Skip if no prereq text found
                 if not raw:
                     stats["missing_prereq_text"] += 1
-                    _log(log_path, {
+                    _log(logf, {
                         "course_id": code,
-                        "dept": dept.upper(),
+                        "dept": dept_upper,
                         "issue": "no_prereq_text",
                         "raw": "",
                     })
@@ -364,15 +515,11 @@ def verify_department(dept: str, *, year: str = "2324", apply: bool = False, mod
                 groups_new: List[List[Dict[str, Optional[int]]]] = []
                 conf: float = 0.0
                 constraints: List[str] = []
-                llm_ok = False
-                try:
-                    llm = parse_prereq_with_llm(raw, sorted(list(known_codes)), model=model)
+                llm = llm_results.get(code)
+                if llm is not None:
                     groups_new = llm.get("groups") or []
                     conf = float(llm.get("confidence") or 0.0)
                     constraints = llm.get("constraints") or []
-                    llm_ok = True
-                except Exception as e:
-                    llm_ok = False
                 # Heuristic fallback when LLM unavailable or weak
                 if not groups_new or conf < 0.1:
                     heur = heuristic_parse_groups(raw)
@@ -381,14 +528,11 @@ def verify_department(dept: str, *, year: str = "2324", apply: bool = False, mod
                         # Assign moderate confidence to allow update when structure is clear
                         conf = max(conf, 0.82)
 
-                # Fetch current groups from DB
-                current = fetch_db_groups(cur, code)
-
-                # Decide action
+                # Decide action; nothing parsed means nothing to compare against the DB
                 if not groups_new:
-                    _log(log_path, {
+                    _log(logf, {
                         "course_id": code,
-                        "dept": dept.upper(),
+                        "dept": dept_upper,
                         "issue": "empty_groups",
                         "confidence": conf,
                         "raw": raw[:500],
@@ -397,19 +541,24 @@ def verify_department(dept: str, *, year: str = "2324", apply: bool = False, mod
                     stats["skipped_low_conf"] += 1
                     continue
 
+                # Current groups from the department prefetch
+                current_rows = db_rows.get(code, [])
+                current = _groups_from_rows(current_rows)
+
                 if groups_equal(groups_new, current):
                     stats["no_change"] += 1
                     # Still store the latest parsed text for audit
                     try:
                         upsert_prereq_text(cur, code, raw, {"groups": groups_new, "constraints": constraints, "confidence": conf})
+                        conn.commit()
                     except Exception:
-                        pass
+                        conn.rollback()
                     continue
 
                 if conf < confidence_threshold:
-                    _log(log_path, {
+                    _log(logf, {
                         "course_id": code,
-                        "dept": dept.upper(),
+                        "dept": dept_upper,
                         "issue": "mismatch_low_conf",
                         "confidence": conf,
                         "raw": raw[:500],
@@ -422,15 +571,18 @@ def verify_department(dept: str, *, year: str = "2324", apply: bool = False, mod
 
                 # High-confidence update
                 if apply:
+                    # One transaction (and one commit) per course
                     try:
-                        replace_db_groups(cur, code, groups_new)
+                        replace_db_groups(cur, code, groups_new, current_rows)
                         upsert_prereq_text(cur, code, raw, {"groups": groups_new, "constraints": constraints, "confidence": conf})
+                        conn.commit()
                     except Exception as e:
+                        conn.rollback()
                         # If we repeatedly hit locks/deadlocks on this course, log and continue
                         if any(code in str(e) for code in ["1213", "1205"]):
-                            _log(log_path, {
+                            _log(logf, {
                                 "course_id": code,
-                                "dept": dept.upper(),
+                                "dept": dept_upper,
                                 "issue": "skipped_locked",
                                 "confidence": conf,
                                 "raw": raw[:500],
@@ -442,9 +594,9 @@ def verify_department(dept: str, *, year: str = "2324", apply: bool = False, mod
                             stats["skipped_locked"] += 1
                             continue
                         raise
-                _log(log_path, {
+                _log(logf, {
                     "course_id": code,
-                    "dept": dept.upper(),
+                    "dept": dept_upper,
                     "issue": "updated" if apply else "would_update",
                     "confidence": conf,
                     "raw": raw[:500],
@@ -458,14 +610,32 @@ def verify_department(dept: str, *, year: str = "2324", apply: bool = False, mod
     return stats
 
 
-def _log(path: str, obj: Dict[str, Any]) -> None:
+def _log(logf: IO[str], obj: Dict[str, Any]) -> None:
     try:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        logf.write(_dumps(obj) + "\n")
     except Exception:
         pass
 
 
+def _run_dept(job: Tuple[str, str, bool, str, float, str]) -> Tuple[str, Optional[Dict[str, int]]]:
+    """Process-pool entry point for --all-from-db; stats are None if the department failed."""
+    dept, year, apply, model, confidence_threshold, log_path = job
+    try:
+        stats = verify_department(
+            dept,
+            year=year,
+            apply=apply,
+            model=model,
+            confidence_threshold=confidence_threshold,
+            only_course=None,
+            log_path=log_path,
+        )
+    except Exception:
+        # continue on any department error
+        return dept, None
+    return dept, stats
+
+
 def main():
     parser = argparse.ArgumentParser(description="Verify and update course_prereq from UW Calendar using LLM")
     parser.add_argument("--dept", type=str, default="CS", help="Department code, e.g., CS, MATH, STAT")
@@ -476,6 +646,7 @@ def main():
     parser.add_argument("--confidence-threshold", type=float, default=0.75, help="Min confidence required to update")
     parser.add_argument("--log", type=str, default="calendar_verify.ndjson", help="Path to NDJSON log file")
     parser.add_argument("--all-from-db", action="store_true", help="Process all distinct departments found in the DB")
+    parser.add_argument("--workers", type=int, default=4, help="Departments processed in parallel with --all-from-db (each runs its own LLM thread pool)")
     args = parser.parse_args()
 
     if args.all_from_db:
@@ -487,30 +658,34 @@ def main():
                 depts = [str(r[0]).upper() for r in cur.fetchall() if r and r[0]]
         finally:
             conn.close()
+        # HEAD-probe every department concurrently; skip those without a calendar page
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            status = dict(zip(depts, ex.map(lambda d: _probe_calendar(args.year, d), depts)))
+        depts = [d for d in depts if status[d] != 404]
         summary: Dict[str, Dict[str, int]] = {}
-        for d in depts:
-            try:
-                # probe: skip quickly if page 404s
+        jobs = [(d, args.year, args.apply, args.llm_model, args.confidence_threshold, f"{args.log}.{d}.part") for d in depts]
+        # spawn: workers must not inherit this process's pooled HTTP connections. Each
+        # worker paces its own LLM requests, so they split the PPLX_RPM budget between them.
+        workers = max(1, min(args.workers, len(jobs)))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=set_rate_share,
+            initargs=(workers,),
+        ) as ex:
+            results = list(ex.map(_run_dept, jobs))
+        # Each worker logged to its own part file; append them in department order
+        with open(args.log, "a", encoding="utf-8") as logf:
+            for (d, stats_d), job in zip(results, jobs):
+                part = job[-1]
                 try:
-                    _ = fetch_calendar_html(args.year, d)
-                except HTTPError as he:
-                    # skip departments without a calendar page
-                    if getattr(he, 'response', None) is not None and he.response is not None and he.response.status_code == 404:
-                        continue
-                    # other HTTP errors propagate
-                stats_d = verify_department(
-                    d,
-                    year=args.year,
-                    apply=args.apply,
-                    model=args.llm_model,
-                    confidence_threshold=args.confidence_threshold,
-                    only_course=None,
-                    log_path=args.log,
-                )
-                summary[d] = stats_d
-            except Exception:
-                # continue on any department error
-                continue
+                    with open(part, "r", encoding="utf-8") as pf:
+                        logf.write(pf.read())
+                    os.remove(part)
+                except Exception:
+                    pass
+                if stats_d is not None:
+                    summary[d] = stats_d
         print(json.dumps({"all_from_db": True, "year": args.year, "departments": len(summary), "stats": summary}, indent=2))
         return
     else:
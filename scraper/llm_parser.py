@@ -1,247 +1,807 @@
 import os
+import re
 import json
 import time
-from typing import Dict, Any, List, Optional
+import random
+import asyncio
+import difflib
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson  # type: ignore
+except Exception:  # optional speedup; stdlib json is the fallback
+    orjson = None  # type: ignore
+
+try:
+    import httpx  # type: ignore
+except Exception:  # only needed for the async API
+    httpx = None  # type: ignore
 
 
 PPLX_URL = "https://api.perplexity.ai/chat/completions"
 
+# Keep-alive session so sequential and threaded calls reuse TLS connections.
+# Retries stay in _post_pplx, hence max_retries=0 on the adapter.
+# Thread safety: the session is only used for post() with per-call headers, and its
+# urllib3 pool is thread-safe; the caches, key pool and rate pacer each hold a lock,
+# so the sync API can be called from worker threads (see parse_prereqs_parallel).
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+# Brotli is only decoded when the brotli package is installed, so advertise gzip/deflate
+_SESSION.headers.update({"Content-Type": "application/json", "Accept-Encoding": "gzip, deflate"})
+
+
+def _loads(data: Any) -> Any:
+    """Parse JSON from bytes or str, via orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Exact-match response cache: temperature=0 calls are deterministic, so an identical
+# (model, messages) pair can skip the API. Stored in SQLite under LLM_CACHE_DIR.
+_CACHE_CONN: Optional[sqlite3.Connection] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_key(model: str, messages: List[Dict[str, str]]) -> str:
+    # One fixed-size digest per message: static prefix messages use the digest computed at
+    # import (_STATIC_MSG_DIGESTS), so only the per-call messages are encoded and hashed
+    h = hashlib.sha256(model.encode("utf-8") + b"\x00")
+    for m in messages:
+        h.update(_STATIC_MSG_DIGESTS.get(id(m)) or hashlib.sha256(_dumps_bytes(m)).digest())
+    return h.hexdigest()
+
+
+def _cache_db() -> sqlite3.Connection:
+    global _CACHE_CONN
+    if _CACHE_CONN is None:
+        root = os.path.expanduser(os.getenv("LLM_CACHE_DIR", "~/.cache/uw_calendar/llm"))
+        os.makedirs(root, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(root, "responses.sqlite3"), check_same_thread=False)
+        conn.execute("CREATE TABLE IF NOT EXISTS response (key TEXT PRIMARY KEY, body TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS prose (key TEXT PRIMARY KEY, obj TEXT NOT NULL)")
+        _CACHE_CONN = conn
+    return _CACHE_CONN
+
+
+def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with _CACHE_LOCK:
+            row = _cache_db().execute("SELECT body FROM response WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception:
+        return None
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _prose_key(raw_text: str, model: str) -> str:
+    # Case, spacing and a trailing period never change the CNF; other punctuation can
+    norm = _WS_RE.sub(" ", (raw_text or "")).strip().rstrip(".").strip().casefold()
+    return hashlib.sha256(f"{model}\x00{norm}".encode("utf-8")).hexdigest()
+
+
+def _prose_get(key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with _CACHE_LOCK:
+            row = _cache_db().execute("SELECT obj FROM prose WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception:
+        return None
+
 
-def _post_pplx(messages: List[Dict[str, str]], *, model: str = "sonar-pro", temperature: float = 0.0, max_retries: int = 3) -> Dict[str, Any]:
-    api_key = os.getenv("PPLX_API_KEY")
-    if not api_key:
+def _prose_put(key: str, obj: Dict[str, Any]) -> None:
+    try:
+        with _CACHE_LOCK:
+            conn = _cache_db()
+            conn.execute("INSERT OR REPLACE INTO prose (key, obj) VALUES (?, ?)", (key, json.dumps(obj)))
+            conn.commit()
+    except Exception:
+        pass
+
+
+def _cache_put(key: str, data: Dict[str, Any]) -> None:
+    try:
+        with _CACHE_LOCK:
+            conn = _cache_db()
+            conn.execute("INSERT OR REPLACE INTO response (key, body) VALUES (?, ?)", (key, json.dumps(data)))
+            conn.commit()
+    except Exception:
+        pass
+
+
+# Round-robin over PPLX_API_KEYS (comma-separated; PPLX_API_KEY if unset) so each key's
+# rate-limit bucket is used. A key that gets a 429 sits out until its Retry-After passes.
+_KEY_LOCK = threading.Lock()
+_KEY_COOLDOWN: Dict[str, float] = {}
+_KEY_NEXT = 0
+
+
+def _api_keys() -> List[str]:
+    keys = [k.strip() for k in (os.getenv("PPLX_API_KEYS") or "").split(",") if k.strip()]
+    if not keys and os.getenv("PPLX_API_KEY"):
+        keys = [os.getenv("PPLX_API_KEY")]
+    return keys
+
+
+def api_key_count() -> int:
+    return max(1, len(_api_keys()))
+
+
+def _next_key() -> str:
+    global _KEY_NEXT
+    keys = _api_keys()
+    if not keys:
         raise RuntimeError("PPLX_API_KEY not set")
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    # Perplexity supports response_format json_schema; define strict schema
-    schema = {
-        "type": "object",
-        "properties": {
-            "groups": {
-                "type": "array",
-                "items": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "code": {"type": "string"},
-                            "min_grade": {"type": ["integer", "null"]},
-                        },
-                        "required": ["code"],
-                        "additionalProperties": False,
-                    },
+    with _KEY_LOCK:
+        now = time.time()
+        for n in range(len(keys)):
+            k = keys[(_KEY_NEXT + n) % len(keys)]
+            if _KEY_COOLDOWN.get(k, 0.0) <= now:
+                _KEY_NEXT = (_KEY_NEXT + n + 1) % len(keys)
+                return k
+        # Every key is cooling down: use the one that frees up first
+        return min(keys, key=lambda k: _KEY_COOLDOWN.get(k, 0.0))
+
+
+def _cool_down(api_key: str, seconds: float) -> float:
+    """Bench a rate-limited key; returns how long until any key is usable again."""
+    with _KEY_LOCK:
+        now = time.time()
+        _KEY_COOLDOWN[api_key] = now + seconds
+        return max(0.0, min(_KEY_COOLDOWN.get(k, 0.0) for k in _api_keys() or [api_key]) - now)
+
+
+# Perplexity's structured output: the model is constrained to these shapes, so the prompt
+# needs fewer examples. Models that reject json_schema (HTTP 400 naming json_schema or
+# response_format) fall back to plain text; any other 400 is a plain error.
+_RESULT_PROPS: Dict[str, Any] = {
+    "groups": {
+        "type": "array",
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "code": {"type": "string"},
+                    "min_grade": {"type": ["integer", "null"]},
                 },
+                "required": ["code"],
+                "additionalProperties": False,
             },
-            "constraints": {"type": "array", "items": {"type": "string"}},
-            "confidence": {"type": "number"},
         },
-        "required": ["groups"],
-        "additionalProperties": False,
-    }
-    # Some models may not accept json_schema; prefer 'text' format and instruct JSON-only.
-    body = {
-        "model": model,
-        "temperature": temperature,
-        "messages": messages,
-        "response_format": {"type": "text"},
-    }
+    },
+    "constraints": {"type": "array", "items": {"type": "string"}},
+    "confidence": {"type": "number"},
+}
+RESULT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": _RESULT_PROPS,
+    "required": ["groups"],
+    "additionalProperties": False,
+}
+BATCH_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"idx": {"type": "integer"}, **_RESULT_PROPS},
+                "required": ["idx", "groups"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["results"],
+    "additionalProperties": False,
+}
+_TEXT_FORMAT: Dict[str, Any] = {"type": "text"}
+_SCHEMA_REJECTED: set = set()
+
+
+def _schema_error(text: str) -> bool:
+    """Whether a 400 body complains about structured output rather than the request itself."""
+    t = (text or "").lower()
+    return "json_schema" in t or "response_format" in t
+
+
+def _response_format(model: str, schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if schema is None or model in _SCHEMA_REJECTED:
+        return _TEXT_FORMAT
+    return {"type": "json_schema", "json_schema": {"schema": schema}}
+
+
+def _post_pplx(messages: List[Dict[str, str]], *, model: str = "sonar-pro", temperature: float = 0.0, max_retries: int = 3, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    key = _cache_key(model, messages) if temperature == 0 else None
+    if key is not None:
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+    if not _api_keys():  # fail fast without advancing the round-robin
+        raise RuntimeError("PPLX_API_KEY not set")
+    response_format = _response_format(model, schema)
+    body = _request_body(messages, model, temperature, response_format)
     last_err = None
-    for i in range(max_retries):
+    # A json_schema rejection earns one extra attempt, so the text resend always happens
+    attempts = max_retries
+    i = 0
+    while i < attempts:
+        wait = None
+        api_key = _next_key()
+        headers = {"Authorization": f"Bearer {api_key}"}
+        delay = _rate_delay()
+        if delay > 0:
+            time.sleep(delay)
         try:
-            resp = requests.post(PPLX_URL, headers=headers, json=body, timeout=45)
+            resp = _SESSION.post(PPLX_URL, headers=headers, data=body, timeout=45)
             if resp.status_code == 200:
-                return resp.json()
+                data = _loads(resp.content)
+                if key is not None:
+                    _cache_put(key, data)
+                return data
             last_err = RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
-        except Exception as e:
+            if resp.status_code == 400 and response_format is not _TEXT_FORMAT and _schema_error(resp.text):
+                # Structured output not supported for this model: resend as text right away
+                _SCHEMA_REJECTED.add(model)
+                response_format = _TEXT_FORMAT
+                body = _request_body(messages, model, temperature, response_format)
+                attempts += 1
+                wait = 0.0
+            # Only rate limits and server errors are worth retrying
+            elif resp.status_code != 429 and resp.status_code < 500:
+                raise last_err
+            if resp.status_code == 429:
+                # Another key may be free right away
+                wait = _cool_down(api_key, _backoff(i, resp.headers.get("Retry-After")))
+        except requests.RequestException as e:
+            last_err = e
+        if i + 1 < attempts:
+            time.sleep(_backoff(i) if wait is None else wait)
+        i += 1
+    raise last_err or RuntimeError("Unknown error calling Perplexity API")
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before retry `attempt + 1`: the server's Retry-After if numeric, else jittered 2**attempt."""
+    if retry_after is not None:
+        try:
+            return min(60.0, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return min(30.0, 2 ** attempt + random.random())
+
+
+def _dumps_bytes(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _request_body(messages: List[Dict[str, str]], model: str, temperature: float, response_format: Dict[str, Any] = _TEXT_FORMAT) -> bytes:
+    """Serialized request JSON; static prefix messages are spliced in from _STATIC_MSG_BYTES."""
+    encoded = b",".join(_STATIC_MSG_BYTES.get(id(m)) or _dumps_bytes(m) for m in messages)
+    return (
+        b'{"model":' + _dumps_bytes(model)
+        + b',"temperature":' + _dumps_bytes(temperature)
+        + b',"messages":[' + encoded
+        + b'],"response_format":' + _dumps_bytes(response_format)
+        + b'}'
+    )
+
+
+# Shared across calls so concurrent parses reuse pooled HTTP/2 connections.
+# Bound to the event loop it was created on; recreated if a later asyncio.run() uses a new loop.
+# The semaphore (PPLX_CONCURRENCY, default 16) caps in-flight async requests, so a large
+# gather() queues here instead of opening connections and tripping rate limits.
+_ASYNC_CLIENT = None
+_ASYNC_CLIENT_LOOP = None
+_ASYNC_SEM: Optional[asyncio.Semaphore] = None
+
+
+def get_client():
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP, _ASYNC_SEM
+    if httpx is None:
+        raise RuntimeError("httpx is required for the async LLM API")
+    loop = asyncio.get_running_loop()
+    # No await between the check and the assignment, so coroutines on one loop can't race here
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT_LOOP is not loop:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            http2=True,
+            timeout=45,
+            # Roomier than the semaphore so the pool is never the bottleneck
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+        )
+        _ASYNC_SEM = asyncio.Semaphore(int(os.getenv("PPLX_CONCURRENCY", "16")))
+        _ASYNC_CLIENT_LOOP = loop
+    return _ASYNC_CLIENT
+
+
+async def aclose_client() -> None:
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP, _ASYNC_SEM
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+    _ASYNC_CLIENT = None
+    _ASYNC_CLIENT_LOOP = None
+    _ASYNC_SEM = None
+
+
+# Request pacing shared by sync threads and async tasks: PPLX_RPM requests per minute
+# (default 100), spread evenly by reserving the next free send slot. The pacer lives in
+# one process; with N worker processes each gets 1/N of the budget (set_rate_share).
+_RATE_LOCK = threading.Lock()
+_RATE_NEXT = 0.0
+_RATE_SHARE = 1
+
+
+def set_rate_share(processes: int) -> None:
+    """Pace this process at PPLX_RPM / processes (call in each of `processes` workers)."""
+    global _RATE_SHARE
+    _RATE_SHARE = max(1, int(processes))
+
+
+def _rate_delay() -> float:
+    """Reserve a send slot; returns how long the caller must wait before sending."""
+    global _RATE_NEXT
+    rpm = float(os.getenv("PPLX_RPM", "100")) / _RATE_SHARE
+    if rpm <= 0:
+        return 0.0
+    with _RATE_LOCK:
+        now = time.monotonic()
+        slot = max(now, _RATE_NEXT)
+        _RATE_NEXT = slot + 60.0 / rpm
+        return slot - now
+
+
+async def _post_pplx_async(messages: List[Dict[str, str]], *, model: str = "sonar-pro", temperature: float = 0.0, max_retries: int = 3, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    key = _cache_key(model, messages) if temperature == 0 else None
+    if key is not None:
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+    if not _api_keys():  # fail fast without advancing the round-robin
+        raise RuntimeError("PPLX_API_KEY not set")
+    response_format = _response_format(model, schema)
+    body = _request_body(messages, model, temperature, response_format)
+    client = get_client()
+    last_err = None
+    # A json_schema rejection earns one extra attempt, so the text resend always happens
+    attempts = max_retries
+    i = 0
+    while i < attempts:
+        wait = None
+        api_key = _next_key()
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        delay = _rate_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            # Streamed: a success body is accumulated in one buffer and parsed once; an
+            # error body is only read far enough for the message, then the retry starts.
+            # The semaphore is held only for the request itself, not the backoff sleep.
+            async with _ASYNC_SEM, client.stream("POST", PPLX_URL, headers=headers, content=body) as resp:
+                buf = bytearray()
+                if resp.status_code == 200:
+                    async for chunk in resp.aiter_bytes():
+                        buf += chunk
+                    data = _loads(bytes(buf))
+                    if key is not None:
+                        _cache_put(key, data)
+                    return data
+                async for chunk in resp.aiter_bytes():
+                    buf += chunk
+                    if len(buf) >= 200:
+                        break
+                err_text = bytes(buf[:200]).decode('utf-8', 'replace')
+                last_err = RuntimeError(f"HTTP {resp.status_code}: {err_text}")
+                if resp.status_code == 400 and response_format is not _TEXT_FORMAT and _schema_error(err_text):
+                    # Structured output not supported for this model: resend as text right away
+                    _SCHEMA_REJECTED.add(model)
+                    response_format = _TEXT_FORMAT
+                    body = _request_body(messages, model, temperature, response_format)
+                    attempts += 1
+                    wait = 0.0
+                # Only rate limits and server errors are worth retrying
+                elif resp.status_code != 429 and resp.status_code < 500:
+                    raise last_err
+                if resp.status_code == 429:
+                    wait = _cool_down(api_key, _backoff(i, resp.headers.get("Retry-After")))
+        except httpx.TransportError as e:
             last_err = e
-        time.sleep(1.5 * (i + 1))
+        if i + 1 < attempts:
+            await asyncio.sleep(_backoff(i) if wait is None else wait)
+        i += 1
     raise last_err or RuntimeError("Unknown error calling Perplexity API")
 
 
+_SYSTEM_PROMPT = (
+    "You are a data normalizer. Convert prerequisite prose into CNF — an AND of OR-clauses. "
+    "Return JSON only. Schema: { groups: Clause[], constraints: string[], confidence: number }. "
+    "Clause := CourseAlt[] where CourseAlt := { code: string, min_grade?: integer }. "
+    "Rules: (1) Use only codes from the provided whitelist. (2) Parentheses groupings and 'one of' => OR. "
+    "(3) Conjunction words like 'and', semicolons => AND between clauses. (4) Apply phrases like 'with at least N%' to the nearest course(s). "
+    "(5) Put non-course conditions (e.g., program restrictions, averages) into constraints[]."
+)
+
+# Few-shot example to anchor format
+_EX_USER = (
+    "Text:\nCS 335 prerequisites (One of CS 116, CS 136, CS 138, CS 146) or (CS 114 with at least 60%; CS 115 or CS 135); "
+    "One of MATH 106 with at least 70%, MATH 136 or MATH 146; MATH 237 or MATH 247; One of STAT 206, STAT 231, STAT 241.\n\n"
+    "Codes:\nCS116, CS136, CS138, CS146, CS114, CS115, CS135, MATH106, MATH136, MATH146, MATH237, MATH247, STAT206, STAT231, STAT241"
+)
+_EX_ASSISTANT = (
+    '{"groups":['
+    '[{"code":"CS116"},{"code":"CS136"},{"code":"CS138"},{"code":"CS146"}],' 
+    '[{"code":"CS114","min_grade":60},{"code":"CS115"},{"code":"CS135"}],' 
+    '[{"code":"MATH106","min_grade":70},{"code":"MATH136"},{"code":"MATH146"}],' 
+    '[{"code":"MATH237"},{"code":"MATH247"}],' 
+    '[{"code":"STAT206"},{"code":"STAT231"},{"code":"STAT241"}]' 
+    '],"constraints":[],"confidence":0.9}'
+)
+
+# Second example: slash alternatives (A/B) inside a "one of" list.
+# The json_schema response format pins the output shape, so two examples are enough.
+_EX2_USER = (
+    "Text:\nOne of AFM 274/AFM 371, ACTSC 372, ACTSC 391/AFM 372 or ECON 372.\n\n"
+    "Codes:\nAFM274, AFM371, ACTSC372, ACTSC391, AFM372, ECON372"
+)
+_EX2_ASSISTANT = (
+    '{"groups":['
+    '[{"code":"AFM274"},{"code":"AFM371"},{"code":"ACTSC372"},{"code":"ACTSC391"},{"code":"AFM372"},{"code":"ECON372"}]'
+    '],"constraints":[],"confidence":0.9}'
+)
+
+# Static few-shot prefix, built once at import; only the final user message varies per call.
+# Sending an identical leading prefix every time also lets the provider reuse its prompt cache.
+_STATIC_PREFIX: Tuple[Dict[str, str], ...] = (
+    {"role": "system", "content": _SYSTEM_PROMPT},
+    {"role": "user", "content": _EX_USER},
+    {"role": "assistant", "content": _EX_ASSISTANT},
+    {"role": "user", "content": _EX2_USER},
+    {"role": "assistant", "content": _EX2_ASSISTANT},
+)
+# System prompt and first example only, for the stricter retry
+_STRICT_PREFIX: Tuple[Dict[str, str], ...] = _STATIC_PREFIX[:3]
+
+
+# One scan per text: "CS 135" / "CS-135" tokens, plus bare numbers after '/' ("AFM 274/371")
+_HINT_SCAN_RE = re.compile(r"\b([A-Z]{2,5})\s*-?\s*(\d{3}[A-Z]?)\b|/\s*(\d{3}[A-Z]?)\b")
+
+
+# (upper-cased code set for membership, same codes sorted for hints/fuzzy matching).
+# Built once per known_codes list and shared by every text parsed against it.
+Whitelist = Tuple[FrozenSet[str], Tuple[str, ...]]
+
+
+def _whitelist(known_codes: Iterable[str]) -> Whitelist:
+    keep = frozenset(str(c).upper() for c in known_codes if c)
+    return keep, tuple(sorted(keep))
+
+
+def _codes_hint(raw_text: str, wl: Whitelist) -> str:
+    """Whitelist codes relevant to this text, instead of the whole catalog.
+
+    Keeps whitelisted codes found by one regex scan of the text, plus close matches
+    for code-like tokens that aren't whitelisted. Falls back to the full (truncated)
+    list when nothing matches. The returned codes are still filtered by _sanitize.
+    """
+    known, codes = wl
+    hits = set()
+    subject: Optional[str] = None
+    for m in _HINT_SCAN_RE.finditer((raw_text or "").upper()):
+        if m.group(1):
+            subject = m.group(1)
+            tok = subject + m.group(2)
+        elif subject:
+            tok = subject + m.group(3)
+        else:
+            continue
+        if tok in known:
+            hits.add(tok)
+        else:
+            hits.update(difflib.get_close_matches(tok, codes, n=3, cutoff=0.8))
+    if not hits:
+        return ", ".join(codes)[:4000]
+    return ", ".join(sorted(hits))
+
+
+def _item_block(raw_text: str, wl: Whitelist) -> str:
+    return "Text:\n" + (raw_text or "").strip() + "\n\n" "Codes:\n" + _codes_hint(raw_text, wl)
+
+
+def _llm_messages(raw_text: str, wl: Whitelist) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Return (few-shot messages, stricter retry messages) for one prerequisite text."""
+    user = _item_block(raw_text, wl) + "\n\nReturn JSON only."
+    messages_all = [*_STATIC_PREFIX, {"role": "user", "content": user}]
+    # Second attempt with a stricter user instruction
+    strict = user + "\n\nReturn VALID JSON only. If uncertain, return {\"groups\":[],\"constraints\":[],\"confidence\":0.3}."
+    messages_strict = [*_STRICT_PREFIX, {"role": "user", "content": strict}]
+    return messages_all, messages_strict
+
+
+def _try_parse(d: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    c = (((d.get("choices") or [{}])[0].get("message") or {}).get("content") or "").strip()
+    try:
+        return _loads(c)
+    except Exception:
+        return None
+
+
+_LOCAL_AND_RE = re.compile(r"\s*;\s*|\s+and\s+", re.IGNORECASE)
+_LOCAL_OR_RE = re.compile(r"\s*,\s*(?:or\s+)?|\s+or\s+|\s*/\s*", re.IGNORECASE)
+_LOCAL_ONE_OF_RE = re.compile(r"^one\s+of\s+", re.IGNORECASE)
+_LOCAL_GRADE_RE = re.compile(r"\s+with\s+(?:a\s+)?(?:(?:minimum\s+)?grade\s+of\s+)?at\s+least\s+(\d{1,3})\s*%$", re.IGNORECASE)
+_LOCAL_CODE_RE = re.compile(r"^([A-Z]{2,5})\s*-?\s*(\d{3}[A-Z]?)$")
+_LOCAL_NUM_RE = re.compile(r"^\d{3}[A-Z]?$")
+
+# Local parses at or above this skip the LLM entirely
+LOCAL_MIN_CONFIDENCE = 0.85
+
+
+def parse_prereq_local(raw_text: str, known_codes: List[str]) -> Dict[str, Any]:
+    """Parse the common "One of A, B, C; D or E with at least 60%" shapes without the LLM.
+
+    ';' and 'and' separate clauses; ',', 'or' and '/' separate alternatives ("AFM 274/371"
+    reuses the subject). Confidence is 0.9 scaled by the share of pieces that were
+    whitelisted course codes. Parentheses, and commas outside "one of", are left to
+    the LLM (confidence 0.0).
+    """
+    return _parse_local(raw_text, _whitelist(known_codes)[0])
+
+
+def _parse_local(raw_text: str, keep: FrozenSet[str]) -> Dict[str, Any]:
+    empty: Dict[str, Any] = {"groups": [], "constraints": [], "confidence": 0.0}
+    text = _WS_RE.sub(" ", raw_text or "").strip().rstrip(".").strip()
+    if not text or "(" in text or ")" in text:
+        return empty
+    groups: List[List[Dict[str, Any]]] = []
+    total = 0
+    matched = 0
+    for chunk in _LOCAL_AND_RE.split(text):
+        one_of = _LOCAL_ONE_OF_RE.match(chunk)
+        body = chunk[one_of.end():] if one_of else chunk
+        if not one_of and "," in body:
+            # "A, B" alone could mean AND or OR
+            return empty
+        clause: List[Dict[str, Any]] = []
+        subject: Optional[str] = None
+        for piece in _LOCAL_OR_RE.split(body):
+            if not piece:
+                continue
+            total += 1
+            mg: Optional[int] = None
+            g = _LOCAL_GRADE_RE.search(piece)
+            if g:
+                mg = int(g.group(1))
+                piece = piece[: g.start()]
+            piece = piece.strip().upper()
+            m = _LOCAL_CODE_RE.match(piece)
+            if m:
+                subject = m.group(1)
+                code = m.group(1) + m.group(2)
+            elif subject and _LOCAL_NUM_RE.match(piece):
+                code = subject + piece
+            else:
+                continue
+            if code in keep:
+                matched += 1
+                clause.append({"code": code, "min_grade": mg})
+        if clause:
+            groups.append(clause)
+    if not total:
+        return empty
+    return {"groups": groups, "constraints": [], "confidence": round(0.9 * matched / total, 3)}
+
+
 def parse_prereq_with_llm(raw_text: str, known_codes: List[str], *, model: str = "sonar-pro") -> Dict[str, Any]:
     """Ask the LLM to convert prerequisite text into CNF groups.
 
+    Common shapes are parsed locally first; the LLM is only called when
+    parse_prereq_local is below LOCAL_MIN_CONFIDENCE.
+
     Returns a dict: { groups: List[List[{code,min_grade?}]], constraints: List[str], confidence: float }
     """
-    codes_hint = ", ".join(sorted(set([str(c).upper() for c in known_codes if c])))[:4000]
-    sys = (
-        "You are a data normalizer. Convert prerequisite prose into CNF — an AND of OR-clauses. "
-        "Return JSON only. Schema: { groups: Clause[], constraints: string[], confidence: number }. "
-        "Clause := CourseAlt[] where CourseAlt := { code: string, min_grade?: integer }. "
-        "Rules: (1) Use only codes from the provided whitelist. (2) Parentheses groupings and 'one of' => OR. "
-        "(3) Conjunction words like 'and', semicolons => AND between clauses. (4) Apply phrases like 'with at least N%' to the nearest course(s). "
-        "(5) Put non-course conditions (e.g., program restrictions, averages) into constraints[]."
-    )
-    user = (
-        "Text:\n" + (raw_text or "").strip() + "\n\n"
-        "Codes:\n" + codes_hint + "\n\n"
-        "Return JSON only."
-    )
-    # Few-shot example to anchor format
-    ex_user = (
-        "Text:\nCS 335 prerequisites (One of CS 116, CS 136, CS 138, CS 146) or (CS 114 with at least 60%; CS 115 or CS 135); "
-        "One of MATH 106 with at least 70%, MATH 136 or MATH 146; MATH 237 or MATH 247; One of STAT 206, STAT 231, STAT 241.\n\n"
-        "Codes:\nCS116, CS136, CS138, CS146, CS114, CS115, CS135, MATH106, MATH136, MATH146, MATH237, MATH247, STAT206, STAT231, STAT241"
-    )
-    ex_assistant = (
-        '{"groups":['
-        '[{"code":"CS116"},{"code":"CS136"},{"code":"CS138"},{"code":"CS146"}],' 
-        '[{"code":"CS114","min_grade":60},{"code":"CS115"},{"code":"CS135"}],' 
-        '[{"code":"MATH106","min_grade":70},{"code":"MATH136"},{"code":"MATH146"}],' 
-        '[{"code":"MATH237"},{"code":"MATH247"}],' 
-        '[{"code":"STAT206"},{"code":"STAT231"},{"code":"STAT241"}]' 
-        '],"constraints":[],"confidence":0.9}'
-    )
+    return _parse_one(raw_text, _whitelist(known_codes), model)
 
-    # Additional few-shot examples to robustly capture nested "one of" groups,
-    # slashes (A/B), and repeated group patterns separated by semicolons/commas.
-    ex2_user = (
-        "Text:\nOne of AMATH 250, AMATH 251, MATH 228; One of PHYS 267, STAT 202, STAT 206, STAT 221, STAT 231, STAT 241; One of CS 114, CS 116, CS 136, CS 146.\n\n"
-        "Codes:\nAMATH250, AMATH251, MATH228, PHYS267, STAT202, STAT206, STAT221, STAT231, STAT241, CS114, CS116, CS136, CS146"
-    )
-    ex2_assistant = (
-        '{"groups":'
-        '[[{"code":"AMATH250"},{"code":"AMATH251"},{"code":"MATH228"}],' 
-        '[[{"code":"PHYS267"},{"code":"STAT202"},{"code":"STAT206"},{"code":"STAT221"},{"code":"STAT231"},{"code":"STAT241"}]],' 
-        '[[{"code":"CS114"},{"code":"CS116"},{"code":"CS136"},{"code":"CS146"}]],'
-        '"constraints":[],"confidence":0.9}'
-    )
 
-    ex3_user = (
-        "Text:\nMATH 137 or MATH 147 and (STAT 220 with at least 70% or a corequisite of STAT 230 or STAT 240).\n\n"
-        "Codes:\nMATH137, MATH147, STAT220, STAT230, STAT240"
-    )
-    ex3_assistant = (
-        '{"groups":'
-        '[[{"code":"MATH137"},{"code":"MATH147"}],' 
-        '[[{"code":"STAT220","min_grade":70},{"code":"STAT230"},{"code":"STAT240"}]],'
-        '"constraints":["coreq allowed for STAT230/STAT240"],"confidence":0.85}'
-    )
+def parse_many(texts: Iterable[str], known_codes: List[str], *, model: str = "sonar-pro") -> Iterator[Dict[str, Any]]:
+    """parse_prereq_with_llm for each text against one whitelist, built once for the whole run."""
+    wl = _whitelist(known_codes)
+    for text in texts:
+        yield _parse_one(text, wl, model)
 
-    ex4_user = (
-        "Text:\nOne of AFM 274/AFM 371, ACTSC 372, ACTSC 391/AFM 372 or ECON 372.\n\n"
-        "Codes:\nAFM274, AFM371, ACTSC372, ACTSC391, AFM372, ECON372"
-    )
-    ex4_assistant = (
-        '{"groups":'
-        '[[{"code":"AFM274"},{"code":"AFM371"}],' 
-        '[[{"code":"ACTSC372"}],' 
-        '[[{"code":"ACTSC391"},{"code":"AFM372"},{"code":"ECON372"}]],'
-        '"constraints":[],"confidence":0.8}'
-    )
 
-    ex5_user = (
-        "Text:\n(One of PHYS 112, PHYS 122, PHYS 125) and (one of MATH 118, MATH 119, MATH 128, MATH 138, MATH 148) and (one of AMATH 250 or AMATH 251, AMATH 350, CIVE 222, ENVE 223, MATH 218, MATH 228, ME 203, SYDE 211).\n\n"
-        "Codes:\nPHYS112, PHYS122, PHYS125, MATH118, MATH119, MATH128, MATH138, MATH148, AMATH250, AMATH251, AMATH350, CIVE222, ENVE223, MATH218, MATH228, ME203, SYDE211"
-    )
-    ex5_assistant = (
-        '{"groups":'
-        '[[{"code":"PHYS112"},{"code":"PHYS122"},{"code":"PHYS125"}],' 
-        '[[{"code":"MATH118"},{"code":"MATH119"},{"code":"MATH128"},{"code":"MATH138"},{"code":"MATH148"}],' 
-        '[[{"code":"AMATH250"},{"code":"AMATH251"},{"code":"AMATH350"},{"code":"CIVE222"},{"code":"ENVE223"},{"code":"MATH218"},{"code":"MATH228"},{"code":"ME203"},{"code":"SYDE211"}]],'
-        '"constraints":[],"confidence":0.9}'
-    )
+def _parse_one(raw_text: str, wl: Whitelist, model: str) -> Dict[str, Any]:
+    local = _parse_local(raw_text, wl[0])
+    if local["confidence"] >= LOCAL_MIN_CONFIDENCE:
+        return local
+    # Same prose seen before (even with a different whitelist): reuse the raw model
+    # output and re-sanitize it against the current known_codes
+    pkey = _prose_key(raw_text, model)
+    obj = _prose_get(pkey)
+    if obj is None:
+        messages_all, messages_strict = _llm_messages(raw_text, wl)
+        obj = _try_parse(_post_pplx(messages_all, model=model, temperature=0.0, schema=RESULT_SCHEMA))
+        if obj is None:
+            obj = _try_parse(_post_pplx(messages_strict, model=model, temperature=0.0, schema=RESULT_SCHEMA))
+        if isinstance(obj, dict):
+            _prose_put(pkey, obj)
+    return _sanitize(obj, wl[0])
 
-    ex6_user = (
-        "Text:\nOne of MATH 118, MATH 119, MATH 128, MATH 138, MATH 148; One of STAT 202, STAT 206, STAT 220, STAT 230, STAT 240; One of AMATH 250, AMATH 251, AMATH 350, MATH 211, MATH 213, MATH 218, MATH 228.\n\n"
-        "Codes:\nMATH118, MATH119, MATH128, MATH138, MATH148, STAT202, STAT206, STAT220, STAT230, STAT240, AMATH250, AMATH251, AMATH350, MATH211, MATH213, MATH218, MATH228"
-    )
-    ex6_assistant = (
-        '{"groups":'
-        '[[{"code":"MATH118"},{"code":"MATH119"},{"code":"MATH128"},{"code":"MATH138"},{"code":"MATH148"}],' 
-        '[[{"code":"STAT202"},{"code":"STAT206"},{"code":"STAT220"},{"code":"STAT230"},{"code":"STAT240"}],' 
-        '[[{"code":"AMATH250"},{"code":"AMATH251"},{"code":"AMATH350"},{"code":"MATH211"},{"code":"MATH213"},{"code":"MATH218"},{"code":"MATH228"}]],'
-        '"constraints":[],"confidence":0.9}'
-    )
 
-    ex7_user = (
-        "Text:\n(One of MATH 106, MATH 114, MATH 115, MATH 136, MATH 146) and (One of AMATH 250, AMATH 251, AMATH 350 or MATH 218, MATH 228) and (One of STAT 202, STAT 206, STAT 211, STAT 220, STAT 230, STAT 231, STAT 241).\n\n"
-        "Codes:\nMATH106, MATH114, MATH115, MATH136, MATH146, AMATH250, AMATH251, AMATH350, MATH218, MATH228, STAT202, STAT206, STAT211, STAT220, STAT230, STAT231, STAT241"
-    )
-    ex7_assistant = (
-        '{"groups":'
-        '[[{"code":"MATH106"},{"code":"MATH114"},{"code":"MATH115"},{"code":"MATH136"},{"code":"MATH146"}],' 
-        '[[{"code":"AMATH250"},{"code":"AMATH251"},{"code":"AMATH350"},{"code":"MATH218"},{"code":"MATH228"}],' 
-        '[[{"code":"STAT202"},{"code":"STAT206"},{"code":"STAT211"},{"code":"STAT220"},{"code":"STAT230"},{"code":"STAT231"},{"code":"STAT241"}]],'
-        '"constraints":[],"confidence":0.9}'
-    )
+async def parse_prereq_with_llm_async(raw_text: str, known_codes: List[str], *, model: str = "sonar-pro") -> Dict[str, Any]:
+    """Async parse_prereq_with_llm over the shared httpx client; asyncio.gather() many of these."""
+    wl = _whitelist(known_codes)
+    local = _parse_local(raw_text, wl[0])
+    if local["confidence"] >= LOCAL_MIN_CONFIDENCE:
+        return local
+    pkey = _prose_key(raw_text, model)
+    obj = _prose_get(pkey)
+    if obj is None:
+        messages_all, messages_strict = _llm_messages(raw_text, wl)
+        obj = _try_parse(await _post_pplx_async(messages_all, model=model, temperature=0.0, schema=RESULT_SCHEMA))
+        if obj is None:
+            obj = _try_parse(await _post_pplx_async(messages_strict, model=model, temperature=0.0, schema=RESULT_SCHEMA))
+        if isinstance(obj, dict):
+            _prose_put(pkey, obj)
+    return _sanitize(obj, wl[0])
 
-    messages_all = [
-        {"role": "system", "content": sys},
-        {"role": "user", "content": ex_user},
-        {"role": "assistant", "content": ex_assistant},
-        {"role": "user", "content": ex2_user},
-        {"role": "assistant", "content": ex2_assistant},
-        {"role": "user", "content": ex3_user},
-        {"role": "assistant", "content": ex3_assistant},
-        {"role": "user", "content": ex4_user},
-        {"role": "assistant", "content": ex4_assistant},
-        {"role": "user", "content": ex5_user},
-        {"role": "assistant", "content": ex5_assistant},
-        {"role": "user", "content": ex6_user},
-        {"role": "assistant", "content": ex6_assistant},
-        {"role": "user", "content": ex7_user},
-        {"role": "assistant", "content": ex7_assistant},
-        {"role": "user", "content": user},
-    ]
-
-    data = _post_pplx(messages_all, model=model, temperature=0.0)
-
-    def try_parse(d: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        c = (((d.get("choices") or [{}])[0].get("message") or {}).get("content") or "").strip()
-        try:
-            return json.loads(c)
-        except Exception:
-            return None
 
-    obj = try_parse(data)
-    if obj is None:
-        # Second attempt with a stricter user instruction
-        strict = user + "\n\nReturn VALID JSON only. If uncertain, return {\"groups\":[],\"constraints\":[],\"confidence\":0.3}."
-        data2 = _post_pplx([
-            {"role": "system", "content": sys},
-            {"role": "user", "content": ex_user},
-            {"role": "assistant", "content": ex_assistant},
-            {"role": "user", "content": strict},
-        ], model=model, temperature=0.0)
-        obj = try_parse(data2)
+def parse_prereqs_parallel(items: List[Tuple[str, List[str]]], *, model: str = "sonar-pro", max_workers: int = 16) -> List[Dict[str, Any]]:
+    """parse_prereq_with_llm over (raw_text, known_codes) items on a thread pool, results in input order."""
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as ex:
+        return list(ex.map(lambda it: parse_prereq_with_llm(it[0], it[1], model=model), items))
+
+
+# Several texts per request: the static prefix is paid once per batch instead of once per course
+_BATCH_SYSTEM_PROMPT = (
+    _SYSTEM_PROMPT + " "
+    "You may receive several numbered texts ([0], [1], ...), each with its own codes. "
+    "Return JSON only: { results: [ { idx: number, groups: Clause[], constraints: string[], confidence: number } ] } "
+    "with exactly one result per text, in input order."
+)
+_BATCH_EX_USER = (
+    "[0]\nText:\nMATH 137 or MATH 147; STAT 230 with at least 60% or STAT 240.\n\n"
+    "Codes:\nMATH137, MATH147, STAT230, STAT240\n\n"
+    "[1]\nText:\nOne of AFM 274/AFM 371 or ECON 372. Level at least 3A.\n\n"
+    "Codes:\nAFM274, AFM371, ECON372\n\n"
+    "Return JSON only."
+)
+_BATCH_EX_ASSISTANT = (
+    '{"results":['
+    '{"idx":0,"groups":[[{"code":"MATH137"},{"code":"MATH147"}],[{"code":"STAT230","min_grade":60},{"code":"STAT240"}]],"constraints":[],"confidence":0.9},'
+    '{"idx":1,"groups":[[{"code":"AFM274"},{"code":"AFM371"},{"code":"ECON372"}]],"constraints":["Level at least 3A"],"confidence":0.85}'
+    ']}'
+)
+_BATCH_PREFIX: Tuple[Dict[str, str], ...] = (
+    {"role": "system", "content": _BATCH_SYSTEM_PROMPT},
+    {"role": "user", "content": _BATCH_EX_USER},
+    {"role": "assistant", "content": _BATCH_EX_ASSISTANT},
+)
+
+
+# A malformed example teaches the model malformed output; fail at import instead
+for _ex in (_EX_ASSISTANT, _EX2_ASSISTANT, _BATCH_EX_ASSISTANT):
+    assert isinstance(json.loads(_ex), dict), _ex
+
+# Few-shot messages are module constants (stable ids), so encode each once and reuse the bytes
+_STATIC_MSG_BYTES: Dict[int, bytes] = {id(m): _dumps_bytes(m) for m in (*_STATIC_PREFIX, *_BATCH_PREFIX)}
+_STATIC_MSG_DIGESTS: Dict[int, bytes] = {k: hashlib.sha256(v).digest() for k, v in _STATIC_MSG_BYTES.items()}
+
+
+def _post_batch(blocks: List[str], *, model: str) -> Dict[int, Dict[str, Any]]:
+    """One request for several item blocks; returns position -> raw object for the results it could read."""
+    user = "\n\n".join(f"[{n}]\n{block}" for n, block in enumerate(blocks)) + "\n\nReturn JSON only."
+    obj = _try_parse(_post_pplx([*_BATCH_PREFIX, {"role": "user", "content": user}], model=model, temperature=0.0, schema=BATCH_SCHEMA))
+    out: Dict[int, Dict[str, Any]] = {}
+    if not isinstance(obj, dict):
+        return out
+    for r in obj.get("results") or []:
+        if isinstance(r, dict) and isinstance(r.get("idx"), int) and 0 <= r["idx"] < len(blocks):
+            out[r["idx"]] = {k: v for k, v in r.items() if k != "idx"}
+    return out
+
+
+def parse_prereqs_with_llm_batch(items: List[Tuple[str, List[str]]], *, model: str = "sonar-pro", max_chars: int = 12000) -> List[Optional[Dict[str, Any]]]:
+    """parse_prereq_with_llm for many (raw_text, known_codes) items, several per request.
+
+    Items are packed into requests of at most max_chars of item text. Anything a batch
+    response doesn't cover (bad JSON, missing idx) falls back to a single-item call.
+    Returns results in input order, None where the fallback call failed.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    # Items usually share one known_codes object; build its whitelist once
+    wls: Dict[int, Whitelist] = {}
+    for _raw, codes in items:
+        if id(codes) not in wls:
+            wls[id(codes)] = _whitelist(codes)
+    batches: List[List[Tuple[int, str]]] = []
+    cur: List[Tuple[int, str]] = []
+    size = 0
+    for i, (raw, codes) in enumerate(items):
+        wl = wls[id(codes)]
+        local = _parse_local(raw, wl[0])
+        if local["confidence"] >= LOCAL_MIN_CONFIDENCE:
+            results[i] = local
+            continue
+        obj = _prose_get(_prose_key(raw, model))
+        if obj is not None:
+            results[i] = _sanitize(obj, wl[0])
+            continue
+        block = _item_block(raw, wl)
+        if cur and size + len(block) > max_chars:
+            batches.append(cur)
+            cur, size = [], 0
+        cur.append((i, block))
+        size += len(block)
+    if cur:
+        batches.append(cur)
+
+    for batch in batches:
+        got: Dict[int, Dict[str, Any]] = {}
+        if len(batch) > 1:
+            try:
+                got = _post_batch([block for _i, block in batch], model=model)
+            except Exception:
+                got = {}
+        for n, (i, _block) in enumerate(batch):
+            raw, codes = items[i]
+            wl = wls[id(codes)]
+            obj = got.get(n)
+            if obj is not None:
+                _prose_put(_prose_key(raw, model), obj)
+                results[i] = _sanitize(obj, wl[0])
+                continue
+            try:
+                results[i] = _parse_one(raw, wl, model)
+            except Exception:
+                results[i] = None
+    return results
+
+
+def _flatten_clause(clause_any):
+    # Some few-shots or model outputs produce nested lists like [[{...}], [{...}]]
+    # Normalize to the dicts in source order; anything else is dropped
+    if isinstance(clause_any, dict):
+        yield clause_any
+    elif isinstance(clause_any, list):
+        for sub in clause_any:
+            yield from _flatten_clause(sub)
+
+
+def _sanitize(obj: Optional[Dict[str, Any]], keep: FrozenSet[str]) -> Dict[str, Any]:
     if obj is None:
         obj = {"groups": [], "constraints": ["invalid_json"], "confidence": 0.0}
     # sanitize
-    keep = set(c.upper() for c in known_codes)
-    def _flatten_clause(clause_any):
-        # Some few-shots or model outputs produce nested lists like [[{...}], [{...}]]
-        # Normalize to a flat list of dicts
-        flat = []
-        stack = list(clause_any if isinstance(clause_any, list) else [clause_any])
-        while stack:
-            elem = stack.pop(0)
-            if isinstance(elem, list):
-                for sub in elem:
-                    stack.append(sub)
-            else:
-                flat.append(elem)
-        return flat
-
     groups = []
     for clause in obj.get("groups", []):
-        items = _flatten_clause(clause)
         cleaned = []
-        for item in items:
-            if not isinstance(item, dict):
+        for item in _flatten_clause(clause):
+            code = item.get("code")
+            if not isinstance(code, str):
                 continue
-            code = str(item.get("code", "")).upper()
-            if code in keep:
-                mg = item.get("min_grade")
-                try:
-                    mg = int(mg) if mg is not None else None
-                except Exception:
-                    mg = None
-                cleaned.append({"code": code, "min_grade": mg})
+            code = code.upper()
+            if code not in keep:
+                continue
+            mg = item.get("min_grade")
+            try:
+                mg = int(mg) if mg is not None else None
+            except Exception:
+                mg = None
+            cleaned.append({"code": code, "min_grade": mg})
         if cleaned:
             groups.append(cleaned)
     if not isinstance(obj.get("confidence"), (int, float)):
@@ -1,12 +1,42 @@
 import re
 import csv
 import os
+import json
+import time
 import argparse
+import atexit
+import functools
+import asyncio
+import hashlib
+import logging
+import logging.handlers
+import queue
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Iterable, Optional
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+try:
+    import lxml.html as lxml_html  # type: ignore
+    _BS_PARSER = 'lxml'  # C tree builder, much faster than html.parser on the same bs4 API
+except Exception:
+    lxml_html = None  # type: ignore
+    _BS_PARSER = 'html.parser'
 import mysql.connector
+try:
+    import MySQLdb  # type: ignore
+except Exception:  # optional: mysqlclient's C driver; mysql.connector is the fallback
+    MySQLdb = None  # type: ignore
 from dotenv import load_dotenv
+try:
+    import orjson  # type: ignore
+except Exception:  # optional speedup; stdlib json is the fallback
+    orjson = None  # type: ignore
 try:
     from .llm_parser import parse_prereq_with_llm  # type: ignore
 except Exception:
@@ -17,24 +47,52 @@ except Exception:
 FLOW_BASE = "https://uwflow.com"
 GRAPHQL_URL = f"{FLOW_BASE}/graphql"
 
-
+# Patterns used per course/page, compiled once
+_CODE_RE = re.compile(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b")
+_WS_RE = re.compile(r"\s+")
+_STOP_RE = re.compile(r"\b(coreq|corequisite|corequisites|antireq|antirequisite|antirequisites|notes?|restrictions?)\b", re.IGNORECASE)
+_PREREQ_HEADER_RE = re.compile(r"^[A-Z]{2,5}\s*\d{2,3}[A-Z]?\s+prerequisites\s*\n?", re.IGNORECASE | re.MULTILINE)
+_TITLE_SPLIT_RE = re.compile(r"\s[–-]\s")
+_GRADE_NEARBY_RE = re.compile(r"with at least\s*(\d{1,3})\s*%", re.IGNORECASE)
+_PAREN_RE = re.compile(r"[()]")
+_DEPT_RE = re.compile(r"^([A-Z]+)")
+_DEPT_LEVEL_RE = re.compile(r"^([A-Z]+)(\d{2,3})")
+_DEPT_LEVEL_LOOSE_RE = re.compile(r"([A-Z]+).*?(\d{2,3})")
+# label -> (label before the percent, percent before the label)
+_PCT_RES = {
+    label: (
+        re.compile(rf"{label}\s*(?:by\s*)?(\d{{1,3}})\s*%", re.IGNORECASE),
+        re.compile(rf"(\d{{1,3}})\s*%\s*{label}", re.IGNORECASE),
+    )
+    for label in ("liked", "easy", "useful")
+}
+_RATING_COUNT_RES = (
+    re.compile(r"based on\s+(\d{1,6})\s+(?:ratings|reviews)", re.IGNORECASE),
+    re.compile(r"\b(\d{1,6})\s+(?:ratings|reviews)\b", re.IGNORECASE),
+)
+
+
+# Deletes what _WS_RE matches (every str.isspace() character, the last being U+3000) plus '-'
+_CANON_TABLE = dict.fromkeys([c for c in range(0x3001) if chr(c).isspace()] + [ord('-')])
+
+
+# Both code helpers are pure and called for every link, override item and row: memoized
+@functools.lru_cache(maxsize=8192)
 def _normalize_course_code(text: str) -> str:
     if not text:
         return ""
-    match = re.search(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b", text)
+    match = _CODE_RE.search(text)
     if not match:
         return ""
     return f"{match.group(1)}{match.group(2)}"
 
 
+@functools.lru_cache(maxsize=8192)
 def _canonical_code(text: str) -> str:
     """Uppercase, remove all Unicode whitespace, and strip punctuation dashes between dept/number."""
     if not text:
         return ""
-    import re as _re
-    t = _re.sub(r"\s+", "", str(text).upper())
-    t = t.replace("-", "")
-    return t
+    return str(text).upper().translate(_CANON_TABLE)
 
 
 def _trim_prereq_only(text: str) -> str:
@@ -45,13 +103,12 @@ def _trim_prereq_only(text: str) -> str:
     if not text:
         return ""
     # Normalize whitespace and newlines to make heading detection easier
-    t = re.sub(r"\r", "", text)
+    t = text.replace("\r", "")
     # Stop at common headings
-    stop_re = re.compile(r"\b(coreq|corequisite|corequisites|antireq|antirequisite|antirequisites|notes?|restrictions?)\b", re.IGNORECASE)
-    parts = stop_re.split(t, maxsplit=1)
+    parts = _STOP_RE.split(t, maxsplit=1)
     t = parts[0]
     # Remove header lines like "CS 335 prerequisites"
-    t = re.sub(r"^[A-Z]{2,5}\s*\d{2,3}[A-Z]?\s+prerequisites\s*\n?", "", t, flags=re.IGNORECASE|re.MULTILINE)
+    t = _PREREQ_HEADER_RE.sub("", t)
     # If multiple paragraphs, keep the first one (likely the prereq sentence)
     paras = [p.strip() for p in t.split("\n\n") if p.strip()]
     if paras:
@@ -59,17 +116,128 @@ def _trim_prereq_only(text: str) -> str:
     return t.strip()
 
 
+@functools.lru_cache(maxsize=None)
+def _sep_regex(sep: str, ignore_case: bool) -> re.Pattern:
+    # Only a handful of separators (';', ',', ' and ') ever reach here; compile each once
+    return re.compile(re.escape(sep), re.IGNORECASE if ignore_case else 0)
+
+
+def _split_outside_parens(s: str, sep: str, *, ignore_case: bool = False) -> List[str]:
+    """Split `s` on `sep` (a character or a word like ' and ') outside parentheses.
+
+    One regex pass finds the separator hits (case-insensitively with ignore_case, on `s`
+    itself rather than a lowered copy) and only the parenthesis positions are walked to
+    know the depth at each hit; `s` is then sliced directly. Empty parts are dropped.
+    """
+    if '(' not in s and not ignore_case:
+        # Depth never leaves 0 (a stray ')' is clamped), so this is a plain split
+        return [part for part in (p.strip() for p in s.split(sep)) if part]
+    sep_re = _sep_regex(sep, ignore_case)
+    if '(' not in s:
+        return [part for part in (p.strip() for p in sep_re.split(s)) if part]
+    parens = [(m.start(), m.group()) for m in _PAREN_RE.finditer(s)]
+    n_parens = len(parens)
+    parts: List[str] = []
+    start = 0
+    depth = 0
+    p = 0
+    # Separators used here (';', ',', ' and ') never contain a parenthesis, so skipping
+    # overlapping hits inside parentheses cannot hide a top-level one
+    for m in sep_re.finditer(s):
+        i = m.start()
+        while p < n_parens and parens[p][0] < i:
+            depth = depth + 1 if parens[p][1] == '(' else max(0, depth - 1)
+            p += 1
+        if depth == 0:
+            part = s[start:i].strip()
+            if part:
+                parts.append(part)
+            start = m.end()
+    tail = s[start:].strip()
+    if tail:
+        parts.append(tail)
+    return parts
+
+
+# bs4's get_text() leaves out script/style/template and ruby annotation text (unless called on
+# that very element); so does _node_text
+_TEXT_CONTAINER_TAGS = frozenset({'script', 'style', 'template', 'rt', 'rp'})
+_VISIBLE_TEXT_XPATH = './/text()[not(ancestor::script or ancestor::style or ancestor::template or ancestor::rt or ancestor::rp)]'
+# Superset prefilter for "get_text().lower() contains 'prereq'"; callers confirm with _node_text
+_PREREQ_HEADING_XPATH = (
+    "//*[self::h2 or self::h3 or self::strong or self::div or self::span]"
+    "[following-sibling::*][contains(translate(string(.), 'PREQ', 'preq'), 'prereq')]"
+)
+
+
+_LXML_LOCAL = threading.local()
+
+
+def _lxml_parser():
+    """This thread's lxml HTML parser (parsers must not be shared across threads).
+
+    Whitespace-only text nodes are dropped while parsing, which shrinks the tree; _node_text
+    skips them anyway.
+    """
+    parser = getattr(_LXML_LOCAL, 'parser', None)
+    if parser is None:
+        parser = _LXML_LOCAL.parser = lxml_html.HTMLParser(remove_blank_text=True)
+    return parser
+
+
+def _node_text(node) -> str:
+    """lxml equivalent of BeautifulSoup's get_text(" ", strip=True)."""
+    xp = './/text()' if node.tag in _TEXT_CONTAINER_TAGS else _VISIBLE_TEXT_XPATH
+    return " ".join(t.strip() for t in node.xpath(xp) if t.strip())
+
+
+def _prereq_section_text(html: str, whole_page_fallback: bool = False) -> Tuple[str, bool]:
+    """Text of the element right after the first tag mentioning 'prereq' ('' if there is none).
+
+    With whole_page_fallback, a page without that section yields its full visible text instead.
+    Returns (text, fell_back), fell_back being True when the text is the whole page's.
+    Only the few tags that can match are ever turned into text, instead of every h2/h3/strong/div/span.
+    """
+    if lxml_html is not None:
+        try:
+            tree = lxml_html.document_fromstring(html, parser=_lxml_parser())
+        except Exception:  # empty document
+            return '', whole_page_fallback
+        text = ''
+        for el in tree.xpath(_PREREQ_HEADING_XPATH):
+            if 'prereq' in _node_text(el).lower():
+                text = _node_text(el.xpath('following-sibling::*[1]')[0])
+                break
+        if not text and whole_page_fallback:
+            return _node_text(tree), True
+        return text, False
+
+    soup = BeautifulSoup(html, _BS_PARSER)
+    text = ''
+    for heading_tag in soup.find_all(['h2', 'h3', 'strong', 'div', 'span']):
+        heading = heading_tag.get_text(" ", strip=True).lower()
+        if 'prereq' in heading:
+            body = heading_tag.find_next_sibling()
+            if body:
+                text = body.get_text(" ", strip=True)
+                break
+    if not text and whole_page_fallback:
+        return soup.get_text(' ', strip=True), True
+    return text, False
+
+
 def _extract_codes_from_container(tag) -> List[str]:
     codes: List[str] = []
-    if not tag:
+    if tag is None:
         return codes
-    for a in tag.find_all('a'):
-        code = _normalize_course_code(a.get_text(" ", strip=True))
+    is_lxml = lxml_html is not None and isinstance(tag, lxml_html.HtmlElement)
+    for a in (tag.xpath('.//a') if is_lxml else tag.find_all('a')):
+        code = _normalize_course_code(_node_text(a) if is_lxml else a.get_text(" ", strip=True))
         if code:
             codes.append(code)
     if not codes:
         # fallback to plain text parse
-        code = _normalize_course_code(tag.get_text(" ", strip=True))
+        code = _normalize_course_code(_node_text(tag) if is_lxml else tag.get_text(" ", strip=True))
         if code:
             codes.append(code)
     # de-duplicate
@@ -83,9 +251,39 @@ def _extract_codes_from_container(tag) -> List[str]:
 
 
 def _parse_course_page(html: str) -> Tuple[Dict[str, str], List[Dict[str, object]]]:
-    details: Dict[str, str] = {}
-    prereq_rows: List[Dict[str, object]] = []
-    soup = BeautifulSoup(html, 'html.parser')
+    if lxml_html is not None:
+        # One lxml tree and a few XPath lookups instead of bs4 tree walks
+        try:
+            tree = lxml_html.fromstring(html, parser=_lxml_parser())
+        except Exception:  # empty document
+            return {}, []
+        title_text = tree.xpath("string((//meta[@property='og:title'])[1]/@content)") or None
+        if not title_text:
+            title_el = tree.xpath('(//title)[1]')
+            if title_el:
+                title_text = _node_text(title_el[0])
+        description = tree.xpath("string((//meta[@name='description'])[1]/@content)") or None
+        if description is None:
+            p_el = tree.xpath('(//p)[1]')
+            if p_el:
+                description = _node_text(p_el[0])
+        prereq_container = None
+        antireq_text = None
+        units_value = None
+        for heading_el in tree.xpath('//h2 | //h3'):
+            body_el = heading_el.xpath('following-sibling::*[1]')
+            if not body_el:
+                continue
+            heading = _node_text(heading_el).lower()
+            if 'prereq' in heading:
+                prereq_container = body_el[0]
+            elif 'antireq' in heading:
+                antireq_text = _node_text(body_el[0])
+            elif 'unit' in heading:
+                units_value = _node_text(body_el[0])
+        return _course_page_details(title_text, description, prereq_container, antireq_text, units_value)
+
+    soup = BeautifulSoup(html, _BS_PARSER)
 
     # Title / code
     title_text = None
@@ -94,26 +292,20 @@ def _parse_course_page(html: str) -> Tuple[Dict[str, str], List[Dict[str, object
         title_text = og_title['content']
     if not title_text and soup.title:
         title_text = soup.title.get_text(" ", strip=True)
-    if title_text:
-        parts = re.split(r"\s[–-]\s", title_text, maxsplit=1)
-        if len(parts) == 2:
-            details['code'] = _normalize_course_code(parts[0])
-            details['title'] = parts[1]
-        else:
-            details['code'] = _normalize_course_code(title_text)
 
     # Description (try meta description, else first paragraph)
+    description = None
     meta_desc = soup.find('meta', attrs={'name': 'description'})
     if meta_desc and meta_desc.get('content'):
-        details['description'] = meta_desc['content']
+        description = meta_desc['content']
     else:
         p = soup.find('p')
         if p:
-            details['description'] = p.get_text(" ", strip=True)
+            description = p.get_text(" ", strip=True)
 
     # Find headers for sections
     prereq_container = None
-    antireq_container = None
+    antireq_text = None
     units_value = None
 
     for heading_tag in soup.find_all(['h2', 'h3']):
@@ -124,17 +316,35 @@ def _parse_course_page(html: str) -> Tuple[Dict[str, str], List[Dict[str, object
         if 'prereq' in heading:
             prereq_container = body
         elif 'antireq' in heading:
-            antireq_container = body
+            antireq_text = body.get_text(" ", strip=True)
         elif 'unit' in heading:
             units_value = body.get_text(" ", strip=True)
 
+    return _course_page_details(title_text, description, prereq_container, antireq_text, units_value)
+
+
+def _course_page_details(title_text: Optional[str], description: Optional[str], prereq_container, antireq_text: Optional[str], units_value: Optional[str]) -> Tuple[Dict[str, str], List[Dict[str, object]]]:
+    """Shared tail of _parse_course_page once the lxml or bs4 pass has found the page parts."""
+    details: Dict[str, str] = {}
+    prereq_rows: List[Dict[str, object]] = []
+    if title_text:
+        parts = _TITLE_SPLIT_RE.split(title_text, maxsplit=1)
+        if len(parts) == 2:
+            details['code'] = _normalize_course_code(parts[0])
+            details['title'] = parts[1]
+        else:
+            details['code'] = _normalize_course_code(title_text)
+
+    if description is not None:
+        details['description'] = description
+
     if units_value:
         details['units'] = units_value
-    if antireq_container:
-        details['antirequisites'] = antireq_container.get_text(" ", strip=True)
+    if antireq_text is not None:
+        details['antirequisites'] = antireq_text
 
     course_id = details.get('code', '')
-    if course_id and prereq_container:
+    if course_id and prereq_container is not None:
         # Treat all prereqs as a single OR group by default
         codes = _extract_codes_from_container(prereq_container)
         for code in codes:
@@ -149,17 +359,247 @@ def _parse_course_page(html: str) -> Tuple[Dict[str, str], List[Dict[str, object
     return details, prereq_rows
 
 
+_HTML_HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'referer': FLOW_BASE,
+}
+
+
+# Transient statuses retried by both the sync session and the async helpers
+_RETRY_STATUSES = (429, 502, 503, 504)
+
+# One keep-alive session for the sync helpers so repeated GETs/POSTs reuse the TLS connection.
+# GraphQL reads are idempotent, so POST is retried too.
+_SESSION = requests.Session()
+_SESSION.headers.update(_HTML_HEADERS)
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=64,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=list(_RETRY_STATUSES), allowed_methods=frozenset({"GET", "POST"})),
+    ),
+)
+
+
+# On-disk cache of successful UW Flow GETs and GraphQL POSTs so re-runs skip the network.
+# SQLite under FLOW_CACHE_DIR; entries are reused while younger than FLOW_CACHE_TTL seconds
+# (default 7 days; 0 disables the cache). Cache I/O failures fall through to the network.
+# Reads and writes can be switched off separately (FLOW_CACHE_READ=0 / FLOW_CACHE_WRITE=0,
+# or --no-cache / --no-cache-write): e.g. refresh every entry without serving stale ones.
+_HTTP_CACHE_CONN: Optional[sqlite3.Connection] = None
+_HTTP_CACHE_READ = os.getenv("FLOW_CACHE_READ", "1") != "0"
+_HTTP_CACHE_WRITE = os.getenv("FLOW_CACHE_WRITE", "1") != "0"
+_HTTP_CACHE_LOCK = threading.Lock()
+
+
+def _http_cache_ttl() -> float:
+    try:
+        return float(os.getenv("FLOW_CACHE_TTL", "604800"))
+    except ValueError:
+        return 604800.0
+
+
+def _http_cache_db() -> sqlite3.Connection:
+    global _HTTP_CACHE_CONN
+    if _HTTP_CACHE_CONN is None:
+        root = os.path.expanduser(os.getenv("FLOW_CACHE_DIR", "~/.cache/uw_calendar/uwflow"))
+        os.makedirs(root, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(root, "http.sqlite3"), check_same_thread=False)
+        # WAL with synchronous=NORMAL: a put's commit appends to the log without an fsync,
+        # so cache writes don't serialize the scrape on disk syncs (a lost tail is just a miss)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except Exception:
+            pass
+        conn.execute("CREATE TABLE IF NOT EXISTS http (key TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL)")
+        _HTTP_CACHE_CONN = conn
+    return _HTTP_CACHE_CONN
+
+
+def _http_key(method: str, url: str, body: bytes = b"") -> str:
+    return hashlib.sha256(f"{method}\x00{url}\x00".encode("utf-8") + body).hexdigest()
+
+
+def _http_cache_get(key: str) -> Optional[str | bytes]:
+    ttl = _http_cache_ttl()
+    if ttl <= 0 or not _HTTP_CACHE_READ:
+        return None
+    try:
+        with _HTTP_CACHE_LOCK:
+            row = _http_cache_db().execute("SELECT body, fetched_at FROM http WHERE key = ?", (key,)).fetchone()
+        if row and time.time() - row[1] < ttl:
+            return row[0]
+    except Exception:
+        pass
+    return None
+
+
+def _http_cache_put(key: str, body: str | bytes) -> None:
+    if _http_cache_ttl() <= 0 or not _HTTP_CACHE_WRITE:
+        return
+    try:
+        with _HTTP_CACHE_LOCK:
+            conn = _http_cache_db()
+            conn.execute("INSERT OR REPLACE INTO http (key, body, fetched_at) VALUES (?, ?, ?)", (key, body, time.time()))
+            conn.commit()
+    except Exception:
+        pass
+
+
+def set_http_cache_mode(read: bool = True, write: bool = True) -> None:
+    """Turn cache lookups and/or cache writes on or off for this process."""
+    global _HTTP_CACHE_READ, _HTTP_CACHE_WRITE
+    _HTTP_CACHE_READ = bool(read)
+    _HTTP_CACHE_WRITE = bool(write)
+
+
+def clear_http_cache() -> None:
+    try:
+        with _HTTP_CACHE_LOCK:
+            conn = _http_cache_db()
+            conn.execute("DELETE FROM http")
+            conn.commit()
+    except Exception:
+        pass
+
+
+def _graphql_body(query: str, variables: Dict[str, object] | None) -> bytes:
+    """Request body as UTF-8 JSON bytes, via orjson when available.
+
+    Keys are sorted so the same query/variables always map to the same cache entry.
+    """
+    payload = {'query': query, 'variables': variables or {}}
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _graphql_data(raw: str | bytes) -> Dict[str, object]:
+    # Decoding straight from the response bytes skips the intermediate str
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    if 'errors' in data:
+        raise RuntimeError(f"GraphQL error: {data['errors']}")
+    return data['data']
+
+
 def _get(url: str) -> str:
-    headers = {
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
-        'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'referer': FLOW_BASE,
-    }
-    resp = requests.get(url, headers=headers, timeout=30)
+    key = _http_key("GET", url)
+    cached = _http_cache_get(key)
+    if cached is not None:
+        return cached
+    resp = _SESSION.get(url, timeout=30)
     resp.raise_for_status()
+    _http_cache_put(key, resp.text)
     return resp.text
 
 
+def _wait_for_source(driver, needles: Tuple[str, ...], timeout: float) -> Optional[str]:
+    """Return the rendered page source once any needle appears in it, or None after `timeout` seconds.
+
+    WebDriverWait re-checks every 50 ms and returns as soon as the text shows up.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    def ready(d):
+        src = d.page_source or ""
+        return src if any(k in src for k in needles) else False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.05).until(ready)
+    except TimeoutException:
+        return None
+
+
+def _wait_for_js(driver, script: str, timeout: float) -> bool:
+    """Poll a JS predicate every 50 ms until it returns truthy; False after `timeout` seconds.
+
+    Cheaper than _wait_for_source when the caller doesn't need the HTML: nothing is serialized.
+    """
+    from selenium.common.exceptions import JavascriptException, TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        # A script error mid-navigation (document not ready yet) just means "check again"
+        wait = WebDriverWait(driver, timeout, poll_frequency=0.05, ignored_exceptions=(JavascriptException,))
+        return bool(wait.until(lambda d: d.execute_script(script)))
+    except TimeoutException:
+        return False
+
+
+def _clause_or_items(clause: str) -> List[Dict[str, Optional[int]]]:
+    """All distinct course codes in `clause` as one OR list, each with a nearby "with at least N%" grade."""
+    items: List[Dict[str, Optional[int]]] = []
+    seen_codes: set[str] = set()
+    # Grade phrases never overlap, so one pass finds them all; walk them alongside the codes
+    grades = list(_GRADE_NEARBY_RE.finditer(clause)) if '%' in clause else []
+    gi = 0
+    for m in _CODE_RE.finditer(clause):
+        code = (m.group(1) + m.group(2)).upper()
+        if code in seen_codes:
+            continue
+        # A grade requirement applies if it lies entirely within 80 chars after this code
+        end = m.end()
+        while gi < len(grades) and grades[gi].start() < end:
+            gi += 1
+        grade_val: Optional[int] = None
+        if gi < len(grades) and grades[gi].end() <= end + 80:
+            grade_val = int(grades[gi].group(1))
+        items.append({"code": code, "min_grade": grade_val})
+        seen_codes.add(code)
+    return items
+
+
+def _fast_split_groups(text: str, parts: List[str]) -> Optional[List[List[Dict[str, Optional[int]]]]]:
+    # Each part is an AND group; a single part means the separator did not really split
+    parts = [p for p in (p.strip() for p in parts) if p]
+    if len(parts) <= 1:
+        return None
+    groups = []
+    for part in parts:
+        items = _clause_or_items(part)
+        if items:
+            groups.append(items)
+    return groups
+
+
+def _fast_single_group(text: str, parts: List[str]) -> Optional[List[List[Dict[str, Optional[int]]]]]:
+    items = _clause_or_items(text.strip())
+    return [items] if items else []
+
+
+# Whole-text templates for parenthesis-free prerequisite text, the bulk of UW Flow pages.
+# Each mirrors one step of the generic ';' -> ',' -> ' and ' cascade in
+# _parse_prereq_groups_from_html and yields the same groups; a handler returning None
+# (or no template matching) falls through to the generic parser.
+_AND_SPLIT_RE = re.compile(r" and ", re.IGNORECASE)
+_FAST_PREREQ_SHAPES = (
+    # "A; B or C; D"
+    (re.compile(r"^[^(]*;[^(]*$"), lambda t: t.split(';'), _fast_split_groups),
+    # "A, B, C"
+    (re.compile(r"^[^(;]*,[^(;]*$"), lambda t: t.split(','), _fast_split_groups),
+    # "A or B and C"
+    (re.compile(r"^[^(;,]*? and [^(;,]*$", re.IGNORECASE), _AND_SPLIT_RE.split, _fast_split_groups),
+    # "A or B", "One of A or B"
+    (re.compile(r"^(?:(?! and )[^(;,])*$", re.IGNORECASE), lambda t: [t], _fast_single_group),
+)
+# Pages that fell through to the generic parser; reported at the end of a scrape
+_FAST_PREREQ_MISSES: List[str] = []
+
+
+def _fast_prereq_groups(text: str) -> Optional[List[List[Dict[str, Optional[int]]]]]:
+    """Groups for text matching one of _FAST_PREREQ_SHAPES, or None if the generic parser is needed."""
+    for pattern, split, handler in _FAST_PREREQ_SHAPES:
+        if pattern.match(text):
+            groups = handler(text, split(text))
+            if groups is not None:
+                return groups
+    return None
+
+
 def _parse_prereq_groups_from_html(course_code: str, driver=None) -> List[List[Dict[str, Optional[int]]]]:
     """Fetch the UW Flow course page and parse prerequisite groups using robust grouping rules.
 
@@ -177,14 +617,8 @@ def _parse_prereq_groups_from_html(course_code: str, driver=None) -> List[List[D
     if driver is not None:
         try:
             driver.get(f"{FLOW_BASE}/course/{course_code}")
-            # simple wait loop for the word 'Prereq' to appear in page source
-            for _ in range(25):
-                src = driver.page_source or ""
-                if 'Prereq' in src or 'Prerequisite' in src or 'Prerequisites' in src:
-                    html = src
-                    break
-                import time as _t
-                _t.sleep(0.2)
+            # wait for the word 'Prereq' to appear in page source
+            html = _wait_for_source(driver, ('Prereq', 'Prerequisite', 'Prerequisites'), 5)
         except Exception:
             html = None
     if html is None:
@@ -193,83 +627,20 @@ def _parse_prereq_groups_from_html(course_code: str, driver=None) -> List[List[D
         except Exception:
             return []
 
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # Try to isolate just the prerequisites section body text
-    prereq_text = None
-    for heading_tag in soup.find_all(['h2', 'h3', 'strong', 'div', 'span']):
-        heading = heading_tag.get_text(" ", strip=True).lower()
-        if 'prereq' in heading:
-            body = heading_tag.find_next_sibling()
-            if body:
-                prereq_text = body.get_text(" ", strip=True)
-                break
-
-    # Fallback to full-page text if targeted section not found
-    if not prereq_text:
-        prereq_text = soup.get_text(' ', strip=True)
-        if 'prerequisite' not in prereq_text.lower():
-            return []
+    # Try to isolate just the prerequisites section body text,
+    # falling back to full-page text if the targeted section is not found
+    prereq_text, whole_page = _prereq_section_text(html, whole_page_fallback=True)
+    if whole_page and 'prerequisite' not in prereq_text.lower():
+        return []
 
     # Normalize whitespace
-    text = re.sub(r"\s+", " ", prereq_text).strip().rstrip('.')
+    text = _WS_RE.sub(" ", prereq_text).strip().rstrip('.')
 
-    def split_outside_parens(s: str, sep: str) -> List[str]:
-        parts: List[str] = []
-        buf: List[str] = []
-        depth = 0
-        for ch in s:
-            if ch == '(':
-                depth += 1
-            elif ch == ')':
-                depth = max(0, depth - 1)
-            if ch == sep and depth == 0:
-                part = ''.join(buf).strip()
-                if part:
-                    parts.append(part)
-                buf = []
-            else:
-                buf.append(ch)
-        tail = ''.join(buf).strip()
-        if tail:
-            parts.append(tail)
-        return parts
-
-    # Split by a word separator (e.g., ' and ') only at top level (outside parentheses)
-    def split_outside_parens_word(s: str, word: str) -> List[str]:
-        s_lower = s.lower()
-        word_lower = word.lower()
-        parts: List[str] = []
-        buf: List[str] = []
-        depth = 0
-        i = 0
-        n = len(s)
-        wlen = len(word_lower)
-        while i < n:
-            ch = s[i]
-            if ch == '(':
-                depth += 1
-                buf.append(ch)
-                i += 1
-                continue
-            if ch == ')':
-                depth = max(0, depth - 1)
-                buf.append(ch)
-                i += 1
-                continue
-            if depth == 0 and s_lower.startswith(word_lower, i):
-                part = ''.join(buf).strip()
-                if part:
-                    parts.append(part)
-                buf = []
-                i += wlen
-                continue
-            buf.append(ch)
-            i += 1
-        tail = ''.join(buf).strip()
-        if tail:
-            parts.append(tail)
-        return parts
+    # Common paren-free shapes are handled directly; everything else takes the generic path below
+    fast = _fast_prereq_groups(text)
+    if fast is not None:
+        return fast
+    _FAST_PREREQ_MISSES.append(course_code)
 
     # Detect pattern: ( ... ) or ( ... ) at top level (UW Flow often does this)
     def find_top_level_paren_segments(s: str) -> List[Tuple[int, int]]:
@@ -291,30 +662,13 @@ def _parse_prereq_groups_from_html(course_code: str, driver=None) -> List[List[D
 
     paren_segs = find_top_level_paren_segments(text)
 
-    def parse_clause_to_or_items(clause: str) -> List[Dict[str, Optional[int]]]:
-        items: List[Dict[str, Optional[int]]] = []
-        seen_codes: set[str] = set()
-        for m in code_iter_re.finditer(clause):
-            code = (m.group(1) + m.group(2)).upper()
-            if code in seen_codes:
-                continue
-            lookahead_span = clause[m.end(): m.end() + 80]
-            g = grade_nearby_re.search(lookahead_span)
-            grade_val: Optional[int] = None
-            if g:
-                try:
-                    grade_val = int(g.group(1))
-                except Exception:
-                    grade_val = None
-            items.append({"code": code, "min_grade": grade_val})
-            seen_codes.add(code)
-        return items
+    parse_clause_to_or_items = _clause_or_items
 
     def parse_group_text(gtext: str) -> List[List[Dict[str, Optional[int]]]]:
         # Return list of OR-lists; multiple entries mean AND across them
-        parts = split_outside_parens(gtext, ';')
+        parts = _split_outside_parens(gtext, ';')
         if len(parts) <= 1:
-            parts = split_outside_parens(gtext, ',')
+            parts = _split_outside_parens(gtext, ',')
         out: List[List[Dict[str, Optional[int]]]] = []
         for part in parts:
             items = parse_clause_to_or_items(part)
@@ -344,9 +698,9 @@ def _parse_prereq_groups_from_html(course_code: str, driver=None) -> List[List[D
 
             # Append tail clauses after the second paren as additional AND groups
             tail = text[s2[1]:]
-            tail_parts = split_outside_parens(tail, ';')
+            tail_parts = _split_outside_parens(tail, ';')
             if len(tail_parts) <= 1:
-                tail_parts = split_outside_parens(tail, ',')
+                tail_parts = _split_outside_parens(tail, ',')
             for tp in tail_parts:
                 items = parse_clause_to_or_items(tp)
                 if items:
@@ -356,42 +710,23 @@ def _parse_prereq_groups_from_html(course_code: str, driver=None) -> List[List[D
                 return expanded_groups
 
     # Primary split by semicolons outside parentheses
-    groups_text = split_outside_parens(text, ';')
+    groups_text = _split_outside_parens(text, ';')
     if len(groups_text) <= 1:
         # Fallback: split by commas outside parentheses (AMATH 242 style)
-        groups_text = split_outside_parens(text, ',')
+        groups_text = _split_outside_parens(text, ',')
     if len(groups_text) <= 1:
         # Final fallback: split by ' and ' outside parentheses (handles patterns like "A/B and C")
-        groups_text = split_outside_parens_word(text, ' and ')
+        groups_text = _split_outside_parens(text, ' and ', ignore_case=True)
 
     # Helper to normalize a course code
     def norm_code(raw: str) -> str:
-        m = re.search(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b", raw)
+        m = _CODE_RE.search(raw)
         return (m.group(1) + m.group(2)).upper() if m else ''
 
-    code_iter_re = re.compile(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b")
-    grade_nearby_re = re.compile(r"with at least\s*(\d{1,3})\s*%", re.IGNORECASE)
-
     groups: List[List[Dict[str, Optional[int]]]] = []
     for clause in groups_text:
         # Extract all course occurrences in this clause
-        seen_codes: set[str] = set()
-        group_items: List[Dict[str, Optional[int]]] = []
-        for m in code_iter_re.finditer(clause):
-            code = (m.group(1) + m.group(2)).upper()
-            if code in seen_codes:
-                continue
-            # Look ahead a short distance for a nearby grade requirement applying to this code
-            lookahead_span = clause[m.end(): m.end() + 80]
-            g = grade_nearby_re.search(lookahead_span)
-            grade_val: Optional[int] = None
-            if g:
-                try:
-                    grade_val = int(g.group(1))
-                except Exception:
-                    grade_val = None
-            group_items.append({"code": code, "min_grade": grade_val})
-            seen_codes.add(code)
+        group_items = _clause_or_items(clause)
         if group_items:
             groups.append(group_items)
 
@@ -405,33 +740,118 @@ def _dedupe_prereq_rows(rows: List[Dict[str, object]]) -> List[Dict[str, object]
     """
     seen: Dict[Tuple[str, str, int], Dict[str, object]] = {}
     for r in rows:
-        cid = str(r.get('course_id') or '').upper()
-        pid = str(r.get('prereq_course_id') or '').upper()
-        grp = int(r.get('prerequisite_group') or 1)
-        key = (cid, pid, grp)
+        key = (
+            str(r.get('course_id') or '').upper(),
+            str(r.get('prereq_course_id') or '').upper(),
+            int(r.get('prerequisite_group') or 1),
+        )
         mg = r.get('min_grade')
-        try:
-            mgv: Optional[int] = int(mg) if mg is not None else None
-        except Exception:
-            mgv = None
-        if key not in seen:
-            seen[key] = {'course_id': cid, 'prereq_course_id': pid, 'prerequisite_group': grp, 'min_grade': mgv}
-        else:
-            prev = seen[key]
-            pmg = prev.get('min_grade')
-            if mgv is not None and (pmg is None or mgv > pmg):
-                prev['min_grade'] = mgv
+        # Grades are almost always None or int already; only convert the odd string
+        if mg is not None and type(mg) is not int:
+            try:
+                mg = int(mg)
+            except Exception:
+                mg = None
+        prev = seen.get(key)
+        if prev is None:
+            seen[key] = {'course_id': key[0], 'prereq_course_id': key[1], 'prerequisite_group': key[2], 'min_grade': mg}
+        elif mg is not None and (prev['min_grade'] is None or mg > prev['min_grade']):
+            prev['min_grade'] = mg
     return list(seen.values())
 
 
+# Rows per executemany batch when writing to MySQL
+_DB_BATCH = 1000
+# Driver errors the DB writers retry/fall back on, whichever driver _mysql_connect picked
+_DB_ERRORS: Tuple[type, ...] = (mysql.connector.Error,) + ((MySQLdb.Error,) if MySQLdb is not None else ())
+
+
+def _mysql_connect(host: str, port: int, user: str, password: str, database: str, connection_timeout: Optional[int] = None):
+    """MySQL connection for the DB writers: mysqlclient (MySQLdb) when installed, else mysql.connector.
+
+    mysqlclient formats parameters and encodes the wire protocol in C, which is where the
+    bulk executemany calls spend their time with the pure-Python connector.
+    Both connections start with autocommit off.
+    """
+    if MySQLdb is not None:
+        kwargs: Dict[str, object] = {}
+        if connection_timeout:
+            kwargs['connect_timeout'] = int(connection_timeout)
+        return MySQLdb.connect(host=host, port=port, user=user, passwd=password, db=database, charset='utf8mb4', autocommit=False, **kwargs)
+    kwargs = {'connection_timeout': int(connection_timeout)} if connection_timeout else {}
+    return mysql.connector.connect(host=host, port=port, user=user, password=password, database=database, **kwargs)
+
+
+def _prereqs_as_tuples(rows: Iterable[Dict[str, object]]) -> List[Tuple[object, object, int, Optional[int]]]:
+    """Prereq rows as (course_id, prereq_course_id, prerequisite_group, min_grade) tuples, in row order.
+
+    This is the parameter shape for
+    cursor.executemany("INSERT INTO course_prereq (...) VALUES (%s, %s, %s, %s)", ...),
+    which both MySQL drivers send as one multi-row INSERT per call instead of a round trip per row.
+    """
+    return [(r['course_id'], r['prereq_course_id'], int(r.get('prerequisite_group', 1)), r.get('min_grade')) for r in rows]
+
+
+_GRAPHQL_HEADERS = {'content-type': 'application/json', 'accept': 'application/json'}
+
+
 def _graphql(query: str, variables: Dict[str, object] | None = None) -> Dict[str, object]:
-    headers = {'content-type': 'application/json'}
-    resp = requests.post(GRAPHQL_URL, json={'query': query, 'variables': variables or {}}, headers=headers, timeout=30)
+    body = _graphql_body(query, variables)
+    key = _http_key("POST", GRAPHQL_URL, body)
+    cached = _http_cache_get(key)
+    if cached is not None:
+        return _graphql_data(cached)
+    resp = _SESSION.post(GRAPHQL_URL, data=body, headers=_GRAPHQL_HEADERS, timeout=30)
     resp.raise_for_status()
-    data = resp.json()
-    if 'errors' in data:
-        raise RuntimeError(f"GraphQL error: {data['errors']}")
-    return data['data']
+    # Only responses without GraphQL errors reach the cache
+    data = _graphql_data(resp.content)
+    _http_cache_put(key, resp.content)
+    return data
+
+
+# Async twins of _get/_graphql for scrape_uwflow; `client` is a shared httpx.AsyncClient
+async def _asend(client, method: str, url: str, **kwargs):
+    """client.request() under the sync session's policy: up to 3 retries with 0.3 s exponential
+    backoff on connection errors and _RETRY_STATUSES."""
+    for attempt in range(4):
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt == 3:
+                raise
+        else:
+            if resp.status_code not in _RETRY_STATUSES or attempt == 3:
+                return resp
+        await asyncio.sleep(0.3 * (2 ** attempt))
+
+
+# The cache's SQLite calls (and its lock, shared with executor threads) run in the default
+# executor so they never block the event loop
+async def _aget(client, url: str) -> str:
+    key = _http_key("GET", url)
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(None, _http_cache_get, key)
+    if cached is not None:
+        return cached
+    resp = await _asend(client, "GET", url, headers=_HTML_HEADERS, timeout=30)
+    resp.raise_for_status()
+    await loop.run_in_executor(None, _http_cache_put, key, resp.text)
+    return resp.text
+
+
+async def _agraphql(client, query: str, variables: Dict[str, object] | None = None) -> Dict[str, object]:
+    body = _graphql_body(query, variables)
+    key = _http_key("POST", GRAPHQL_URL, body)
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(None, _http_cache_get, key)
+    if cached is not None:
+        return _graphql_data(cached)
+    resp = await _asend(client, "POST", GRAPHQL_URL, content=body, headers=_GRAPHQL_HEADERS, timeout=30)
+    resp.raise_for_status()
+    # Only responses without GraphQL errors reach the cache
+    data = _graphql_data(resp.content)
+    await loop.run_in_executor(None, _http_cache_put, key, resp.content)
+    return data
 
 
 def _extract_ratings_from_html_text(text: str) -> Dict[str, Optional[float | int]]:
@@ -441,13 +861,8 @@ def _extract_ratings_from_html_text(text: str) -> Dict[str, Optional[float | int
     Any missing field will be None.
     """
     def _pct_near(label: str, s: str) -> Optional[float]:
-        import re as _re
-        pats = [
-            rf"{label}\s*(?:by\s*)?(\d{{1,3}})\s*%",
-            rf"(\d{{1,3}})\s*%\s*{label}",
-        ]
-        for p in pats:
-            m = _re.search(p, s, flags=_re.IGNORECASE)
+        for p in _PCT_RES[label]:
+            m = p.search(s)
             if m:
                 try:
                     v = float(m.group(1))
@@ -457,17 +872,13 @@ def _extract_ratings_from_html_text(text: str) -> Dict[str, Optional[float | int
                     pass
         return None
 
-    import re as _re
     liked = _pct_near("liked", text)
     easy = _pct_near("easy", text)
     useful = _pct_near("useful", text)
 
     rating_num: Optional[int] = None
-    for pat in [
-        r"based on\s+(\d{1,6})\s+(?:ratings|reviews)",
-        r"\b(\d{1,6})\s+(?:ratings|reviews)\b",
-    ]:
-        m = _re.search(pat, text, flags=_re.IGNORECASE)
+    for pat in _RATING_COUNT_RES:
+        m = pat.search(text)
         if m:
             try:
                 rating_num = int(m.group(1))
@@ -478,6 +889,57 @@ def _extract_ratings_from_html_text(text: str) -> Dict[str, Optional[float | int
     return {"liked": liked, "easy": easy, "useful": useful, "rating_num": rating_num}
 
 
+_RATINGS_QUERY = "query($code:String!){ course(where:{code:{_eq:$code}}){ code rating{ liked easy useful filled_count } } }"
+_NO_RATINGS: Dict[str, Optional[float | int]] = {'liked': None, 'easy': None, 'useful': None, 'rating_num': None}
+
+
+def _ratings_from_graphql(data: Dict[str, object]) -> Optional[Dict[str, Optional[float | int]]]:
+    course = (data.get('course') or [None])[0]
+    if course and isinstance(course.get('rating'), dict):
+        r = course['rating']
+        def pct(x):
+            try:
+                return float(x) * 100.0
+            except Exception:
+                return None
+        return {
+            'liked': pct(r.get('liked')),
+            'easy': pct(r.get('easy')),
+            'useful': pct(r.get('useful')),
+            'rating_num': r.get('filled_count'),
+        }
+    return None
+
+
+def _ratings_from_html(html: str) -> Dict[str, Optional[float | int]]:
+    if lxml_html is not None:
+        try:
+            txt = _node_text(lxml_html.document_fromstring(html, parser=_lxml_parser()))
+        except Exception:  # empty document
+            txt = ''
+    else:
+        soup = BeautifulSoup(html, _BS_PARSER)
+        txt = soup.get_text(' ', strip=True)
+    return _extract_ratings_from_html_text(txt)
+
+
+def _fetch_course_ratings_html(course_code: str, driver=None) -> Dict[str, Optional[float | int]]:
+    """HTML fallback for _fetch_course_ratings: rendered DOM via Selenium when available, else a plain GET."""
+    html: Optional[str] = None
+    if driver is not None:
+        try:
+            driver.get(f"{FLOW_BASE}/course/{course_code}")
+            html = _wait_for_source(driver, ("%",), 6)
+        except Exception:
+            html = None
+    if html is None:
+        try:
+            html = _get(f"{FLOW_BASE}/course/{course_code}")
+        except Exception:
+            return dict(_NO_RATINGS)
+    return _ratings_from_html(html)
+
+
 def _fetch_course_ratings(course_code: str, driver=None) -> Dict[str, Optional[float | int]]:
     """Fetch ratings matching UWFlow Explore: liked/easy/useful as percent (0-100), rating_num as filled_count.
 
@@ -486,50 +948,103 @@ def _fetch_course_ratings(course_code: str, driver=None) -> Dict[str, Optional[f
     """
     # GraphQL (canonical path used by Explore)
     try:
-        data = _graphql(
-            "query($code:String!){ course(where:{code:{_eq:$code}}){ code rating{ liked easy useful filled_count } } }",
-            {"code": course_code.lower()},
-        )
-        course = (data.get('course') or [None])[0]
-        if course and isinstance(course.get('rating'), dict):
-            r = course['rating']
-            def pct(x):
-                try:
-                    return float(x) * 100.0
-                except Exception:
-                    return None
-            return {
-                'liked': pct(r.get('liked')),
-                'easy': pct(r.get('easy')),
-                'useful': pct(r.get('useful')),
-                'rating_num': r.get('filled_count'),
-            }
+        stats = _ratings_from_graphql(_graphql(_RATINGS_QUERY, {"code": course_code.lower()}))
+        if stats is not None:
+            return stats
     except Exception:
         pass
+    return _fetch_course_ratings_html(course_code, driver=driver)
 
-    # Fallback: fetch the HTML and parse text
-    html: Optional[str] = None
-    if driver is not None:
-        try:
-            driver.get(f"{FLOW_BASE}/course/{course_code}")
-            for _ in range(30):
-                src = driver.page_source or ""
-                if "%" in src:
-                    html = src
-                    break
-                import time as _t
-                _t.sleep(0.2)
-        except Exception:
-            html = None
-    if html is None:
+
+async def _afetch_course_ratings(client, course_code: str, drivers: Optional['DriverPool'] = None) -> Dict[str, Optional[float | int]]:
+    """Async _fetch_course_ratings; the Selenium fallback checks a driver out of `drivers`."""
+    try:
+        stats = _ratings_from_graphql(await _agraphql(client, _RATINGS_QUERY, {"code": course_code.lower()}))
+        if stats is not None:
+            return stats
+    except Exception:
+        pass
+    return await _afetch_course_ratings_html(client, course_code, drivers=drivers)
+
+
+async def _afetch_course_ratings_html(client, course_code: str, drivers: Optional['DriverPool'] = None) -> Dict[str, Optional[float | int]]:
+    if drivers is not None:
+        return await drivers.run(_fetch_course_ratings_html, course_code)
+    try:
+        html = await _aget(client, f"{FLOW_BASE}/course/{course_code}")
+    except Exception:
+        return dict(_NO_RATINGS)
+    return _ratings_from_html(html)
+
+
+# Bulk lookups for scrape_uwflow: one round-trip per batch instead of three per course
+_GQL_BATCH = 100
+_COURSE_BULK_QUERY = "query($codes:[String!]!){ course(where:{code:{_in:$codes}}){ id code name rating{ liked easy useful filled_count } } }"
+_REQS_BULK_QUERY = (
+    "query($ids:[Int!]!){ course_prerequisite(where:{course_id:{_in:$ids}}){ course_id prerequisite{code name} } "
+    "course_antirequisite(where:{course_id:{_in:$ids}}){ course_id antirequisite{code name} } }"
+)
+
+
+# Recent sections have a per-course limit, which _in can't express, so those are batched as
+# aliased fields instead: s0: course_section(<code 0>) s1: course_section(<code 1>) ...
+_SECTIONS_BATCH = 50
+
+
+@functools.lru_cache(maxsize=None)
+def _sections_bulk_query(n: int) -> str:
+    params = ", ".join(f"$c{i}:String!" for i in range(n))
+    fields = " ".join(
+        f"s{i}: course_section(where:{{course:{{code:{{_eq:$c{i}}}}}}}, order_by:{{term_id:desc}}, limit:100){{ id term_id course{{code}} }}"
+        for i in range(n)
+    )
+    return f"query({params}){{ {fields} }}"
+
+
+async def _aprefetch_courses(client, codes: List[str]) -> Dict[str, Dict[str, object]]:
+    """Basic info + rating for a batch of codes, then all their prereqs/antireqs by id and their
+    recent sections (one POST per _SECTIONS_BATCH codes), the latter two concurrently.
+
+    Returns {lowercase code: {'course': {...}, 'prereqs': [...], 'antireqs': [...], 'sections': [...]}};
+    codes UW Flow doesn't know are absent. 'sections' is missing when its batch failed, and the
+    caller then queries that course's sections itself.
+    """
+    data = await _agraphql(client, _COURSE_BULK_QUERY, {"codes": sorted({c.lower() for c in codes})})
+    out: Dict[str, Dict[str, object]] = {}
+    by_id: Dict[int, Dict[str, object]] = {}
+    for c in data.get('course', []):
+        key = (c.get('code') or '').lower()
+        if not key or key in out:
+            continue
+        entry = {'course': c, 'prereqs': [], 'antireqs': []}
+        out[key] = entry
+        by_id[c['id']] = entry
+    if not by_id:
+        return out
+
+    async def reqs() -> None:
+        rel = await _agraphql(client, _REQS_BULK_QUERY, {"ids": list(by_id)})
+        for pr in rel.get('course_prerequisite', []):
+            entry = by_id.get(pr.get('course_id'))
+            if entry is not None:
+                entry['prereqs'].append(pr)
+        for an in rel.get('course_antirequisite', []):
+            entry = by_id.get(an.get('course_id'))
+            if entry is not None:
+                entry['antireqs'].append(an)
+
+    async def sections(chunk: List[str]) -> None:
+        # Queried with the codes exactly as the caller passed them, like the per-course query
         try:
-            html = _get(f"{FLOW_BASE}/course/{course_code}")
+            data = await _agraphql(client, _sections_bulk_query(len(chunk)), {f"c{i}": c for i, c in enumerate(chunk)})
         except Exception:
-            return {'liked': None, 'easy': None, 'useful': None, 'rating_num': None}
+            return
+        for i, c in enumerate(chunk):
+            out[c.lower()]['sections'] = data.get(f"s{i}") or []
 
-    soup = BeautifulSoup(html, 'html.parser')
-    txt = soup.get_text(' ', strip=True)
-    return _extract_ratings_from_html_text(txt)
+    known = list(dict.fromkeys(c for c in codes if c.lower() in out))
+    await asyncio.gather(reqs(), *(sections(known[i:i + _SECTIONS_BATCH]) for i in range(0, len(known), _SECTIONS_BATCH)))
+    return out
 
 
 def list_all_course_codes(page_size: int = 500) -> List[str]:
@@ -539,7 +1054,14 @@ def list_all_course_codes(page_size: int = 500) -> List[str]:
     - default to 500 per page
     - advance offset by the actual batch size returned, not by page_size
     - stop only when an empty batch is returned
+
+    The paged fetch runs once per process; callers get a fresh list each time.
     """
+    return list(_all_course_codes(int(page_size)))
+
+
+@functools.lru_cache(maxsize=1)
+def _all_course_codes(page_size: int) -> Tuple[str, ...]:
     codes: List[str] = []
     offset = 0
     while True:
@@ -552,59 +1074,485 @@ def list_all_course_codes(page_size: int = 500) -> List[str]:
             break
         codes.extend(batch)
         offset += len(batch)
-    return codes
+    return tuple(codes)
+
+
+# Optional: ground-truth overrides (by course_id) for validation or when parsing is unreliable
+_OVERRIDES: Dict[str, List[List[Dict[str, Optional[int]]]]] = {
+    'CS335': [
+        [{'code':'CS116','min_grade':None},{'code':'CS136','min_grade':None},{'code':'CS138','min_grade':None},{'code':'CS146','min_grade':None}],
+        [{'code':'CS114','min_grade':60}],
+        [{'code':'CS115','min_grade':None},{'code':'CS135','min_grade':None}],
+        [{'code':'MATH136','min_grade':None},{'code':'MATH146','min_grade':None},{'code':'MATH106','min_grade':70}],
+        [{'code':'MATH237','min_grade':None},{'code':'MATH247','min_grade':None}],
+        [{'code':'STAT206','min_grade':None},{'code':'STAT231','min_grade':None},{'code':'STAT241','min_grade':None}],
+    ],
+    'AMATH242': [
+        [{'code':'CS116','min_grade':None},{'code':'CS136','min_grade':None},{'code':'CS138','min_grade':None},{'code':'CS146','min_grade':None}],
+        [{'code':'MATH235','min_grade':None},{'code':'MATH245','min_grade':None}],
+        [{'code':'MATH237','min_grade':None},{'code':'MATH247','min_grade':None}],
+    ],
+    'CO250': [
+        [{'code':'MATH106','min_grade':70},{'code':'MATH114','min_grade':70},{'code':'MATH115','min_grade':70},{'code':'MATH136','min_grade':None},{'code':'MATH146','min_grade':None}],
+    ],
+    'STAT231': [
+        [{'code':'MATH118','min_grade':None},{'code':'MATH119','min_grade':None},{'code':'MATH128','min_grade':None},{'code':'MATH138','min_grade':None},{'code':'MATH148','min_grade':None}],
+        [{'code':'STAT220','min_grade':70},{'code':'STAT230','min_grade':None},{'code':'STAT240','min_grade':None}],
+    ],
+    'ACTSC936': [
+        [{'code':'STAT431','min_grade':None},{'code':'STAT831','min_grade':None}],
+        [{'code':'STAT330','min_grade':None}],
+    ],
+}
+
+
+def _load_manual_overrides(csv_path: str) -> Dict[str, List[List[Dict[str, Optional[int]]]]]:
+    """Manual prereq groups from a CSV (title row, header row, then course_id/prereq_course_id/prerequisite_group/min_grade rows)."""
+    out: Dict[str, List[List[Dict[str, Optional[int]]]]] = {}
+    try:
+        if not os.path.exists(csv_path):
+            return out
+        # csv.reader handles quoted fields (e.g. a comma inside a note column)
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            lines = list(csv.reader(f))
+        if len(lines) < 2:
+            return out
+        header = [h.strip().lower().replace(' ', '_') for h in lines[1]]
+        tmp: Dict[str, Dict[int, List[Dict[str, Optional[int]]]]] = {}
+        for line in lines[2:]:
+            if not line:
+                continue
+            cols = [c.strip() for c in line]
+            row = {header[i]: (cols[i] if i < len(cols) else '') for i in range(len(header))}
+            course = (row.get('course_id') or '').replace(' ', '').upper()
+            prereq = (row.get('prereq_course_id') or '').replace(' ', '').upper()
+            if not course or not prereq:
+                continue
+            try:
+                g = int((row.get('prerequisite_group') or '1').strip() or '1')
+            except Exception:
+                g = 1
+            mg = row.get('min_grade')
+            try:
+                mgv: Optional[int] = int(mg) if mg and mg.upper() != 'NA' else None
+            except Exception:
+                mgv = None
+            if course not in tmp:
+                tmp[course] = {}
+            tmp[course].setdefault(g, []).append({'code': prereq, 'min_grade': mgv})
+        for cid, groups_map in tmp.items():
+            out[cid] = [groups_map[k] for k in sorted(groups_map.keys())]
+    except Exception:
+        return {}
+    return out
+
+
+# Picks the most link-dense block near the prerequisites (the LLM fallback's raw text).
+# Installed once per driver as window.__pickBlock so Chrome doesn't re-parse it per course.
+_PICK_BLOCK_JS = """
+window.__pickBlock = function(){
+  const all = Array.from(document.querySelectorAll('a[href^="/course/"]'));
+  if(all.length===0) return '';
+  const counts = new Map();
+  function upTo(el, depth){ let n=el; for(let i=0;i<depth && n; i++){ n=n.parentElement; } return n; }
+  for(const a of all){
+    for(let d=0; d<5; d++){
+      const anc = upTo(a,d); if(!anc) break;
+      const key = anc;
+      const prev = counts.get(key)||0; counts.set(key, prev+1);
+    }
+  }
+  // Prefer blocks containing 'one of' or 'prereq'
+  let best=null, bestScore=-1;
+  counts.forEach((cnt, el)=>{
+    const t = (el.innerText||'').toLowerCase();
+    let score = cnt;
+    if(/one of|prereq/.test(t)) score += 3;
+    if(score>bestScore){ best=el; bestScore=score; }
+  });
+  return best ? (best.innerText||'').trim() : '';
+};
+"""
+
+
+def _make_chrome_driver(driver_path: Optional[str] = None):
+    """Headless Chrome for UW Flow's SPA pages, or None when Selenium/Chrome isn't available."""
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        if driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            driver_path = ChromeDriverManager().install()
+        opts = ChromeOptions()
+        opts.add_argument('--headless=new')
+        opts.add_argument('--no-sandbox')
+        opts.add_argument('--disable-dev-shm-usage')
+        # Return from get() at DOMContentLoaded; callers wait for the SPA content they need
+        opts.page_load_strategy = 'eager'
+        service = ChromeService(executable_path=driver_path)
+        driver = webdriver.Chrome(service=service, options=opts)
+        driver.set_page_load_timeout(45)
+        try:
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': _PICK_BLOCK_JS})
+        except Exception:
+            pass
+        return driver
+    except Exception:
+        return None
+
+
+class DriverPool:
+    """A few Selenium drivers shared by scrape_uwflow's coroutines.
+
+    A driver is blocking and not thread-safe, so each one is checked out by a single
+    coroutine at a time and its work runs on a thread pool with one thread per driver.
+    """
+
+    def __init__(self, n: int):
+        driver_path: Optional[str] = None
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            driver_path = ChromeDriverManager().install()  # resolve/download once for all drivers
+        except Exception:
+            pass
+        self.drivers = []
+        if driver_path is not None:
+            for _ in range(max(1, int(n))):
+                d = _make_chrome_driver(driver_path)
+                if d is not None:
+                    self.drivers.append(d)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.drivers)))
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def run(self, fn, *args):
+        """Run fn(*args, driver) on a free driver; waits while all drivers are busy."""
+        if self._idle is None:
+            # Created lazily so the queue belongs to the running loop
+            self._idle = asyncio.Queue()
+            for d in self.drivers:
+                self._idle.put_nowait(d)
+        driver = await self._idle.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args, driver)
+        finally:
+            self._idle.put_nowait(driver)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for d in self.drivers:
+            try:
+                d.quit()
+            except Exception:
+                pass
+
+
+def iter_course_ratings(codes: List[str], use_selenium: bool = False, workers: int = 8) -> Iterable[Dict[str, Optional[float | int]]]:
+    """Yield _fetch_course_ratings() for each code, in input order, fetched by `workers` threads.
+
+    With use_selenium every worker thread starts its own headless Chrome on first use (Selenium
+    drivers are not thread-safe); they are all quit once the iteration ends.
+    """
+    local = threading.local()
+    drivers: List[object] = []
+    drivers_lock = threading.Lock()
+    driver_path: Optional[str] = None
+    if use_selenium:
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            driver_path = ChromeDriverManager().install()  # resolve/download once for all workers
+        except Exception:
+            use_selenium = False
 
+    def fetch(code: str) -> Dict[str, Optional[float | int]]:
+        if use_selenium and not hasattr(local, 'driver'):
+            local.driver = _make_chrome_driver(driver_path)
+            if local.driver is not None:
+                with drivers_lock:
+                    drivers.append(local.driver)
+        return _fetch_course_ratings(code, driver=getattr(local, 'driver', None))
 
-def scrape_uwflow(limit: int = 0, html_prereqs: bool = False, use_selenium: bool = False, samples: Optional[List[str]] = None, use_llm: bool = False, llm_model: str = 'sonar-pro') -> Tuple[List[Dict[str, object]], List[Dict[str, object]], List[Dict[str, object]]]:
+    executor = ThreadPoolExecutor(max_workers=max(1, int(workers)))
+    try:
+        yield from executor.map(fetch, codes)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for d in drivers:
+            try:
+                d.quit()
+            except Exception:
+                pass
+
+
+def _persisted_course_codes() -> set[str]:
+    """Codes of courses already scraped into the DB (.env settings); empty if the DB is unreachable.
+
+    Placeholder rows that --to-db inserts for referenced prereq courses (course_name equal to
+    course_id) are not counted, so those courses still get fetched.
+    """
+    load_dotenv()
+    try:
+        conn = _mysql_connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=int(os.getenv('DB_PORT', '3306')),
+            user=os.getenv('DB_USER', 'uw_app'),
+            password=os.getenv('DB_PASSWORD', 'uw_app'),
+            database=os.getenv('DB_NAME', 'uw_courses'),
+            connection_timeout=10,
+        )
+    except Exception:
+        return set()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT course_id FROM course WHERE course_name <> course_id")
+            return {str(r[0]).upper() for r in cur}
+    except Exception:
+        return set()
+    finally:
+        conn.close()
+
+
+# llm_debug.ndjson stays open for the whole process behind a 64 KiB buffer instead of being
+# reopened for every course; flushed when a scrape finishes and closed at exit
+_LLM_DEBUG_FILE = None
+_LLM_DEBUG_LOCK = threading.Lock()
+
+
+def _llm_debug_write(record: Dict[str, object]) -> None:
+    global _LLM_DEBUG_FILE
+    # orjson hands back UTF-8 bytes directly, so the file is binary and nothing is re-encoded
+    line = (orjson.dumps(record) if orjson is not None else json.dumps(record, ensure_ascii=False).encode('utf-8')) + b"\n"
+    with _LLM_DEBUG_LOCK:  # written from executor threads
+        if _LLM_DEBUG_FILE is None:
+            _LLM_DEBUG_FILE = open('llm_debug.ndjson', 'ab', buffering=1 << 16)
+            atexit.register(_LLM_DEBUG_FILE.close)
+        _LLM_DEBUG_FILE.write(line)
+
+
+def _llm_debug_flush() -> None:
+    with _LLM_DEBUG_LOCK:
+        if _LLM_DEBUG_FILE is not None:
+            try:
+                _LLM_DEBUG_FILE.flush()
+            except Exception:
+                pass
+
+
+# The scrape loop's progress lines go through a queue drained by a listener thread, so a slow
+# stdout (a paused terminal, a CI log collector) never stalls the event loop; started on first
+# use and drained when a scrape finishes
+_PROGRESS_LOG = logging.getLogger('uwflow_scraper.progress')
+_PROGRESS_LOG.setLevel(logging.INFO)
+_PROGRESS_LOG.propagate = False
+_PROGRESS_LISTENER: Optional[logging.handlers.QueueListener] = None
+_PROGRESS_LOCK = threading.Lock()
+
+
+def _progress(msg: str) -> None:
+    global _PROGRESS_LISTENER
+    with _PROGRESS_LOCK:
+        if _PROGRESS_LISTENER is None:
+            q: queue.SimpleQueue = queue.SimpleQueue()
+            _PROGRESS_LOG.handlers[:] = [logging.handlers.QueueHandler(q)]
+            _PROGRESS_LISTENER = logging.handlers.QueueListener(q, logging.StreamHandler(sys.stdout))
+            _PROGRESS_LISTENER.start()
+    _PROGRESS_LOG.info(msg)
+
+
+def _progress_flush() -> None:
+    """Write out every queued progress line and stop the listener thread."""
+    global _PROGRESS_LISTENER
+    with _PROGRESS_LOCK:
+        if _PROGRESS_LISTENER is not None:
+            _PROGRESS_LISTENER.stop()
+            _PROGRESS_LISTENER = None
+
+
+atexit.register(_progress_flush)
+
+
+def scrape_uwflow(limit: int = 0, html_prereqs: bool = False, use_selenium: bool = False, samples: Optional[List[str]] = None, use_llm: bool = False, llm_model: str = 'sonar-pro', concurrency: int = 32, selenium_drivers: int = 4, resume: bool = False) -> Tuple[List[Dict[str, object]], List[Dict[str, object]], List[Dict[str, object]]]:
     # If samples are provided, use them exactly (order preserved); otherwise fetch all codes.
     # Always fetch the global code whitelist for robust LLM parsing
     all_codes_global = list_all_course_codes()
+    already: set[str] = set()
     if samples:
         codes = [s.upper() for s in samples]
     else:
         codes = list(all_codes_global)
+        if resume:
+            # Pick up where a previous --to-db run stopped: skip courses already stored, before any HTTP
+            already = _persisted_course_codes()
+            if already:
+                codes = [c for c in codes if c.upper() not in already]
+                print(f"Skipping {len(all_codes_global) - len(codes)} courses already in the DB")
         if limit:
             codes = codes[:limit]
+    # Codes the LLM may name as prereqs: this run's codes plus, when resuming, the courses
+    # already stored, so edges into them are kept (in all_codes_global order)
+    known_list = codes
+    if already:
+        target = set(codes)
+        known_list = [c for c in all_codes_global if c in target or c.upper() in already]
+    # O(1) membership for the LLM whitelist, plus the codes grouped by department for the
+    # same-department fallback (each bucket keeps the order of known_list)
+    codes_set = frozenset(known_list)
+    codes_by_dept: Dict[str, List[str]] = {}
+    for c in known_list:
+        m = _DEPT_RE.match(c)
+        if m:
+            codes_by_dept.setdefault(m.group(1), []).append(c)
     all_courses: List[Dict[str, object]] = []
     all_prereqs: List[Dict[str, object]] = []
     all_offerings: List[Dict[str, object]] = []
 
-    driver = None
-    # Create Selenium driver whenever requested, regardless of html_prereqs
-    if use_selenium:
+    # Create Selenium drivers whenever requested, regardless of html_prereqs.
+    # Without drivers, blocking helpers (HTML fetch + parse, LLM) use the loop's default executor.
+    drivers = DriverPool(selenium_drivers) if use_selenium else None
+    if drivers is not None and not drivers.drivers:
+        drivers = None
+
+    # Static overrides, with manual CSV overrides taking precedence; built once per run
+    overrides: Dict[str, List[List[Dict[str, Optional[int]]]]] = dict(_OVERRIDES)
+    overrides.update(_load_manual_overrides('sample groups.csv'))
+    # ...and their prereq rows, built once here instead of per course inside process_course
+    override_rows: Dict[str, List[Dict[str, object]]] = {}
+    for ocode, ogroups in overrides.items():
+        ocanon = _canonical_code(ocode)
+        orows: List[Dict[str, object]] = []
+        for gidx, clause in enumerate(ogroups, start=1):
+            for item in clause:
+                ccode = _canonical_code(item.get('code') or '')
+                if ccode and ccode != ocanon:
+                    orows.append({
+                        'course_id': ocanon,
+                        'prereq_course_id': ccode,
+                        'prerequisite_group': gidx,
+                        'min_grade': item.get('min_grade'),
+                    })
+        override_rows[ocode] = orows
+
+    def llm_prereq_rows(course_code: str, details: Dict[str, object], prereq_rows_for_course: List[Dict[str, object]], raw_text: str = '', driver=None) -> List[Dict[str, object]]:
+        # Blocking: the LLM call, plus a Selenium capture of the raw prereq block when the
+        # statically fetched page (raw_text) had none
+        self_code = details['code']
         try:
-            from selenium import webdriver
-            from selenium.webdriver.chrome.options import Options as ChromeOptions
-            from selenium.webdriver.chrome.service import Service as ChromeService
-            from webdriver_manager.chrome import ChromeDriverManager
-            opts = ChromeOptions()
-            opts.add_argument('--headless=new')
-            opts.add_argument('--no-sandbox')
-            opts.add_argument('--disable-dev-shm-usage')
-            service = ChromeService(executable_path=ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=opts)
-            driver.set_page_load_timeout(45)
-        except Exception as _e:
-            driver = None
+            if not raw_text and driver is not None:
+                # Use Selenium to capture the most link-dense block near a 'Prerequisites' header
+                driver.get(f"{FLOW_BASE}/course/{course_code}")
+                # Best effort: pick the block even if the heading never shows up
+                _wait_for_js(driver, "return !!(document.body && document.body.textContent.includes('Prereq'))", 8)
+                try:
+                    # __pickBlock is installed on every new document by _make_chrome_driver;
+                    # ship the full source only if that CDP call wasn't available
+                    raw_text = driver.execute_script(
+                        "return window.__pickBlock ? window.__pickBlock() : null"
+                    )
+                    if raw_text is None:
+                        raw_text = driver.execute_script(_PICK_BLOCK_JS + "return window.__pickBlock();")
+                    raw_text = raw_text or ''
+                except Exception:
+                    raw_text = ''
+        except Exception:
+            raw_text = ''
+        # Use a broad whitelist of codes so cross-department prereqs are retained
+        known_codes = all_codes_global
+        llm = None
+        if raw_text:
+            raw_text = _trim_prereq_only(raw_text)
+            # Build a tight whitelist of codes actually present in the text
+            txt_codes = []
+            raw_text_upper = raw_text.upper()
+            try:
+                # findall hands back the (dept, number) groups straight from the C scanner;
+                # dict.fromkeys dedupes in first-seen order with O(1) membership
+                txt_codes = list(dict.fromkeys(dept_part + num_part for dept_part, num_part in _CODE_RE.findall(raw_text_upper)))
+            except Exception:
+                pass
+            # intersect with global known codes to avoid noise
+            txt_known = [c for c in txt_codes if c in codes_set]
+            # Always include the course's own department neighbors in case formatting varies
+            if self_code[:2] and not txt_known:
+                dept = _DEPT_RE.match(self_code).group(1)
+                txt_known = codes_by_dept.get(dept, [])
+            llm = parse_prereq_with_llm(raw_text, txt_known or all_codes_global, model=llm_model)
+            if llm.get('groups'):
+                llm_rows: List[Dict[str, object]] = []
+                for idx2, clause in enumerate(llm['groups'], start=1):
+                    for item in clause:
+                        code_norm = _canonical_code((item.get('code') or ''))
+                        if code_norm and code_norm != self_code and code_norm in (txt_known or txt_codes):
+                            llm_rows.append({
+                                'course_id': self_code,
+                                'prereq_course_id': code_norm,
+                                'prerequisite_group': idx2,
+                                'min_grade': item.get('min_grade'),
+                            })
+                # Replace if LLM produced structured groups (more than one group or any rows when we had none)
+                existing_groups = {int(r['prerequisite_group']) for r in prereq_rows_for_course}
+                if llm_rows:
+                    prereq_rows_for_course = llm_rows
+        # Debug dump (always)
+        try:
+            _llm_debug_write({
+                'course_id': self_code,
+                'raw_text_head': (raw_text or '')[:200],
+                'raw_len': len(raw_text or ''),
+                'llm_ok': bool(llm and llm.get('groups'))
+            })
+        except Exception:
+            pass
+        # If still empty, fall back to GraphQL flat list below
+        return prereq_rows_for_course
 
     target_codes = list(codes)
-    for idx, code in enumerate(target_codes, start=1):
+    total = len(target_codes)
+
+    async def blocking(fn, *args):
+        # Selenium-bound work checks a driver out of the pool; otherwise fn gets driver=None
+        if drivers is not None:
+            return await drivers.run(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args, None)
+
+    async def process_course(client, idx: int, code: str, prefetched: Optional[Dict[str, Dict[str, object]]] = None):
+        """Everything for one course; returns (details, prereq_rows, offerings) or None when skipped/failed.
+
+        `prefetched` is the _aprefetch_courses result for this course's batch; None means the bulk
+        lookup failed and the course falls back to its own per-course queries.
+        """
+        # Like the old sequential loop, a later failure keeps whatever was already collected
+        kept_details: Optional[Dict[str, object]] = None
+        kept_rows: List[Dict[str, object]] = []
         try:
-            # Get course basic info
-            data = _graphql("query($code:String!){ course(where:{code:{_eq:$code}}){ id code name } }", {"code": code.lower()})
-            course_list = data.get('course', [])
-            if not course_list:
-                continue
-            course = course_list[0]
+            if prefetched is not None:
+                entry = prefetched.get(code.lower())
+                if entry is None:
+                    return None
+                course = entry['course']
+            else:
+                # Get course basic info
+                data = await _agraphql(client, "query($code:String!){ course(where:{code:{_eq:$code}}){ id code name } }", {"code": code.lower()})
+                course_list = data.get('course', [])
+                if not course_list:
+                    return None
+                course = course_list[0]
             course_id = course['id']
             details = {
                 "code": course['code'].upper(),
                 "title": course.get('name',''),
             }
+            # This course's own code, compared against every prereq item below
+            self_code = details['code']
+            self_code_canon = _canonical_code(self_code)
 
-            # Ratings (liked/easy/useful/count)
+            # Ratings (liked/easy/useful/count); the bulk query already carries the GraphQL rating
             try:
-                rstats = _fetch_course_ratings(details['code'], driver=driver)
+                if prefetched is not None:
+                    rstats = _ratings_from_graphql({'course': [course]})
+                    if rstats is None:
+                        rstats = await _afetch_course_ratings_html(client, self_code, drivers=drivers)
+                else:
+                    rstats = await _afetch_course_ratings(client, self_code, drivers=drivers)
             except Exception:
                 rstats = {"liked": None, "easy": None, "useful": None, "rating_num": None}
             details.update({
@@ -615,117 +1563,34 @@ def scrape_uwflow(limit: int = 0, html_prereqs: bool = False, use_selenium: bool
             })
 
             # Get prereqs & antireqs
-            rel = _graphql(
-                "query($id:Int!){ course_prerequisite(where:{course_id:{_eq:$id}}){ prerequisite{code name} } course_antirequisite(where:{course_id:{_eq:$id}}){ antirequisite{code name} } }",
-                {"id": course_id}
-            )
-            prereq_items = rel.get('course_prerequisite', [])
-            anti_items = rel.get('course_antirequisite', [])
+            if prefetched is not None:
+                prereq_items = entry['prereqs']
+                anti_items = entry['antireqs']
+            else:
+                rel = await _agraphql(
+                    client,
+                    "query($id:Int!){ course_prerequisite(where:{course_id:{_eq:$id}}){ prerequisite{code name} } course_antirequisite(where:{course_id:{_eq:$id}}){ antirequisite{code name} } }",
+                    {"id": course_id}
+                )
+                prereq_items = rel.get('course_prerequisite', [])
+                anti_items = rel.get('course_antirequisite', [])
 
             if anti_items:
                 details['antirequisites'] = ", ".join(sorted({(a['antirequisite'] or {}).get('code','').upper() for a in anti_items if a.get('antirequisite')}))
 
-            all_courses.append(details)
-
-            # Optional: ground-truth overrides (by course_id) for validation or when parsing is unreliable
-            overrides: Dict[str, List[List[Dict[str, Optional[int]]]]] = {
-                'CS335': [
-                    [{'code':'CS116','min_grade':None},{'code':'CS136','min_grade':None},{'code':'CS138','min_grade':None},{'code':'CS146','min_grade':None}],
-                    [{'code':'CS114','min_grade':60}],
-                    [{'code':'CS115','min_grade':None},{'code':'CS135','min_grade':None}],
-                    [{'code':'MATH136','min_grade':None},{'code':'MATH146','min_grade':None},{'code':'MATH106','min_grade':70}],
-                    [{'code':'MATH237','min_grade':None},{'code':'MATH247','min_grade':None}],
-                    [{'code':'STAT206','min_grade':None},{'code':'STAT231','min_grade':None},{'code':'STAT241','min_grade':None}],
-                ],
-                'AMATH242': [
-                    [{'code':'CS116','min_grade':None},{'code':'CS136','min_grade':None},{'code':'CS138','min_grade':None},{'code':'CS146','min_grade':None}],
-                    [{'code':'MATH235','min_grade':None},{'code':'MATH245','min_grade':None}],
-                    [{'code':'MATH237','min_grade':None},{'code':'MATH247','min_grade':None}],
-                ],
-                'CO250': [
-                    [{'code':'MATH106','min_grade':70},{'code':'MATH114','min_grade':70},{'code':'MATH115','min_grade':70},{'code':'MATH136','min_grade':None},{'code':'MATH146','min_grade':None}],
-                ],
-                'STAT231': [
-                    [{'code':'MATH118','min_grade':None},{'code':'MATH119','min_grade':None},{'code':'MATH128','min_grade':None},{'code':'MATH138','min_grade':None},{'code':'MATH148','min_grade':None}],
-                    [{'code':'STAT220','min_grade':70},{'code':'STAT230','min_grade':None},{'code':'STAT240','min_grade':None}],
-                ],
-                'ACTSC936': [
-                    [{'code':'STAT431','min_grade':None},{'code':'STAT831','min_grade':None}],
-                    [{'code':'STAT330','min_grade':None}],
-                ],
-            }
-            # Merge manual overrides from CSV if present (file: 'sample groups.csv')
-            def _load_manual_overrides(csv_path: str) -> Dict[str, List[List[Dict[str, Optional[int]]]]]:
-                out: Dict[str, List[List[Dict[str, Optional[int]]]]] = {}
-                try:
-                    if not os.path.exists(csv_path):
-                        return out
-                    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
-                        lines = f.read().splitlines()
-                    if len(lines) < 2:
-                        return out
-                    header = [h.strip().lower().replace(' ', '_') for h in lines[1].split(',')]
-                    tmp: Dict[str, Dict[int, List[Dict[str, Optional[int]]]]] = {}
-                    for line in lines[2:]:
-                        if not line.strip():
-                            continue
-                        cols = [c.strip() for c in line.split(',')]
-                        row = {header[i]: (cols[i] if i < len(cols) else '') for i in range(len(header))}
-                        course = (row.get('course_id') or '').replace(' ', '').upper()
-                        prereq = (row.get('prereq_course_id') or '').replace(' ', '').upper()
-                        if not course or not prereq:
-                            continue
-                        try:
-                            g = int((row.get('prerequisite_group') or '1').strip() or '1')
-                        except Exception:
-                            g = 1
-                        mg = row.get('min_grade')
-                        try:
-                            mgv: Optional[int] = int(mg) if mg and mg.upper() != 'NA' else None
-                        except Exception:
-                            mgv = None
-                        if course not in tmp:
-                            tmp[course] = {}
-                        tmp[course].setdefault(g, []).append({'code': prereq, 'min_grade': mgv})
-                    for cid, groups_map in tmp.items():
-                        out[cid] = [groups_map[k] for k in sorted(groups_map.keys())]
-                except Exception:
-                    return {}
-                return out
-
-            try:
-                manual = _load_manual_overrides('sample groups.csv')
-                if manual:
-                    # manual overrides take precedence
-                    overrides.update(manual)
-            except Exception:
-                pass
+            kept_details = details
 
             # If we have an exact override for this course, emit it immediately and skip further parsing
-            if details['code'] in overrides:
-                tmp_rows: List[Dict[str, object]] = []
-                for gidx, clause in enumerate(overrides[details['code']], start=1):
-                    for item in clause:
-                        ccode = _canonical_code(item.get('code') or '')
-                        if ccode and ccode != _canonical_code(details['code']):
-                            tmp_rows.append({
-                                'course_id': _canonical_code(details['code']),
-                                'prereq_course_id': ccode,
-                                'prerequisite_group': gidx,
-                                'min_grade': item.get('min_grade'),
-                            })
-                if tmp_rows:
-                    all_prereqs.extend(_dedupe_prereq_rows(tmp_rows))
-                # Continue to next course
-                if idx % 50 == 0 or idx == 1 or idx == len(target_codes):
-                    print(f"Fetched {idx}/{len(target_codes)}: {code}")
-                continue
+            if self_code in override_rows:
+                if idx % 50 == 0 or idx == 1 or idx == total:
+                    _progress(f"Fetched {idx}/{total}: {code}")
+                return details, list(override_rows[self_code]), []
 
             # Build prereq groups into a local buffer so LLM can replace weak structures
             prereq_rows_for_course: List[Dict[str, object]] = []
-            groups_from_html = _parse_prereq_groups_from_html(course['code'], driver=driver) if html_prereqs else []
+            groups_from_html = (await blocking(_parse_prereq_groups_from_html, course['code'])) if html_prereqs else []
             if groups_from_html:
-                for idx, group_items in enumerate(groups_from_html, start=1):
+                for gidx, group_items in enumerate(groups_from_html, start=1):
                     for item in group_items:
                         # Backward-compat: handle either dict with code/min_grade or plain string
                         if isinstance(item, dict):
@@ -735,117 +1600,30 @@ def scrape_uwflow(limit: int = 0, html_prereqs: bool = False, use_selenium: bool
                             code_norm = str(item).upper()
                             min_grade_val = None
                         code_norm = _canonical_code(code_norm)
-                        if code_norm and code_norm != _canonical_code(details['code']):
+                        if code_norm and code_norm != self_code_canon:
                             prereq_rows_for_course.append({
-                                'course_id': details['code'],
+                                'course_id': self_code,
                                 'prereq_course_id': code_norm,
-                                'prerequisite_group': idx,
+                                'prerequisite_group': gidx,
                                 'min_grade': min_grade_val,
                             })
             # LLM fallback when HTML parse yields a single flat group or none
             if use_llm and (not groups_from_html or (len(groups_from_html) == 1)):
-                # Try to capture raw prereq block text from UW Flow page quickly
+                # Static page first, on the shared async client; a Selenium driver is only checked
+                # out for pages whose HTML carries no course links or prereq section
                 raw_text = ''
                 try:
-                    if driver is not None:
-                        # Use Selenium to capture the most link-dense block near a 'Prerequisites' header
-                        driver.get(f"{FLOW_BASE}/course/{course['code']}")
-                        import time as _t
-                        for _ in range(40):
-                            if 'Prereq' in (driver.page_source or '') or 'Prerequisites' in (driver.page_source or ''):
-                                break
-                            _t.sleep(0.2)
-                        js = """
-                        function pickBlock(){
-                          const all = Array.from(document.querySelectorAll('a[href^="/course/"]'));
-                          if(all.length===0) return '';
-                          const counts = new Map();
-                          function upTo(el, depth){ let n=el; for(let i=0;i<depth && n; i++){ n=n.parentElement; } return n; }
-                          for(const a of all){
-                            for(let d=0; d<5; d++){
-                              const anc = upTo(a,d); if(!anc) break;
-                              const key = anc;
-                              const prev = counts.get(key)||0; counts.set(key, prev+1);
-                            }
-                          }
-                          // Prefer blocks containing 'one of' or 'prereq'
-                          let best=null, bestScore=-1;
-                          counts.forEach((cnt, el)=>{
-                            const t = (el.innerText||'').toLowerCase();
-                            let score = cnt;
-                            if(/one of|prereq/.test(t)) score += 3;
-                            if(score>bestScore){ best=el; bestScore=score; }
-                          });
-                          return best ? (best.innerText||'').trim() : '';
-                        }
-                        return pickBlock();
-                        """
-                        try:
-                            raw_text = driver.execute_script(js) or ''
-                        except Exception:
-                            raw_text = ''
-                    if not raw_text:
-                        html = _get(f"{FLOW_BASE}/course/{course['code']}")
-                        soup2 = BeautifulSoup(html, 'html.parser')
-                        for heading_tag in soup2.find_all(['h2', 'h3', 'strong', 'div', 'span']):
-                            heading = heading_tag.get_text(" ", strip=True).lower()
-                            if 'prereq' in heading:
-                                body = heading_tag.find_next_sibling()
-                                if body:
-                                    raw_text = body.get_text(" ", strip=True)
-                                    break
+                    page = await _aget(client, f"{FLOW_BASE}/course/{course['code']}")
+                    if '/course/' in page:
+                        raw_text, _ = _prereq_section_text(page)
                 except Exception:
                     raw_text = ''
-                # Use a broad whitelist of codes so cross-department prereqs are retained
-                known_codes = all_codes_global
-                llm = None
-                if raw_text:
-                    raw_text = _trim_prereq_only(raw_text)
-                    # Build a tight whitelist of codes actually present in the text
-                    txt_codes = []
-                    try:
-                        for m in re.finditer(r"\b([A-Z]{2,5})\s*-?\s*(\d{2,3}[A-Z]?)\b", raw_text.upper()):
-                            code = f"{m.group(1)}{m.group(2)}"
-                            if code not in txt_codes:
-                                txt_codes.append(code)
-                    except Exception:
-                        pass
-                    # intersect with global known codes to avoid noise
-                    txt_known = [c for c in txt_codes if c in codes]
-                    # Always include the course's own department neighbors in case formatting varies
-                    if details['code'][:2] and not txt_known:
-                        dept = re.match(r"^([A-Z]+)", details['code']).group(1)
-                        txt_known = [c for c in codes if c.startswith(dept)]
-                    llm = parse_prereq_with_llm(raw_text, txt_known or all_codes_global, model=llm_model)
-                    if llm.get('groups'):
-                        llm_rows: List[Dict[str, object]] = []
-                        for idx2, clause in enumerate(llm['groups'], start=1):
-                            for item in clause:
-                                code_norm = _canonical_code((item.get('code') or ''))
-                                if code_norm and code_norm != details['code'] and code_norm in (txt_known or txt_codes):
-                                    llm_rows.append({
-                                        'course_id': details['code'],
-                                        'prereq_course_id': code_norm,
-                                        'prerequisite_group': idx2,
-                                        'min_grade': item.get('min_grade'),
-                                    })
-                        # Replace if LLM produced structured groups (more than one group or any rows when we had none)
-                        existing_groups = {int(r['prerequisite_group']) for r in prereq_rows_for_course}
-                        if llm_rows:
-                            prereq_rows_for_course = llm_rows
-                # Debug dump (always)
-                try:
-                    with open('llm_debug.ndjson', 'a', encoding='utf-8') as f:
-                        import json as _json
-                        f.write(_json.dumps({
-                            'course_id': details['code'],
-                            'raw_text_head': (raw_text or '')[:200],
-                            'raw_len': len(raw_text or ''),
-                            'llm_ok': bool(llm and llm.get('groups'))
-                        }) + "\n")
-                except Exception:
-                    pass
-                # If still empty, fall back to GraphQL flat list below
+                if raw_text or drivers is None:
+                    prereq_rows_for_course = await asyncio.get_running_loop().run_in_executor(
+                        None, llm_prereq_rows, course['code'], details, prereq_rows_for_course, raw_text, None
+                    )
+                else:
+                    prereq_rows_for_course = await blocking(llm_prereq_rows, course['code'], details, prereq_rows_for_course, raw_text)
 
             # Final fallback: GraphQL flat prereq list when nothing parsed yet (regardless of LLM usage)
             if not prereq_rows_for_course:
@@ -854,44 +1632,35 @@ def scrape_uwflow(limit: int = 0, html_prereqs: bool = False, use_selenium: bool
                         continue
                     prc = (pr.get('prerequisite') or {}) if isinstance(pr.get('prerequisite'), dict) else {}
                     code_norm = _canonical_code((prc.get('code') or ''))
-                    if code_norm and code_norm != _canonical_code(details['code']):
+                    if code_norm and code_norm != self_code_canon:
                         prereq_rows_for_course.append({
-                            'course_id': details['code'],
+                            'course_id': self_code,
                             'prereq_course_id': code_norm,
                             'prerequisite_group': 1,
                             'min_grade': None,
                         })
+            kept_rows = prereq_rows_for_course
 
-            # Commit rows for this course
-            # Apply override if present to ensure correctness for critical courses
-            if details['code'] in overrides:
-                prereq_rows_for_course = []
-                for gidx, clause in enumerate(overrides[details['code']], start=1):
-                    for item in clause:
-                        if item['code'] != details['code']:
-                            prereq_rows_for_course.append({
-                                'course_id': details['code'],
-                                'prereq_course_id': item['code'],
-                                'prerequisite_group': gidx,
-                                'min_grade': item.get('min_grade'),
-                            })
-            if prereq_rows_for_course:
-                all_prereqs.extend(_dedupe_prereq_rows(prereq_rows_for_course))
-
-            # Fetch up to 50 most recent sections for offerings
-            sec = _graphql(
-                "query($code:String!){ course_section(where:{course:{code:{_eq:$code}}}, order_by:{term_id:desc}, limit:100){ id term_id course{code} } }",
-                {"code": code}
-            )
+            # Fetch up to 50 most recent sections for offerings (normally already in the bulk prefetch)
+            if prefetched is not None and 'sections' in entry:
+                sections = entry['sections']
+            else:
+                sec = await _agraphql(
+                    client,
+                    "query($code:String!){ course_section(where:{course:{code:{_eq:$code}}}, order_by:{term_id:desc}, limit:100){ id term_id course{code} } }",
+                    {"code": code}
+                )
+                sections = sec.get('course_section', [])
             # Keep at most one row per (term, course_id), and at most 3 latest terms per course
+            offerings: List[Dict[str, object]] = []
             seen_terms_for_course = set()
-            for s in sec.get('course_section', []):
+            for s in sections:
                 term = str(s.get('term_id'))
                 cid = (s.get('course') or {}).get('code','').upper()
                 if term in seen_terms_for_course:
                     continue
                 offering_id = f"TERM-{term}-{cid}"
-                all_offerings.append({
+                offerings.append({
                     'offering_id': offering_id,
                     'term': term,
                     'course_id': cid,
@@ -900,28 +1669,91 @@ def scrape_uwflow(limit: int = 0, html_prereqs: bool = False, use_selenium: bool
                 if len(seen_terms_for_course) >= 3:
                     break
 
-            if idx % 50 == 0 or idx == 1 or idx == len(codes):
-                print(f"Fetched {idx}/{len(codes)}: {code}")
+            if idx % 50 == 0 or idx == 1 or idx == total:
+                _progress(f"Fetched {idx}/{total}: {code}")
+            return details, kept_rows, offerings
         except Exception as e:
-            print(f"Failed {code}: {e}")
+            _progress(f"Failed {code}: {e}")
+            return (kept_details, kept_rows, []) if kept_details is not None else None
+
+    async def run_all() -> None:
+        sem = asyncio.Semaphore(max(1, int(concurrency)))
+        limits = httpx.Limits(max_connections=max(1, int(concurrency)), max_keepalive_connections=max(1, int(concurrency)), keepalive_expiry=60)
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            async def prefetch(batch: List[str]) -> Optional[Dict[str, Dict[str, object]]]:
+                async with sem:
+                    try:
+                        return await _aprefetch_courses(client, batch)
+                    except Exception as e:
+                        _progress(f"Bulk lookup failed for {batch[0]}..{batch[-1]}, querying per course: {e}")
+                        return None
+
+            async def guarded(idx: int, code: str, prefetched):
+                async with sem:
+                    return await process_course(client, idx, code, prefetched)
+            # Gather in chunks so a full scrape never holds thousands of pending tasks at once;
+            # results come back in input order, same as the old sequential loop
+            for start in range(0, total, 500):
+                chunk = target_codes[start:start + 500]
+                batches = [chunk[i:i + _GQL_BATCH] for i in range(0, len(chunk), _GQL_BATCH)]
+                looked_up = await asyncio.gather(*(prefetch(b) for b in batches))
+                results = await asyncio.gather(*(
+                    guarded(i, c, looked_up[(i - start - 1) // _GQL_BATCH])
+                    for i, c in enumerate(chunk, start=start + 1)
+                ))
+                for res in results:
+                    if res is None:
+                        continue
+                    details, rows, offs = res
+                    all_courses.append(details)
+                    all_prereqs.extend(rows)
+                    all_offerings.extend(offs)
 
-    if driver is not None:
+    del _FAST_PREREQ_MISSES[:]
+    try:
+        asyncio.run(run_all())
+    finally:
+        if drivers is not None:
+            drivers.close()
+        _llm_debug_flush()
+        _progress_flush()
+    # Rows are deduplicated once for the whole run rather than per course; this also collapses
+    # repeats from a course requested twice, which would otherwise collide on the table's key
+    all_prereqs = _dedupe_prereq_rows(all_prereqs)
+    if _FAST_PREREQ_MISSES:
+        # Candidates for new _FAST_PREREQ_SHAPES entries
+        print(f"Generic prereq parser used for {len(_FAST_PREREQ_MISSES)} courses: {', '.join(_FAST_PREREQ_MISSES[:20])}")
+    return all_courses, all_prereqs, all_offerings
+
+
+@functools.lru_cache(maxsize=None)
+def _derive_dept_level(cid: Optional[str]) -> Tuple[str, int]:
+    """(department, level) for a course id like 'CS135'; ('', 0) when it can't be read."""
+    # Be tolerant: find the first 2-3 digit cluster; default lvl=0
+    m = _DEPT_LEVEL_RE.match(cid or "")
+    if not m:
+        m = _DEPT_LEVEL_LOOSE_RE.search(cid or "")
+    dept = (m.group(1) if m else "")
+    lvl = 0
+    if m:
         try:
-            driver.quit()
+            lvl = int(m.group(2))
         except Exception:
-            pass
-    return all_courses, all_prereqs, all_offerings
+            lvl = 0
+    return (dept, lvl)
 
 
 def _save_dicts_to_csv(data: List[Dict[str, object]], filename: str) -> None:
     if not data:
         print(f"No data to save for {filename}.")
         return
-    keys = set().union(*(row.keys() for row in data))
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, fieldnames=sorted(list(keys)))
-        w.writeheader()
-        w.writerows(data)
+    fieldnames = sorted(set().union(*(row.keys() for row in data)))
+    # Plain csv.writer on row lists (same output as DictWriter, whose restval is '' as well),
+    # through a 1 MiB write buffer
+    with open(filename, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
+        w = csv.writer(f)
+        w.writerow(fieldnames)
+        w.writerows([row.get(k, '') for k in fieldnames] for row in data)
     print(f"Saved {len(data)} rows to {filename}")
 
 
@@ -934,11 +1766,23 @@ if __name__ == '__main__':
     parser.add_argument('--samples', type=str, default='', help='Comma-separated course codes to fetch only (overrides --limit if provided)')
     parser.add_argument('--use-llm', action='store_true', help='Enable LLM fallback (Perplexity) to structure prerequisites when heuristics are weak')
     parser.add_argument('--llm-model', type=str, default='sonar-small', help='Perplexity model: sonar-small or sonar-pro')
+    parser.add_argument('--selenium-drivers', type=int, default=4, help='Headless Chrome instances shared by the scrape (and ratings fetch workers) with --use-selenium (default 4)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Courses fetched concurrently by the scrape and the ratings commands (default 32)')
+    parser.add_argument('--force', action='store_true', help='With --to-db, re-scrape courses that are already stored instead of skipping them')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore cached UW Flow responses and fetch everything fresh; fresh responses still refresh the cache (see FLOW_CACHE_DIR/FLOW_CACHE_TTL)')
+    parser.add_argument('--no-cache-write', action='store_true', help='Do not store fetched UW Flow responses in the on-disk cache')
+    parser.add_argument('--clear-cache', action='store_true', help='Delete every entry from the on-disk UW Flow HTTP cache before fetching')
     parser.add_argument('--update-ratings', action='store_true', help='Fetch ratings from UWFlow and update existing DB course rows')
     parser.add_argument('--export-ratings-csv', type=str, default='', help='Export ratings (code, liked, easy, useful, rating_num) to CSV file')
     args = parser.parse_args()
 
     sample_list = [s.strip().upper() for s in (args.samples or '').split(',') if s.strip()]
+    set_http_cache_mode(read=not args.no_cache, write=not args.no_cache_write)
+    if args.clear_cache:
+        clear_http_cache()
+
+    # Ratings fetches run on a thread pool; with Selenium each worker owns a Chrome instance
+    ratings_workers = args.selenium_drivers if args.use_selenium else args.concurrency
 
     if args.export_ratings_csv:
         # Export ratings for a subset of course codes to CSV (no DB writes)
@@ -946,39 +1790,15 @@ if __name__ == '__main__':
         if not codes:
             codes = list_all_course_codes()[: max(1, int(args.limit or 50))]
         rows = []
-        driver = None
-        if args.use_selenium:
-            try:
-                from selenium import webdriver
-                from selenium.webdriver.chrome.options import Options as ChromeOptions
-                from selenium.webdriver.chrome.service import Service as ChromeService
-                from webdriver_manager.chrome import ChromeDriverManager
-                opts = ChromeOptions()
-                opts.add_argument('--headless=new')
-                opts.add_argument('--no-sandbox')
-                opts.add_argument('--disable-dev-shm-usage')
-                service = ChromeService(executable_path=ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=opts)
-                driver.set_page_load_timeout(45)
-            except Exception:
-                driver = None
-        try:
-            for code in codes:
-                stats = _fetch_course_ratings(code, driver=driver)
-                rows.append({
-                    'course_id': code.upper(),
-                    'liked': stats.get('liked'),
-                    'easy': stats.get('easy'),
-                    'useful': stats.get('useful'),
-                    'rating_num': stats.get('rating_num'),
-                })
-            _save_dicts_to_csv(rows, args.export_ratings_csv)
-        finally:
-            if driver is not None:
-                try:
-                    driver.quit()
-                except Exception:
-                    pass
+        for code, stats in zip(codes, iter_course_ratings(codes, use_selenium=args.use_selenium, workers=ratings_workers)):
+            rows.append({
+                'course_id': code.upper(),
+                'liked': stats.get('liked'),
+                'easy': stats.get('easy'),
+                'useful': stats.get('useful'),
+                'rating_num': stats.get('rating_num'),
+            })
+        _save_dicts_to_csv(rows, args.export_ratings_csv)
         raise SystemExit(0)
 
     if args.update_ratings:
@@ -990,23 +1810,7 @@ if __name__ == '__main__':
         password = os.getenv('DB_PASSWORD', 'uw_app')
         database = os.getenv('DB_NAME', 'uw_courses')
 
-        conn = mysql.connector.connect(host=host, port=port, user=user, password=password, database=database)
-        driver = None
-        if args.use_selenium:
-            try:
-                from selenium import webdriver
-                from selenium.webdriver.chrome.options import Options as ChromeOptions
-                from selenium.webdriver.chrome.service import Service as ChromeService
-                from webdriver_manager.chrome import ChromeDriverManager
-                opts = ChromeOptions()
-                opts.add_argument('--headless=new')
-                opts.add_argument('--no-sandbox')
-                opts.add_argument('--disable-dev-shm-usage')
-                service = ChromeService(executable_path=ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=opts)
-                driver.set_page_load_timeout(45)
-            except Exception:
-                driver = None
+        conn = _mysql_connect(host, port, user, password, database)
         try:
             with conn.cursor() as cur:
                 cur.execute(
@@ -1028,46 +1832,26 @@ if __name__ == '__main__':
                     total = len(codes)
                     processed = 0
                     batch: list[tuple] = []
-                    for cid in codes:
-                        stats = _fetch_course_ratings(cid, driver=driver)
-                        batch.append((
-                            stats.get('liked'), stats.get('easy'), stats.get('useful'), stats.get('rating_num'), cid
-                        ))
-                        if len(batch) >= 50:
-                            try:
-                                cur.executemany("UPDATE course SET liked=%s, easy=%s, useful=%s, rating_num=%s WHERE course_id=%s", batch)
-                                conn.commit()
-                            except mysql.connector.Error:
-                                try:
-                                    conn.rollback()
-                                except Exception:
-                                    pass
-                                # Retry per-row on transient errors (e.g., lock wait)
-                                import time as _t
-                                for row in batch:
-                                    for _ in range(3):
-                                        try:
-                                            cur.execute("UPDATE course SET liked=%s, easy=%s, useful=%s, rating_num=%s WHERE course_id=%s", row)
-                                            conn.commit()
-                                            break
-                                        except mysql.connector.Error:
-                                            try:
-                                                conn.rollback()
-                                            except Exception:
-                                                pass
-                                            _t.sleep(0.3)
-                            processed += len(batch)
-                            print(f"Updated ratings for {processed}/{total}")
-                            batch = []
-                    if batch:
+
+                    def flush_ratings(batch: list[tuple]) -> None:
+                        # One multi-row upsert per batch; every course_id here already exists, so it
+                        # only ever takes the UPDATE branch (the driver's executemany would send
+                        # one UPDATE statement per row)
+                        sql = (
+                            "INSERT INTO course (course_id, liked, easy, useful, rating_num) VALUES "
+                            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))
+                            + " ON DUPLICATE KEY UPDATE liked=VALUES(liked), easy=VALUES(easy), useful=VALUES(useful), rating_num=VALUES(rating_num)"
+                        )
+                        params = [v for liked, easy, useful, rating_num, cid in batch for v in (cid, liked, easy, useful, rating_num)]
                         try:
-                            cur.executemany("UPDATE course SET liked=%s, easy=%s, useful=%s, rating_num=%s WHERE course_id=%s", batch)
+                            cur.execute(sql, params)
                             conn.commit()
-                        except mysql.connector.Error:
+                        except _DB_ERRORS:
                             try:
                                 conn.rollback()
                             except Exception:
                                 pass
+                            # Retry per-row on transient errors (e.g., lock wait)
                             import time as _t
                             for row in batch:
                                 for _ in range(3):
@@ -1075,25 +1859,32 @@ if __name__ == '__main__':
                                         cur.execute("UPDATE course SET liked=%s, easy=%s, useful=%s, rating_num=%s WHERE course_id=%s", row)
                                         conn.commit()
                                         break
-                                    except mysql.connector.Error:
+                                    except _DB_ERRORS:
                                         try:
                                             conn.rollback()
                                         except Exception:
                                             pass
                                         _t.sleep(0.3)
+
+                    for cid, stats in zip(codes, iter_course_ratings(codes, use_selenium=args.use_selenium, workers=ratings_workers)):
+                        batch.append((
+                            stats.get('liked'), stats.get('easy'), stats.get('useful'), stats.get('rating_num'), cid
+                        ))
+                        if len(batch) >= 500:
+                            flush_ratings(batch)
+                            processed += len(batch)
+                            print(f"Updated ratings for {processed}/{total}")
+                            batch = []
+                    if batch:
+                        flush_ratings(batch)
                         processed += len(batch)
                         print(f"Updated ratings for {processed}/{total}")
                     print(f"Finished updating ratings for {total} courses.")
         finally:
-            if driver is not None:
-                try:
-                    driver.quit()
-                except Exception:
-                    pass
             conn.close()
         raise SystemExit(0)
 
-    courses, prereqs, offerings = scrape_uwflow(limit=args.limit, html_prereqs=args.html_prereqs, use_selenium=args.use_selenium, samples=(sample_list or None), use_llm=args.use_llm, llm_model=args.llm_model)
+    courses, prereqs, offerings = scrape_uwflow(limit=args.limit, html_prereqs=args.html_prereqs, use_selenium=args.use_selenium, samples=(sample_list or None), use_llm=args.use_llm, llm_model=args.llm_model, concurrency=args.concurrency, selenium_drivers=args.selenium_drivers, resume=(args.to_db and not args.force))
 
     if args.to_db:
         # Write directly to DB using same env vars as backend
@@ -1105,7 +1896,7 @@ if __name__ == '__main__':
         # default DB name matches Workbench schema
         database = os.getenv('DB_NAME', 'uw_courses')
 
-        conn = mysql.connector.connect(host=host, port=port, user=user, password=password, database=database)
+        conn = _mysql_connect(host, port, user, password, database)
         try:
             with conn.cursor() as cur:
                 # Detect actual columns present in `course` table to avoid unknown column errors
@@ -1117,7 +1908,8 @@ if __name__ == '__main__':
                 has_description = 'description' in course_cols
 
                 # Upsert courses (ensure all referenced prereq courses exist too)
-                def upsert_courses(rows: Iterable[Dict[str, object]]):
+                def upsert_courses(rows: Iterable[Dict[str, object]], keep_existing: bool = False):
+                    # keep_existing: insert only missing courses (placeholders), never overwrite
                     # Build column list dynamically to safely include ratings when present
                     cols = ['course_id','course_name','department','course_level']
                     if has_description:
@@ -1130,25 +1922,18 @@ if __name__ == '__main__':
                     placeholders = ", ".join(["%s"] * len(cols))
                     update_cols = [c for c in cols if c != 'course_id']
                     update_sql = ", ".join([f"{c}=VALUES({c})" for c in update_cols])
+                    if keep_existing:
+                        update_sql = "course_id=course_id"
                     sql = f"INSERT INTO course ({insert_cols_sql}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {update_sql}"
-                    def derive_dept_level(cid: str) -> Tuple[str, int]:
-                        # Be tolerant: find the first 2-3 digit cluster; default lvl=0
-                        m = re.match(r"^([A-Z]+)(\d{2,3})", cid or "")
-                        if not m:
-                            m = re.search(r"([A-Z]+).*?(\d{2,3})", cid or "")
-                        dept = (m.group(1) if m else "")
-                        lvl = 0
-                        if m:
-                            try:
-                                lvl = int(m.group(2))
-                            except Exception:
-                                lvl = 0
-                        return (dept, lvl)
+                    # One row per course id; with ON DUPLICATE KEY UPDATE the last duplicate
+                    # always won, so keep that one (in first-seen order)
+                    by_id: Dict[object, Dict[str, object]] = {}
+                    for r in rows:
+                        by_id[r.get('code') or r.get('course_id')] = r
 
                     data = []
-                    for r in rows:
-                        cid = (r.get('code') or r.get('course_id'))
-                        dept, lvl = derive_dept_level(cid)
+                    for cid, r in by_id.items():
+                        dept, lvl = _derive_dept_level(cid)
                         name = (r.get('title') or r.get('course_name') or cid)
                         row_vals = [cid, name, dept or '', int(lvl)]
                         if has_description:
@@ -1166,7 +1951,8 @@ if __name__ == '__main__':
 
                 upsert_courses(courses)
 
-                # Ensure prereq course rows exist
+                # Ensure prereq course rows exist; rows already in the DB (e.g. courses skipped
+                # by --resume) are left untouched rather than overwritten with placeholders
                 prereq_only = []
                 have_ids = {c['code'] for c in courses}
                 for r in prereqs:
@@ -1175,21 +1961,29 @@ if __name__ == '__main__':
                         prereq_only.append({'course_id': pid, 'code': pid, 'title': None, 'description': None})
                         have_ids.add(pid)
                 if prereq_only:
-                    upsert_courses(prereq_only)
-
-                # Replace prereqs per course
-                affected = sorted({r['course_id'] for r in prereqs})
-                for cid in affected:
-                    cur.execute("DELETE FROM course_prereq WHERE course_id = %s", (cid,))
-
-                sql_pr = (
-                    "INSERT INTO course_prereq (course_id, prereq_course_id, prerequisite_group, min_grade) "
-                    "VALUES (%s, %s, %s, %s)"
-                )
-                cur.executemany(sql_pr, [
-                    (r['course_id'], r['prereq_course_id'], int(r.get('prerequisite_group', 1)), r.get('min_grade'))
-                    for r in prereqs
-                ])
+                    upsert_courses(prereq_only, keep_existing=True)
+
+                # Replace prereqs per course: stage the new rows in a session-local table, then swap
+                # them in with one DELETE ... JOIN and one INSERT ... SELECT (same transaction)
+                if prereqs:
+                    cur.execute("DROP TEMPORARY TABLE IF EXISTS stage_prereq")
+                    cur.execute("CREATE TEMPORARY TABLE stage_prereq LIKE course_prereq")
+                    sql_stage = (
+                        "INSERT INTO stage_prereq (course_id, prereq_course_id, prerequisite_group, min_grade) "
+                        "VALUES (%s, %s, %s, %s)"
+                    )
+                    prereq_tuples = _prereqs_as_tuples(prereqs)
+                    for i in range(0, len(prereq_tuples), _DB_BATCH):
+                        cur.executemany(sql_stage, prereq_tuples[i:i + _DB_BATCH])
+                    cur.execute(
+                        "DELETE p FROM course_prereq p "
+                        "JOIN (SELECT DISTINCT course_id FROM stage_prereq) s ON p.course_id = s.course_id"
+                    )
+                    cur.execute(
+                        "INSERT INTO course_prereq (course_id, prereq_course_id, prerequisite_group, min_grade) "
+                        "SELECT course_id, prereq_course_id, prerequisite_group, min_grade FROM stage_prereq"
+                    )
+                    cur.execute("DROP TEMPORARY TABLE stage_prereq")
 
                 # Upsert offerings (idempotent by PK)
                 if offerings:
@@ -1199,7 +1993,7 @@ if __name__ == '__main__':
                             "INSERT INTO offering (term, course_id) VALUES (%s, %s) ON DUPLICATE KEY UPDATE term=VALUES(term)",
                             [(o['term'], o['course_id']) for o in offerings]
                         )
-                    except mysql.connector.Error as e:  # type: ignore
+                    except _DB_ERRORS as e:  # type: ignore
                         # Legacy schema path: offering(offering_id PK, term, course_id)
                         cur.executemany(
                             "INSERT IGNORE INTO offering (offering_id, term, course_id) VALUES (%s, %s, %s)",
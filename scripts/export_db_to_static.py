@@ -6,14 +6,83 @@ This script exports all course data and prerequisites into optimized JSON files.
 
 import os
 import json
+import gzip
+import shutil
+import argparse
+try:
+    import orjson  # type: ignore
+except Exception:  # optional speedup; stdlib json is the fallback
+    orjson = None  # type: ignore
+try:
+    import msgspec  # type: ignore
+except Exception:  # optional; plain dicts with orjson/json are the fallback
+    msgspec = None  # type: ignore
+try:
+    import numpy as np  # type: ignore
+except Exception:  # optional; statistics.median is the fallback
+    np = None  # type: ignore
+try:
+    import brotli  # type: ignore
+except Exception:  # optional; only the gzip copy is written without it
+    brotli = None  # type: ignore
+try:
+    import pyarrow as pa  # type: ignore
+except Exception:  # optional; without it only the JSON export is written
+    pa = None  # type: ignore
+import statistics
+from decimal import Decimal, ROUND_HALF_UP
 import psycopg
 from dotenv import load_dotenv
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 
 # Load environment variables
 load_dotenv()
 
+# liked/easy/useful (0-100 percentages) are exported as integers in tenths of a percent;
+# the frontend divides by metrics["scale"] when it loads the file
+RATING_SCALE = 10
+
+# Exported records: msgspec Structs when available (a fraction of a dict's memory, and
+# msgspec encodes them directly), plain dicts otherwise. Both encode to the same JSON object.
+COURSE_FIELDS = (
+    "course_id", "course_name", "department_id", "course_level", "description",
+    "liked", "easy", "useful", "rating_num",
+)
+
+if msgspec is not None:
+    class Course(msgspec.Struct):
+        course_id: str
+        course_name: str
+        department_id: int
+        course_level: Optional[int]
+        description: str
+        liked: Optional[int]
+        easy: Optional[int]
+        useful: Optional[int]
+        rating_num: Optional[int]
+
+    class PrereqCourse(msgspec.Struct):
+        course_id: str
+        min_grade: Optional[int]
+
+    make_course = Course
+    make_prereq_course = PrereqCourse
+else:
+    def make_course(*values):
+        return dict(zip(COURSE_FIELDS, values))
+
+    def make_prereq_course(course_id, min_grade):
+        return {"course_id": course_id, "min_grade": min_grade}
+
+
+def field_values(records, name):
+    """The `name` field of every record, whichever representation make_course produced."""
+    if msgspec is not None:
+        return [getattr(r, name) for r in records]
+    return [r[name] for r in records]
+
 
 def get_db_connection():
     """Get database connection using environment variables."""
@@ -29,8 +98,30 @@ def get_db_connection():
     return psycopg.connect(dsn)
 
 
+def server_cursor(conn, name, itersize=5000):
+    """Named (server-side) cursor: iterating it fetches `itersize` rows per round trip.
+
+    Results come back in binary format, so ints arrive as raw values instead of text that
+    Postgres formats and psycopg parses back.
+    """
+    cur = conn.cursor(name=name, binary=True)
+    cur.itersize = itersize
+    return cur
+
+
+def export_on_own_connection(export_fn, cursor_name):
+    """Run one exporter on its own connection and server-side cursor, so exports can overlap."""
+    with get_db_connection() as conn:
+        with server_cursor(conn, cursor_name) as cur:
+            return export_fn(cur)
+
+
 def export_courses(cursor):
-    """Export all courses with their metadata and ratings."""
+    """Export all courses with their metadata and ratings.
+
+    Returns (courses, departments): each course carries a department_id indexing the
+    departments list instead of repeating the department string.
+    """
     print("📚 Exporting courses...")
     cursor.execute("""
         SELECT 
@@ -39,30 +130,32 @@ def export_courses(cursor):
             COALESCE(department, '') AS department,
             course_level,
             COALESCE(description, '') AS description,
-            liked,
-            easy,
-            useful,
-            rating_num
+            ROUND(liked * %(scale)s)::int AS liked,
+            ROUND(easy * %(scale)s)::int AS easy,
+            ROUND(useful * %(scale)s)::int AS useful,
+            rating_num::int AS rating_num
         FROM course
         ORDER BY course_id
-    """)
+    """, {"scale": RATING_SCALE})
     
+    # Scaling and casts happen in SQL, so psycopg already hands back ints (or None)
     courses = {}
-    for row in cursor.fetchall():
-        courses[row[0]] = {
-            "course_id": row[0],
-            "course_name": row[1],
-            "department": row[2],
-            "course_level": row[3],
-            "description": row[4],
-            "liked": None if row[5] is None else float(row[5]),
-            "easy": None if row[6] is None else float(row[6]),
-            "useful": None if row[7] is None else float(row[7]),
-            "rating_num": None if row[8] is None else int(row[8]),
-        }
+    dept_vocab = {}
+    for course_id, course_name, department, course_level, description, liked, easy, useful, rating_num in cursor:
+        courses[course_id] = make_course(
+            course_id,
+            course_name,
+            dept_vocab.setdefault(department, len(dept_vocab)),
+            course_level,
+            description,
+            liked,
+            easy,
+            useful,
+            rating_num,
+        )
     
-    print(f"   ✓ Exported {len(courses)} courses")
-    return courses
+    print(f"   ✓ Exported {len(courses)} courses in {len(dept_vocab)} departments")
+    return courses, list(dept_vocab)
 
 
 def export_prereqs(cursor):
@@ -78,94 +171,331 @@ def export_prereqs(cursor):
         ORDER BY course_id, prerequisite_group, prereq_course_id
     """)
     
-    # Group by course_id -> groups -> courses
-    prereqs_by_course = defaultdict(lambda: defaultdict(list))
-    
-    for row in cursor.fetchall():
-        course_id = row[0]
-        prereq_id = row[1]
-        group = int(row[2])
-        min_grade = None if row[3] is None else int(row[3])
-        
-        prereqs_by_course[course_id][group].append({
-            "course_id": prereq_id,
-            "min_grade": min_grade
-        })
-    
-    # Convert to final structure matching API format
+    # Rows arrive sorted by (course_id, group), so one linear sweep builds the final structure:
+    # a new course or group starts whenever the key changes, with no per-row dict lookups
+    # (group and min_grade are INT columns, so psycopg already returns ints)
     result = {}
     total_relationships = 0
+    cur_course = cur_group = None
+    groups = courses = entry = add_course = None
     
-    for course_id, groups in prereqs_by_course.items():
-        result[course_id] = []
-        for group_num in sorted(groups.keys()):
-            courses = groups[group_num]
-            group_type = "OR" if len(courses) > 1 else "AND"
-            result[course_id].append({
-                "group": group_num,
-                "type": group_type,
+    for course_id, prereq_id, group, min_grade in cursor:
+        if course_id != cur_course:
+            cur_course, cur_group = course_id, None
+            groups = result[course_id] = []
+        if group != cur_group:
+            # Close the previous group: more than one course makes it a choice
+            if entry is not None and len(courses) > 1:
+                entry["type"] = "OR"
+            cur_group = group
+            courses = []
+            add_course = courses.append
+            entry = {
+                "group": group,
+                "type": "AND",
                 "courses": courses
-            })
-            total_relationships += len(courses)
+            }
+            groups.append(entry)
+        add_course(make_prereq_course(prereq_id, min_grade))
+        total_relationships += 1
+    if entry is not None and len(courses) > 1:
+        entry["type"] = "OR"
     
     print(f"   ✓ Exported {total_relationships} prerequisite relationships across {len(result)} courses")
     return result
 
 
-def export_offerings(cursor):
-    """Export course offering history (terms)."""
-    print("📅 Exporting course offerings...")
-    cursor.execute("""
-        SELECT course_id, term
-        FROM offering
-        ORDER BY course_id, term DESC
-    """)
-    
-    offerings = defaultdict(list)
-    for row in cursor.fetchall():
-        offerings[row[0]].append({"term": row[1]})
-    
-    print(f"   ✓ Exported offerings for {len(offerings)} courses")
-    return dict(offerings)
+def round_half_up(x):
+    """Round to an int with ties away from zero, like Postgres ROUND on numeric (not round()'s ties-to-even)."""
+    return int(Decimal(x).to_integral_value(rounding=ROUND_HALF_UP))
+
 
+def calculate_metrics(courses):
+    """Calculate global median and min metrics for weighting algorithm.
 
-def calculate_metrics(cursor):
-    """Calculate global median and min metrics for weighting algorithm."""
+    Computed from the exported courses rather than with percentile_cont in SQL, which would
+    sort the whole course table once per column. The median interpolates between the two
+    middle values like percentile_cont(0.5); an empty column falls back to 0. Results are
+    rounded (ties away from zero) to the same RATING_SCALE integers as the course ratings.
+    """
     print("📊 Calculating global metrics...")
-    cursor.execute("""
-        SELECT 
-            COALESCE((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY liked) 
-                      FROM course WHERE liked IS NOT NULL), 0.0) AS liked_med,
-            COALESCE((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY easy) 
-                      FROM course WHERE easy IS NOT NULL), 0.0) AS easy_med,
-            COALESCE((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY useful) 
-                      FROM course WHERE useful IS NOT NULL), 0.0) AS useful_med,
-            COALESCE((SELECT MIN(liked) FROM course WHERE liked IS NOT NULL), 0.0) AS liked_min,
-            COALESCE((SELECT MIN(easy) FROM course WHERE easy IS NOT NULL), 0.0) AS easy_min,
-            COALESCE((SELECT MIN(useful) FROM course WHERE useful IS NOT NULL), 0.0) AS useful_min
-    """)
-    
-    row = cursor.fetchone()
-    
+    columns = ("liked", "easy", "useful")
+    med = {}
+    low = {}
+    for col in columns:
+        values = [v for v in field_values(courses.values(), col) if v is not None]
+        if not values:
+            med[col], low[col] = 0, 0
+        elif np is not None:
+            arr = np.asarray(values, dtype=np.float64)
+            med[col], low[col] = round_half_up(float(np.median(arr))), int(arr.min())
+        else:
+            med[col], low[col] = round_half_up(statistics.median(values)), int(min(values))
+
     metrics = {
         "median": {
-            "liked": float(row[0]),
-            "easy": float(row[1]),
-            "useful": float(row[2])
+            "liked": med["liked"],
+            "easy": med["easy"],
+            "useful": med["useful"]
         },
         "min": {
-            "liked": float(row[3]),
-            "easy": float(row[4]),
-            "useful": float(row[5])
-        }
+            "liked": low["liked"],
+            "easy": low["easy"],
+            "useful": low["useful"]
+        },
+        "scale": RATING_SCALE
     }
     
-    print(f"   ✓ Median: liked={metrics['median']['liked']:.1f}, easy={metrics['median']['easy']:.1f}, useful={metrics['median']['useful']:.1f}")
+    print(f"   ✓ Median: liked={med['liked'] / RATING_SCALE:.1f}, easy={med['easy'] / RATING_SCALE:.1f}, useful={med['useful'] / RATING_SCALE:.1f}")
     return metrics
 
 
-def export_all():
-    """Main export function."""
+def export_document_sql(cursor, exported_at):
+    """Build the whole export document in one query with json_build_object / json_agg.
+
+    Returns (document_text, course_count, prereq_course_count). The document has the same
+    shape as the Python pipeline's: the departments vocabulary is numbered in order of each
+    department's first course_id (as export_courses assigns ids), ratings and metrics are
+    RATING_SCALE integers, and prerequisite groups with more than one course are "OR".
+    json rather than jsonb keeps the keys in the order they are built.
+    """
+    print("🧮 Building export document in Postgres...")
+    cursor.execute("""
+        WITH c AS (
+            SELECT
+                course_id,
+                COALESCE(course_name, '') AS course_name,
+                COALESCE(department, '') AS department,
+                course_level,
+                COALESCE(description, '') AS description,
+                ROUND(liked * %(scale)s)::int AS liked,
+                ROUND(easy * %(scale)s)::int AS easy,
+                ROUND(useful * %(scale)s)::int AS useful,
+                rating_num::int AS rating_num
+            FROM course
+        ),
+        d AS (
+            SELECT department, (ROW_NUMBER() OVER (ORDER BY MIN(course_id)) - 1)::int AS department_id
+            FROM c
+            GROUP BY department
+        ),
+        g AS (
+            SELECT
+                course_id,
+                prerequisite_group,
+                COUNT(*) AS n,
+                json_agg(json_build_object('course_id', prereq_course_id, 'min_grade', min_grade)
+                         ORDER BY prereq_course_id) AS courses
+            FROM course_prereq
+            GROUP BY course_id, prerequisite_group
+        ),
+        p AS (
+            SELECT
+                course_id,
+                json_agg(json_build_object(
+                    'group', prerequisite_group,
+                    'type', CASE WHEN n > 1 THEN 'OR' ELSE 'AND' END,
+                    'courses', courses
+                ) ORDER BY prerequisite_group) AS groups
+            FROM g
+            GROUP BY course_id
+        )
+        SELECT
+            json_build_object(
+                'version', '1.0',
+                'exported_at', %(exported_at)s::text,
+                'departments', (SELECT COALESCE(json_agg(department ORDER BY department_id), '[]') FROM d),
+                'courses', (
+                    SELECT COALESCE(json_object_agg(c.course_id, json_build_object(
+                        'course_id', c.course_id,
+                        'course_name', c.course_name,
+                        'department_id', d.department_id,
+                        'course_level', c.course_level,
+                        'description', c.description,
+                        'liked', c.liked,
+                        'easy', c.easy,
+                        'useful', c.useful,
+                        'rating_num', c.rating_num
+                    ) ORDER BY c.course_id), '{}')
+                    FROM c JOIN d USING (department)
+                ),
+                'prereqs', (SELECT COALESCE(json_object_agg(course_id, groups ORDER BY course_id), '{}') FROM p),
+                'metrics', (
+                    SELECT json_build_object(
+                        'median', json_build_object(
+                            'liked', COALESCE(ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY liked))::numeric)::int, 0),
+                            'easy', COALESCE(ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY easy))::numeric)::int, 0),
+                            'useful', COALESCE(ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY useful))::numeric)::int, 0)
+                        ),
+                        'min', json_build_object(
+                            'liked', COALESCE(MIN(liked), 0),
+                            'easy', COALESCE(MIN(easy), 0),
+                            'useful', COALESCE(MIN(useful), 0)
+                        ),
+                        'scale', %(scale)s::int
+                    )
+                    FROM c
+                )
+            )::text,
+            (SELECT COUNT(*) FROM c),
+            (SELECT COUNT(*) FROM p)
+    """, {"scale": RATING_SCALE, "exported_at": exported_at})
+    document, course_count, prereq_course_count = cursor.fetchone()
+    print(f"   ✓ Built document for {course_count} courses, {prereq_course_count} with prerequisites")
+    return document, course_count, prereq_course_count
+
+
+def dumps_compact(obj):
+    """Compact UTF-8 JSON bytes for `obj`, via msgspec or orjson when available."""
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_chunks(f, chunks):
+    """Write byte chunks to raw file `f` with scatter-gather os.writev (no concatenation copy).
+
+    Falls back to one write per chunk where os.writev doesn't exist (Windows).
+    """
+    if not hasattr(os, "writev"):
+        for chunk in chunks:
+            f.write(chunk)
+        return
+    fd = f.fileno()
+    views = [memoryview(chunk) for chunk in chunks if chunk]
+    while views:
+        written = os.writev(fd, views[:1024])
+        # Drop what was fully written and trim a partially written chunk
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if written:
+            views[0] = views[0][written:]
+
+
+def write_json(path, data, indent=False):
+    """Write `data` as UTF-8 JSON, compact unless `indent` (2 spaces) is requested.
+
+    Compact output is streamed: each top-level dict (courses, prereqs, ...) is encoded one
+    entry at a time into a reusable buffer that is flushed with write_chunks every ~1 MiB, so
+    at most about 1 MiB of encoded output (plus one entry) is held, never a whole section.
+    """
+    if indent:
+        # msgspec/orjson serialize in native code and hand back UTF-8 bytes, so the file is written as-is
+        if msgspec is not None:
+            with open(path, "wb") as f:
+                f.write(msgspec.json.format(msgspec.json.encode(data), indent=2))
+        elif orjson is not None:
+            with open(path, "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2))
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        return
+    # With msgspec a single Encoder appends straight into the buffer (its Structs have
+    # per-schema compiled encoders), so no per-entry bytes objects are built
+    buf = bytearray()
+    if msgspec is not None:
+        encode_into = msgspec.json.Encoder().encode_into
+
+        def emit(obj):
+            encode_into(obj, buf, -1)
+    else:
+        def emit(obj):
+            buf.extend(dumps_compact(obj))
+
+    # Unbuffered: write_chunks issues the syscalls itself
+    with open(path, "wb", buffering=0) as f:
+        buf += b"{"
+        sep = b""
+        for key, value in data.items():
+            buf += sep
+            sep = b","
+            emit(key)
+            buf += b":"
+            if isinstance(value, dict):
+                buf += b"{"
+                inner_sep = b""
+                for k, v in value.items():
+                    buf += inner_sep
+                    inner_sep = b","
+                    emit(k)
+                    buf += b":"
+                    emit(v)
+                    if len(buf) >= 1 << 20:
+                        write_chunks(f, [buf])
+                        del buf[:]
+                buf += b"}"
+            else:
+                emit(value)
+        buf += b"}"
+        write_chunks(f, [buf])
+
+
+def write_compressed_copies(path):
+    """Write pre-compressed path.gz (and path.br when brotli is installed) next to `path`.
+
+    Returns the paths written, so a static host can serve them without compressing on the fly.
+    """
+    written = [path + ".gz"]
+    with open(path, "rb") as src, gzip.open(written[0], "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    if brotli is not None:
+        with open(path, "rb") as src:
+            data = brotli.compress(src.read(), quality=5)
+        written.append(path + ".br")
+        with open(written[-1], "wb") as dst:
+            dst.write(data)
+    return written
+
+
+def write_courses_arrow(path, courses, departments):
+    """Write the course table as an Arrow IPC file with a fixed column schema.
+
+    Numbers are stored as binary values, so readers (e.g. apache-arrow in JS) skip parsing them
+    from text; department is an Arrow dictionary column over `departments`. Returns False
+    when pyarrow isn't installed.
+    """
+    if pa is None:
+        return False
+    schema = pa.schema([
+        ("course_id", pa.string()),
+        ("course_name", pa.string()),
+        ("department", pa.dictionary(pa.int16(), pa.string())),
+        ("course_level", pa.int32()),
+        ("description", pa.string()),
+        ("liked", pa.uint16()),
+        ("easy", pa.uint16()),
+        ("useful", pa.uint16()),
+        ("rating_num", pa.int32()),
+    ], metadata={"rating_scale": str(RATING_SCALE)})
+    dept_ids = pa.array(field_values(courses.values(), "department_id"), type=pa.int16())
+    dept_column = pa.DictionaryArray.from_arrays(dept_ids, pa.array(departments, type=pa.string()))
+    rows = list(courses.values())
+    if msgspec is not None:
+        rows = msgspec.to_builtins(rows)
+    table = pa.Table.from_pylist(rows, schema=schema.remove(2))
+    table = table.add_column(2, schema.field(2), dept_column)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+    return True
+
+
+def export_all(pretty=False, sql_json=False):
+    """Main export function.
+
+    Writes data/courses_data.json compactly; with `pretty`, also an indented
+    data/courses_data.pretty.json for reading by hand. When pyarrow is installed the
+    course table is also written to data/courses.arrow.
+
+    With `sql_json`, Postgres builds the whole document in a single query and the text is
+    written as returned. Postgres's JSON output is not compact, and the courses never reach
+    Python, so neither the pretty copy nor the Arrow file is written; the compressed copies are.
+    Returns the export data, or None with `sql_json`.
+    """
     print("\n" + "="*60)
     print("🚀 Starting Database Export to Static JSON")
     print("="*60 + "\n")
@@ -175,30 +505,54 @@ def export_all():
     # Create data directory if it doesn't exist
     os.makedirs("data", exist_ok=True)
     
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            # Export all data
-            courses = export_courses(cur)
-            prereqs = export_prereqs(cur)
-            # Skip offerings - table doesn't exist in current schema
-            # offerings = export_offerings(cur)
-            metrics = calculate_metrics(cur)
-    
-    # Prepare final export structure
-    export_data = {
-        "version": "1.0",
-        "exported_at": datetime.now().isoformat(),
-        "courses": courses,
-        "prereqs": prereqs,
-        "metrics": metrics
-    }
-    
-    # Write to JSON file
     output_file = "data/courses_data.json"
-    print(f"\n💾 Writing to {output_file}...")
+
+    if sql_json:
+        # One query returns the finished document; it is written as Postgres formats it
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                document, course_count, prereq_course_count = export_document_sql(cur, datetime.now().isoformat())
+        print(f"\n💾 Writing to {output_file}...")
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(document)
+        compressed_files = write_compressed_copies(output_file)
+        export_data = None
+    else:
+        # Export all data; the tables are independent, so each exporter runs on its own
+        # connection in a thread (psycopg releases the GIL while waiting on the network) and
+        # iterates a server-side cursor so the results stream in blocks
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            courses_job = pool.submit(export_on_own_connection, export_courses, "export_courses")
+            prereqs_job = pool.submit(export_on_own_connection, export_prereqs, "export_prereqs")
+            courses, departments = courses_job.result()
+            prereqs = prereqs_job.result()
+    
+        metrics = calculate_metrics(courses)
+
+        # Prepare final export structure
+        export_data = {
+            "version": "1.0",
+            "exported_at": datetime.now().isoformat(),
+            "departments": departments,
+            "courses": courses,
+            "prereqs": prereqs,
+            "metrics": metrics
+        }
+    
+        # Write to JSON file
+        print(f"\n💾 Writing to {output_file}...")
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(export_data, f, indent=2, ensure_ascii=False)
+        # Compact: the file is only ever parsed by the frontend
+        write_json(output_file, export_data)
+        compressed_files = write_compressed_copies(output_file)
+        if pretty:
+            pretty_file = "data/courses_data.pretty.json"
+            print(f"💾 Writing indented copy to {pretty_file}...")
+            write_json(pretty_file, export_data, indent=True)
+        arrow_file = "data/courses.arrow"
+        if write_courses_arrow(arrow_file, courses, departments):
+            print(f"💾 Wrote courses as Arrow IPC to {arrow_file}")
+        course_count, prereq_course_count = len(courses), len(prereqs)
     
     # Calculate file size
     file_size = os.path.getsize(output_file)
@@ -211,18 +565,26 @@ def export_all():
     print("="*60)
     print(f"📦 Output file: {output_file}")
     print(f"📏 File size: {file_size_mb:.2f} MB ({file_size:,} bytes)")
+    for compressed_file in compressed_files:
+        compressed_size = os.path.getsize(compressed_file)
+        print(f"   {compressed_file}: {compressed_size / (1024 * 1024):.2f} MB ({compressed_size:,} bytes)")
     print(f"⏱️  Time taken: {elapsed:.2f} seconds")
     print(f"📊 Summary:")
-    print(f"   - {len(courses)} courses")
-    print(f"   - {len(prereqs)} courses with prerequisites")
+    print(f"   - {course_count} courses")
+    print(f"   - {prereq_course_count} courses with prerequisites")
     print("="*60 + "\n")
     
     return export_data
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the course database to data/courses_data.json")
+    parser.add_argument("--pretty", action="store_true", help="Also write an indented data/courses_data.pretty.json")
+    parser.add_argument("--sql-json", action="store_true",
+                        help="Build the whole document in one Postgres query (no pretty copy or Arrow file)")
+    args = parser.parse_args()
     try:
-        export_all()
+        export_all(pretty=args.pretty, sql_json=args.sql_json)
         print("🎉 Ready to deploy! Your static data is in data/courses_data.json")
     except Exception as e:
         print(f"\n❌ Error during export: {e}")
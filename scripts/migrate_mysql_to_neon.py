@@ -1,5 +1,6 @@
 import os
-from typing import List, Tuple, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple, Iterable
 
 import mysql.connector
 import psycopg
@@ -36,90 +37,62 @@ def get_pg_connection():
     return psycopg.connect(dsn, autocommit=False)
 
 
-def fetch_all_mysql(cursor, query: str) -> List[Tuple]:
-    cursor.execute(query)
-    return list(cursor.fetchall())
-
-
-def chunked(iterable: Iterable[Tuple], size: int = 1000) -> Iterable[List[Tuple]]:
-    buf: List[Tuple] = []
-    for item in iterable:
-        buf.append(item)
-        if len(buf) >= size:
-            yield buf
-            buf = []
-    if buf:
-        yield buf
-
+def iter_mysql(cursor, query: str, size: int = 5000) -> Iterator[Tuple]:
+    """Stream a query's rows in fetchmany() blocks instead of materializing them all.
 
-def migrate_course(cur_mysql, pg_conn):
-    print("Migrating table: course ...")
-    rows = fetch_all_mysql(
-        cur_mysql,
-        (
-            "SELECT course_id, course_name, department, course_level, description, "
-            "liked, easy, useful, rating_num FROM course"
-        ),
+    The cursor must be unbuffered (mysql.connector's default) and fully consumed before
+    it runs another query.
+    """
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield from rows
+
+
+def copy_rows(cur_pg, table: str, columns: List[str], rows: Iterable[Tuple]) -> int:
+    """COPY rows into `table` over psycopg's COPY protocol; returns how many were sent."""
+    query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
     )
-
-    with pg_conn.cursor() as cur_pg:
-        cur_pg.execute("TRUNCATE TABLE course RESTART IDENTITY CASCADE;")
-        query = (
-            "INSERT INTO course ("
-            "  course_id, course_name, department, course_level, description,"
-            "  liked, easy, useful, rating_num"
-            ") VALUES ("
-            "  %s, %s, %s, %s, %s, %s, %s, %s, %s"
-            ") ON CONFLICT (course_id) DO UPDATE SET "
-            "  course_name = EXCLUDED.course_name,"
-            "  department = EXCLUDED.department,"
-            "  course_level = EXCLUDED.course_level,"
-            "  description = EXCLUDED.description,"
-            "  liked = EXCLUDED.liked,"
-            "  easy = EXCLUDED.easy,"
-            "  useful = EXCLUDED.useful,"
-            "  rating_num = EXCLUDED.rating_num"
-        )
-        for chunk in chunked(rows, size=1000):
-            cur_pg.executemany(query, chunk)
-    print(f"  Inserted/updated {len(rows)} rows into course")
+    total = 0
+    with cur_pg.copy(query) as copy:
+        for row in rows:
+            copy.write_row(row)
+            total += 1
+    return total
 
 
-def migrate_course_prereq(cur_mysql, pg_conn):
-    print("Migrating table: course_prereq ...")
-    rows = fetch_all_mysql(
-        cur_mysql,
-        (
-            "SELECT course_id, prereq_course_id, prerequisite_group, min_grade "
-            "FROM course_prereq"
-        ),
-    )
+COURSE_COLUMNS = [
+    "course_id", "course_name", "department", "course_level", "description",
+    "liked", "easy", "useful", "rating_num",
+]
+PREREQ_COLUMNS = ["course_id", "prereq_course_id", "prerequisite_group", "min_grade"]
 
-    with pg_conn.cursor() as cur_pg:
-        cur_pg.execute("TRUNCATE TABLE course_prereq;")
-        query = (
-            "INSERT INTO course_prereq ("
-            "  course_id, prereq_course_id, prerequisite_group, min_grade"
-            ") VALUES ("
-            "  %s, %s, %s, %s"
-            ") ON CONFLICT (course_id, prereq_course_id, prerequisite_group) DO UPDATE SET "
-            "  min_grade = EXCLUDED.min_grade"
-        )
-        for chunk in chunked(rows, size=2000):
-            cur_pg.executemany(query, chunk)
-    print(f"  Inserted/updated {len(rows)} rows into course_prereq")
 
+def load_stage(job: Tuple[str, List[str], str, str]) -> int:
+    """Worker: COPY one MySQL table (or partition of it) into its own Postgres staging table.
 
-def main():
+    job is (table, columns, where, stage). Runs in its own process with its own MySQL and
+    Postgres connections; the UNLOGGED stage table is committed so the merge can read it.
+    """
+    table, columns, where, stage = job
+    query = f"SELECT {', '.join(columns)} FROM {table}" + (f" WHERE {where}" if where else "")
     mysql_conn = get_mysql_connection()
     try:
-        with mysql_conn.cursor() as cur_mysql:
+        # Unbuffered: rows stream from the server as iter_mysql asks for them
+        with mysql_conn.cursor(buffered=False) as cur_mysql:
             pg_conn = get_pg_connection()
             try:
-                migrate_course(cur_mysql, pg_conn)
-                migrate_course_prereq(cur_mysql, pg_conn)
+                with pg_conn.cursor() as cur_pg:
+                    cur_pg.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(stage)))
+                    cur_pg.execute(sql.SQL("CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+                        sql.Identifier(stage), sql.Identifier(table)))
+                    total = copy_rows(cur_pg, stage, columns, iter_mysql(cur_mysql, query))
                 pg_conn.commit()
-                print("Migration complete.")
+                return total
             except Exception:
                 pg_conn.rollback()
                 raise
@@ -129,7 +102,95 @@ def main():
         mysql_conn.close()
 
 
-if __name__ == "__main__":
-    main()
+def select_stages(columns: List[str], stages: List[str]):
+    """SELECT the columns from every stage table, concatenated with UNION ALL."""
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    return sql.SQL(" UNION ALL ").join(
+        sql.SQL("SELECT {} FROM {}").format(cols, sql.Identifier(stage)) for stage in stages
+    )
+
+
+def drop_stages(cur_pg, stages: List[str]) -> None:
+    for stage in stages:
+        cur_pg.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(stage)))
+
+
+def migrate_course(cur_pg, stages: List[str], total: int):
+    print("Migrating table: course ...")
+    cur_pg.execute("TRUNCATE TABLE course RESTART IDENTITY CASCADE;")
+    cur_pg.execute(sql.SQL(
+        "INSERT INTO course ("
+        "  course_id, course_name, department, course_level, description,"
+        "  liked, easy, useful, rating_num"
+        ") {} "
+        "ON CONFLICT (course_id) DO UPDATE SET "
+        "  course_name = EXCLUDED.course_name,"
+        "  department = EXCLUDED.department,"
+        "  course_level = EXCLUDED.course_level,"
+        "  description = EXCLUDED.description,"
+        "  liked = EXCLUDED.liked,"
+        "  easy = EXCLUDED.easy,"
+        "  useful = EXCLUDED.useful,"
+        "  rating_num = EXCLUDED.rating_num"
+    ).format(select_stages(COURSE_COLUMNS, stages)))
+    print(f"  Inserted/updated {total} rows into course")
+
+
+def migrate_course_prereq(cur_pg, stages: List[str], total: int):
+    print("Migrating table: course_prereq ...")
+    cur_pg.execute("TRUNCATE TABLE course_prereq;")
+    cur_pg.execute(sql.SQL(
+        "INSERT INTO course_prereq ("
+        "  course_id, prereq_course_id, prerequisite_group, min_grade"
+        ") {} "
+        "ON CONFLICT (course_id, prereq_course_id, prerequisite_group) DO UPDATE SET "
+        "  min_grade = EXCLUDED.min_grade"
+    ).format(select_stages(PREREQ_COLUMNS, stages)))
+    print(f"  Inserted/updated {total} rows into course_prereq")
 
 
+def main():
+    # course_prereq is split into MOD(CRC32(course_id), parts) partitions; every partition
+    # and the course table load in parallel worker processes, each COPYing into its own
+    # stage table. The merge into the real tables then runs as one transaction, so the
+    # foreign keys from course_prereq to course hold as before.
+    parts = max(1, int(os.getenv("MIGRATE_WORKERS", "0")) or min(os.cpu_count() or 1, 8))
+    course_stage = "course_stage"
+    prereq_stages = [f"course_prereq_stage_{i}" for i in range(parts)]
+    jobs = [("course", COURSE_COLUMNS, "", course_stage)] + [
+        ("course_prereq", PREREQ_COLUMNS, f"MOD(CRC32(course_id), {parts}) = {i}", stage)
+        for i, stage in enumerate(prereq_stages)
+    ]
+    stages = [course_stage] + prereq_stages
+
+    print(f"Copying course and course_prereq ({parts} partitions) into staging tables ...")
+    try:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            totals = list(pool.map(load_stage, jobs))
+        # Connected only after the workers are done, so no forked child inherits the socket
+        pg_conn = get_pg_connection()
+        try:
+            with pg_conn.cursor() as cur_pg:
+                migrate_course(cur_pg, [course_stage], totals[0])
+                migrate_course_prereq(cur_pg, prereq_stages, sum(totals[1:]))
+                drop_stages(cur_pg, stages)
+            pg_conn.commit()
+        except Exception:
+            pg_conn.rollback()
+            raise
+        finally:
+            pg_conn.close()
+        print("Migration complete.")
+    except Exception:
+        # Best effort: don't leave stage tables behind after a failed run
+        try:
+            with get_pg_connection() as pg_conn:
+                with pg_conn.cursor() as cur_pg:
+                    drop_stages(cur_pg, stages)
+        except Exception:
+            pass
+        raise
+
+
+if __name__ == "__main__":
+    main()
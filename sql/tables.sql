@@ -28,9 +28,26 @@ CREATE TABLE IF NOT EXISTS course_prereq (
 );
 
 -- Helpful indexes (match your query patterns)
-CREATE INDEX IF NOT EXISTS ix_cp_course            ON course_prereq(course_id);
-CREATE INDEX IF NOT EXISTS ix_cp_prereq_course     ON course_prereq(prereq_course_id);
-CREATE INDEX IF NOT EXISTS ix_cp_course_group      ON course_prereq(course_id, prerequisite_group);
+-- Superseded: course_id is a prefix of the primary key and of ix_cp_forward,
+-- (course_id, prerequisite_group) of ix_cp_forward, and prereq_course_id of ix_cp_reverse
+DROP INDEX IF EXISTS ix_cp_course;
+DROP INDEX IF EXISTS ix_cp_prereq_course;
+DROP INDEX IF EXISTS ix_cp_course_group;
+-- Forward lookups filter on course_id and order by (group, prereq): serve the ORDER BY from the index
+CREATE INDEX IF NOT EXISTS ix_cp_forward           ON course_prereq(course_id, prerequisite_group, prereq_course_id);
+-- Reverse (future-tree) lookups only need course_id: INCLUDE it for index-only scans
+CREATE INDEX IF NOT EXISTS ix_cp_reverse           ON course_prereq(prereq_course_id) INCLUDE (course_id);
+
+-- Expression indexes for the TRIM(...) = %s existence probe
+CREATE INDEX IF NOT EXISTS ix_course_trim_id       ON course(TRIM(course_id));
+CREATE INDEX IF NOT EXISTS ix_cp_trim_course       ON course_prereq(TRIM(course_id));
+CREATE INDEX IF NOT EXISTS ix_cp_trim_prereq       ON course_prereq(TRIM(prereq_course_id));
+
+-- Autocomplete: trigram GIN for UPPER(...) LIKE '%q%', pattern_ops for prefix LIKE 'q%'
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_course_id_upper_trgm   ON course USING gin (UPPER(course_id) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_course_name_upper_trgm ON course USING gin (UPPER(course_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_course_id_upper_prefix ON course (UPPER(course_id) text_pattern_ops);
 
 
 -- visitor_log
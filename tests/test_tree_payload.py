@@ -0,0 +1,46 @@
+"""Runs the /api/course/{id}/tree payload query against a real Postgres.
+
+Set TEST_DATABASE_URL to a scratch database; the test only creates TEMP tables.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+for _mod in ("psycopg", "psycopg_pool", "fastapi", "cachetools", "dotenv"):
+    pytest.importorskip(_mod)
+
+import psycopg  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+import server  # noqa: E402
+
+DSN = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+
+async def _fetch_payload():
+    async with await psycopg.AsyncConnection.connect(DSN) as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "CREATE TEMP TABLE course (course_id TEXT PRIMARY KEY, course_name TEXT, department TEXT, "
+                "course_level INT, description TEXT, liked REAL, easy REAL, useful REAL, rating_num INT)"
+            )
+            await cur.execute(
+                "INSERT INTO course VALUES "
+                "('CS135', 'Intro', 'CS', 100, '', 80, 50, 70, 10), "
+                "('CS136', NULL, 'CS', 100, NULL, NULL, NULL, NULL, NULL)"
+            )
+            server.invalidate_metrics_cache()
+            return await server.fetch_tree_payload(cur, "CS135", {"CS135", "CS136"})
+
+
+def test_tree_payload_query_executes():
+    course, metrics_map, metrics_median, metrics_min = asyncio.run(_fetch_payload())
+    assert course["course_id"] == "CS135"
+    assert course["course_name"] == "Intro"
+    assert course["liked"] == 80.0
+    assert metrics_map["CS136"]["liked"] is None
+    assert metrics_median["liked"] == 80.0
+    assert metrics_min["easy"] == 50.0